@@ -0,0 +1,46 @@
+import os
+import click
+
+from ..main import console
+
+@click.command()
+@click.pass_context
+def init(ctx):
+    """Initialize a new project in the workspace"""
+    workspace = ctx.obj['workspace']
+    
+    console.print(f"[bold]Initializing new project in {workspace}[/bold]")
+    
+    try:
+        # Create standard project structure
+        os.makedirs(os.path.join(workspace, "src"), exist_ok=True)
+        os.makedirs(os.path.join(workspace, "tests"), exist_ok=True)
+        os.makedirs(os.path.join(workspace, "docs"), exist_ok=True)
+        
+        # Create README.md
+        with open(os.path.join(workspace, "README.md"), 'w') as f:
+            f.write("# Project\n\nCreated with LLMAgent\n")
+        
+        # Create .gitignore
+        with open(os.path.join(workspace, ".gitignore"), 'w') as f:
+            f.write("__pycache__/\n*.py[cod]\n*$py.class\n.env\nvenv/\n.vscode/\n")
+        
+        # Create initial (empty) files without going through a buffered writer
+        for package in ("src", "tests"):
+            os.close(os.open(os.path.join(workspace, package, "__init__.py"),
+                             os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644))
+            
+        console.print("[green]Project initialized successfully![/green]")
+        
+        # Print structure
+        console.print("\n[bold]Project structure:[/bold]")
+        console.print("├── src/")
+        console.print("│   └── __init__.py")
+        console.print("├── tests/")
+        console.print("│   └── __init__.py")
+        console.print("├── docs/")
+        console.print("├── README.md")
+        console.print("└── .gitignore")
+        
+    except Exception as e:
+        console.print(f"[bold red]Error initializing project: {str(e)}[/bold red]")
@@ -0,0 +1,53 @@
+import time
+import click
+
+from ..main import console
+
+@click.command()
+@click.option('--model-type', type=click.Choice(['llamacpp', 'transformers']), default='llamacpp', 
+              help='Type of model to use')
+@click.option('--model-id', help='Model ID or path')
+@click.pass_context
+def test_model(ctx, model_type, model_id):
+    """Test the LLM model"""
+    from core.models import get_model
+    
+    console.print(f"[bold]Testing {model_type} model[/bold]")
+    
+    if model_id:
+        console.print(f"Model ID: {model_id}")
+    
+    try:
+        # Initialize model
+        model_kwargs = {"model_id": model_id} if model_id else {}
+        model = get_model(model_type, **model_kwargs)
+        
+        # Test loading
+        console.print("Loading model...")
+        start_time = time.time()
+        model.load()
+        load_time = time.time() - start_time
+        console.print(f"[green]Model loaded successfully in {load_time:.2f}s[/green]")
+        
+        # Test generation
+        console.print("\nTesting text generation...")
+        prompt = "Write a function that calculates the factorial of a number."
+        
+        start_time = time.time()
+        response = model.generate(prompt, temperature=0.7, max_tokens=200)
+        generation_time = time.time() - start_time
+        
+        console.print(f"[bold]Prompt:[/bold] {prompt}")
+        console.print("[bold]Response:[/bold]")
+        console.print(response)
+        console.print(f"[dim]Generation time: {generation_time:.2f}s[/dim]")
+        
+        # Test tokenization
+        console.print("\nTesting tokenization...")
+        tokens = model.tokenize(prompt)
+        console.print(f"[green]Tokenized prompt into {len(tokens)} tokens[/green]")
+        
+        console.print("\n[bold green]Model test completed successfully![/bold green]")
+        
+    except Exception as e:
+        console.print(f"[bold red]Error testing model: {str(e)}[/bold red]")
@@ -0,0 +1,209 @@
+import os
+import click
+from collections import deque
+from rich.console import Group
+from rich.panel import Panel
+from rich.table import Table
+from rich.text import Text
+
+from ..main import (
+    console, read_context_doc, flush_log_buffers, print_action, print_result,
+    handle_actions, configure_output
+)
+
+@click.command()
+@click.argument('prompt')
+@click.option('--mode', '-m', type=click.Choice(['approval', 'autonomous']), default='approval', 
+              help='Agent operation mode')
+@click.option('--model-type', type=click.Choice(['llamacpp', 'transformers']), default='llamacpp',
+              help='Type of model to use')
+@click.option('--model-id', help='Model ID or path')
+@click.option('--iterations', '-i', type=int, help='Maximum number of iterations')
+@click.option('--context-docs', '-d', multiple=True, help='Path to context documents')
+@click.pass_context
+def run(ctx, prompt, mode, model_type, model_id, iterations, context_docs):
+    """Run the agent with the given prompt"""
+    from rich.progress import Progress, TextColumn, BarColumn, TaskProgressColumn, TimeElapsedColumn
+    from rich.live import Live
+    from core.agent import Agent
+    
+    workspace = ctx.obj['workspace']
+    config_settings = ctx.obj['settings']
+    verbose = ctx.obj.get('verbose', False)
+    
+    # Action details are only needed when approving actions or when asked for
+    configure_output(print_actions=mode == 'approval' or verbose, verbose=verbose)
+    
+    # Override settings (settings are frozen, so copy)
+    agent_overrides = {'mode': mode}
+    if iterations:
+        agent_overrides['max_iterations'] = iterations
+    model_overrides = {'model_id': model_id} if model_id else {}
+    
+    config_settings = config_settings.model_copy(update={
+        'agent': config_settings.agent.model_copy(update=agent_overrides),
+        'model': config_settings.model.model_copy(update=model_overrides)
+    })
+    
+    # Settings are fixed from here on; read the values used below just once
+    max_iterations = config_settings.agent.max_iterations
+    agent_mode = config_settings.agent.mode
+    
+    # Initialize components
+    model_kwargs = {"model_id": model_id} if model_id else {}
+    agent = Agent(
+        workspace_path=workspace,
+        model_type=model_type,
+        model_kwargs=model_kwargs
+    )
+    agent.mode = agent_mode
+    
+    # Load context documents
+    for doc_path in context_docs:
+        try:
+            content = read_context_doc(doc_path)
+            agent.add_context_doc(os.path.basename(doc_path), content)
+            console.print(f"[green]Loaded context document: {doc_path}[/green]")
+        except Exception as e:
+            console.print(f"[red]Error loading context document {doc_path}: {str(e)}[/red]")
+    
+    # Create progress display; it is drawn by the Live display below, which
+    # coalesces redraws at its own refresh rate
+    progress = Progress(
+        TextColumn("[bold blue]{task.description}"),
+        BarColumn(),
+        TaskProgressColumn(),
+        TextColumn("•"),
+        TimeElapsedColumn(),
+        auto_refresh=False,
+    )
+    # Table for the current iteration's actions; replaced on every iteration
+    action_table = Table(show_header=False, box=None, padding=(0, 1))
+    
+    # Start agent
+    console.print(f"[bold green]Starting agent with prompt:[/bold green] {prompt}")
+    console.print(f"[dim]Mode: {mode}, Model: {model_type}, Workspace: {workspace}[/dim]\n")
+    
+    with Live(Group(progress, action_table), console=console, refresh_per_second=4) as live:
+        # Create task
+        task_id = progress.add_task(
+            "Running agent", 
+            total=max_iterations
+        )
+        
+        # Thinking from recent iterations, printed once the run is over
+        thinking_buffer = deque(maxlen=max_iterations)
+        
+        def print_thinking():
+            """Print the buffered thinking in a single panel"""
+            if thinking_buffer:
+                text = "\n---\n".join(f"[{i}] {t}" for i, t in thinking_buffer)
+                console.print(Panel(Text(text), title="Agent's thinking"))
+                thinking_buffer.clear()
+        
+        # Define iteration callback
+        def on_iteration_complete(data):
+            iteration = data.get("iteration", 0)
+            progress.update(task_id, completed=iteration, refresh=False)
+            
+            # Print thinking live only when verbose, otherwise keep it for the end
+            if "thinking" in data:
+                if verbose:
+                    console.print("\n[bold]Agent's thinking:[/bold]")
+                    console.print(data["thinking"])
+                else:
+                    thinking_buffer.append((iteration, data["thinking"]))
+            
+            # Print action results into a fresh table
+            action_table = Table(show_header=False, box=None, padding=(0, 1))
+            live.update(Group(progress, action_table))
+            for action_result in data.get("actions", []):
+                action = action_result.get("action", {})
+                result = action_result.get("result", {})
+                
+                if action and result:
+                    console.print("\n[bold cyan]Action:[/bold cyan]", action.get("type"))
+                    print_action(action, action_table)
+                    print_result(result)
+        
+        try:
+            # Run agent
+            if mode == "approval":
+                summary = agent.run(
+                    initial_prompt=prompt,
+                    max_iterations=max_iterations,
+                    on_action=handle_actions(agent, None),
+                    on_iteration_complete=on_iteration_complete
+                )
+            else:
+                summary = agent.run(
+                    initial_prompt=prompt,
+                    max_iterations=max_iterations,
+                    on_iteration_complete=on_iteration_complete
+                )
+            
+            print_thinking()
+            
+            # Print summary
+            console.print("\n[bold green]Agent execution complete![/bold green]")
+            console.print(f"[bold]Summary:[/bold]")
+            
+            summary_table = Table(show_header=False)
+            summary_table.add_column("Property")
+            summary_table.add_column("Value")
+            
+            summary_table.add_row("Iterations", str(summary.get("iterations", 0)))
+            summary_table.add_row("Total files", str(summary.get("total_files", 0)))
+            summary_table.add_row("Elapsed time", f"{summary.get('elapsed_time', 0):.2f}s")
+            
+            file_types = summary.get("file_types", {})
+            if file_types:
+                file_types_str = ", ".join(f"{ext}: {count}" for ext, count in file_types.items())
+                summary_table.add_row("File types", file_types_str)
+                
+            console.print(summary_table)
+            
+            # Show workspace files
+            console.print("\n[bold]Workspace files:[/bold]")
+            files = summary.get("files", [])
+            
+            if files:
+                file_table = Table(show_header=True)
+                file_table.add_column("Type")
+                file_table.add_column("Name")
+                file_table.add_column("Path")
+                file_table.add_column("Size")
+                
+                for file in files:
+                    if file.get("is_dir", False):
+                        file_table.add_row(
+                            "📁", 
+                            file.get("name", ""),
+                            file.get("path", ""),
+                            ""
+                        )
+                    else:
+                        size_str = f"{file.get('size', 0) / 1024:.1f} KB" if file.get('size', 0) > 0 else ""
+                        file_table.add_row(
+                            "📄",
+                            file.get("name", ""),
+                            file.get("path", ""),
+                            size_str
+                        )
+                
+                console.print(file_table)
+            else:
+                console.print("[yellow]No files created[/yellow]")
+            
+        except KeyboardInterrupt:
+            console.print("\n[bold yellow]Agent execution interrupted by user[/bold yellow]")
+            print_thinking()
+            flush_log_buffers()
+            agent.stop()
+        except Exception as e:
+            console.print(f"\n[bold red]Error during agent execution: {str(e)}[/bold red]")
+            flush_log_buffers()
+            agent.stop()
+            raise
+    
+    console.print("\n[bold green]Done![/bold green]")
@@ -1,44 +1,81 @@
 import os
 import sys
+import atexit
+import queue
 import logging
+import logging.handlers
 import click
+import functools
+import importlib
 import json
-import time
-from rich.console import Console
+import mmap
+from rich.console import Console, Group, RenderableType
 from rich.panel import Panel
-from rich.progress import Progress, TextColumn, BarColumn, TaskProgressColumn, TimeElapsedColumn
-from rich.syntax import Syntax
 from rich.table import Table
-from rich.markdown import Markdown
 from rich.prompt import Confirm
 from pathlib import Path
-from typing import Dict, Any, List, Optional, Tuple
+from types import MappingProxyType
+from typing import Dict, Any, List, Mapping, Optional, Tuple, Callable, TYPE_CHECKING
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+    _json_dumps = lambda obj: orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+except ImportError:
+    _json_loads = json.loads
+    _json_dumps = lambda obj: json.dumps(obj, indent=2, ensure_ascii=False)
 
 # Add parent directory to path to allow imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from core.agent import Agent
-from core.models import get_model
-from core.file_manager import FileManager
-from core.executor import CodeExecutor
 from config.settings import Settings, settings
-from monitoring.status_reporter import StatusReporter
-from monitoring.telemetry import Telemetry
+
+# The agent, models and rich's progress/syntax modules are imported inside
+# the commands that use them, so `--help` and `init` start quickly
+if TYPE_CHECKING:
+    from core.agent import Agent
 
 # Initialize rich console
 console = Console()
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
-    handlers=[
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+LOG_FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+
+# Configure logging: the root logger only enqueues records, and a single
+# listener thread drains the queue into the real stream/file handlers so
+# the agent never blocks on terminal or disk I/O
+_log_queue = queue.Queue(-1)
+
+_stream_handler = logging.StreamHandler(sys.stdout)
+_stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+log_listener = logging.handlers.QueueListener(_log_queue, _stream_handler, respect_handler_level=True)
+log_listener.start()
+atexit.register(log_listener.stop)
+
+_root_logger = logging.getLogger()
+_root_logger.setLevel(logging.INFO)
+_root_logger.addHandler(logging.handlers.QueueHandler(_log_queue))
 
 logger = logging.getLogger("llmagent")
 
+# Shared read-only stand-in for a missing params dict
+_EMPTY = MappingProxyType({})
+
+# Lexer names by file extension, used for syntax highlighting
+_LEXER_MAP = MappingProxyType({
+    ".py": "python",
+    ".js": "javascript",
+    ".ts": "typescript",
+    ".html": "html",
+    ".css": "css",
+    ".json": "json",
+    ".md": "markdown",
+    ".txt": "text",
+    ".sh": "bash",
+    ".yml": "yaml",
+    ".yaml": "yaml"
+})
+
 def setup_workspace(workspace_path: str) -> None:
     """Set up the workspace directory"""
     try:
@@ -57,15 +94,39 @@ def setup_logging(log_file: Optional[str] = None) -> None:
                 os.makedirs(log_dir, exist_ok=True)
                 
             file_handler = logging.FileHandler(log_file)
-            file_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(name)s: %(message)s"))
+            file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+            
+            # Buffer records and write them in bulk; errors flush immediately
+            buffered_handler = logging.handlers.MemoryHandler(
+                capacity=1024,
+                flushLevel=logging.ERROR,
+                target=file_handler,
+                flushOnClose=True
+            )
             
-            root_logger = logging.getLogger()
-            root_logger.addHandler(file_handler)
+            # Write from the listener thread, not from the logging caller
+            log_listener.handlers = log_listener.handlers + (buffered_handler,)
             
             console.print(f"[green]Logging to: {log_file}[/green]")
         except Exception as e:
             console.print(f"[yellow]Warning: Failed to set up logging to file: {str(e)}[/yellow]")
 
+def read_context_doc(doc_path: str) -> str:
+    """Read a context document through a read-only memory map"""
+    with open(doc_path, 'rb') as f:
+        # mmap cannot map an empty file
+        if os.fstat(f.fileno()).st_size == 0:
+            return ""
+            
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return str(mm, 'utf-8', errors='replace')
+
+def flush_log_buffers() -> None:
+    """Flush any buffered log handlers to their targets"""
+    for handler in log_listener.handlers:
+        if isinstance(handler, logging.handlers.MemoryHandler):
+            handler.flush()
+
 def load_settings(config_file: Optional[str] = None) -> Settings:
     """Load settings from config file"""
     if not config_file:
@@ -80,13 +141,34 @@ def load_settings(config_file: Optional[str] = None) -> Settings:
         console.print("[yellow]Falling back to default settings[/yellow]")
         return settings
 
-def print_action(action: Dict[str, Any]) -> None:
-    """Print an action in a nice format"""
+# Output switches set per command by configure_output(); the action table is
+# only worth building when someone is reviewing actions
+_PRINT_ACTIONS = True
+_VERBOSE = False
+
+def configure_output(print_actions: bool, verbose: bool) -> None:
+    """Set which parts of actions and results get printed"""
+    global _PRINT_ACTIONS, _VERBOSE
+    _PRINT_ACTIONS = print_actions
+    _VERBOSE = verbose
+
+def print_action(action: Dict[str, Any], table: Optional[Table] = None) -> None:
+    """Print an action in a nice format
+    
+    Args:
+        action: Action to print
+        table: Persistent table to append rows to instead of printing
+    """
+    if not _PRINT_ACTIONS:
+        return
+    
     action_type = action.get("type", "unknown")
-    params = action.get("params", {})
+    params = action.get("params") or _EMPTY
     
     # Format parameters based on action type
-    param_table = Table(show_header=False, box=None, padding=(0, 1))
+    param_table = table if table is not None else Table(show_header=False, box=None, padding=(0, 1))
+    if table is not None:
+        param_table.add_row("[bold blue]Action:[/bold blue]", action_type)
     
     for key, value in params.items():
         if key == "content" and len(str(value)) > 100:
@@ -100,12 +182,25 @@ def print_action(action: Dict[str, Any]) -> None:
         else:
             param_table.add_row(key, str(value))
     
-    console.print(f"[bold blue]Action:[/bold blue] {action_type}")
-    console.print(param_table)
+    if table is None:
+        console.print(f"[bold blue]Action:[/bold blue] {action_type}")
+        console.print(param_table)
+
+# First characters of a JSON object/array, and whitespace that may precede them
+_JSON_STARTS = frozenset('{[')
+_WS = frozenset(' \t\r\n\f\v')
+
+def _looks_like_json(s: str) -> bool:
+    """Check the first non-whitespace character without copying the string"""
+    i = 0
+    n = len(s)
+    while i < n and s[i] in _WS:
+        i += 1
+    return i < n and s[i] in _JSON_STARTS
 
 def print_result(result: Dict[str, Any]) -> None:
     """Print an action result in a nice format"""
-    status = result.get("status", "unknown")
+    status = sys.intern(result.get("status") or "unknown")
     color = "green" if status == "success" else "red"
     
     console.print(f"[bold {color}]Status:[/bold {color}] {status}")
@@ -116,11 +211,11 @@ def print_result(result: Dict[str, Any]) -> None:
         console.print("[bold]Output:[/bold]")
         
         # Try to detect if output is JSON
-        if output.strip().startswith(("{", "[")):
+        if _VERBOSE and _looks_like_json(output):
             try:
-                output_obj = json.loads(output)
-                console.print(json.dumps(output_obj, indent=2))
-            except:
+                output_obj = _json_loads(output)
+                console.print(_json_dumps(output_obj))
+            except ValueError:
                 console.print(output)
         else:
             console.print(output)
@@ -138,44 +233,76 @@ def print_result(result: Dict[str, Any]) -> None:
     if "execution_time" in result:
         console.print(f"[dim]Execution time: {result['execution_time']:.3f}s[/dim]")
 
-def handle_actions(agent: Agent, on_action_callback) -> bool:
+@functools.lru_cache(maxsize=16)
+def _get_lexer_instance(name: str):
+    """Get a Pygments lexer by name, reusing instances across actions"""
+    from pygments.lexers import get_lexer_by_name
+    from pygments.util import ClassNotFound
+    
+    try:
+        return get_lexer_by_name(name)
+    except ClassNotFound:
+        return get_lexer_by_name("text")
+
+def _render_write(params: Mapping[str, Any]) -> Optional[RenderableType]:
+    """Render the content of a write_file action"""
+    from rich.syntax import Syntax
+    
+    filepath = params.get("filepath", "")
+    content = params.get("content", "")
+    
+    if not content or len(content) <= 100:
+        return None
+        
+    # For longer content, show syntax highlighting
+    syntax = Syntax(
+        content, 
+        lexer=_get_lexer_instance(get_lexer_for_file(filepath)),
+        theme="monokai",
+        line_numbers=True,
+        word_wrap=True
+    )
+    return Group("[bold]File content:[/bold]", syntax)
+
+def _render_code(params: Mapping[str, Any]) -> Optional[RenderableType]:
+    """Render the code of a run_code action"""
+    from rich.syntax import Syntax
+    
+    code = params.get("code", "")
+    
+    if not code or len(code) <= 100:
+        return None
+        
+    # Show syntax highlighting for code
+    syntax = Syntax(
+        code,
+        lexer=_get_lexer_instance("python"),
+        theme="monokai",
+        line_numbers=True,
+        word_wrap=True
+    )
+    return Group("[bold]Code:[/bold]", syntax)
+
+# Extra renderers for action types that deserve more than the param table
+_ACTION_HANDLERS = {
+    "write_file": _render_write,
+    "run_code": _render_code
+}
+
+def handle_actions(agent: 'Agent', on_action_callback) -> bool:
     """Handle agent actions with callback"""
     def on_action(action: Dict[str, Any]) -> bool:
         """Callback for agent actions"""
+        # Intern once so handler lookups compare by identity
+        action_type = sys.intern(action.get("type") or "")
         print_action(action)
         
-        # Special handling for file write operations
-        if action.get("type") == "write_file":
-            filepath = action.get("params", {}).get("filepath", "")
-            content = action.get("params", {}).get("content", "")
-            
-            if content and len(content) > 100:
-                # For longer content, show syntax highlighting
-                syntax = Syntax(
-                    content, 
-                    lexer=get_lexer_for_file(filepath),
-                    theme="monokai",
-                    line_numbers=True,
-                    word_wrap=True
-                )
-                console.print("[bold]File content:[/bold]")
-                console.print(syntax)
-        
-        # Special handling for code execution
-        elif action.get("type") == "run_code":
-            code = action.get("params", {}).get("code", "")
-            
-            if code and len(code) > 100:
-                # Show syntax highlighting for code
-                syntax = Syntax(
-                    code,
-                    lexer="python",
-                    theme="monokai",
-                    line_numbers=True,
-                    word_wrap=True
-                )
-                console.print("[bold]Code:[/bold]")
-                console.print(syntax)
+        # Nobody is watching in autonomous mode, so skip highlighting
+        renderer = None if agent.mode == "autonomous" else _ACTION_HANDLERS.get(action_type)
+        if renderer:
+            rendered = renderer(action.get("params") or _EMPTY)
+            if rendered:
+                console.print(rendered)
         
         # Call user-provided callback if available
         if on_action_callback:
@@ -188,23 +315,13 @@ def handle_actions(agent: Agent, on_action_callback) -> bool:
 
 def get_lexer_for_file(filepath: str) -> str:
     """Get lexer name based on file extension"""
-    ext = os.path.splitext(filepath)[1].lower()
+    _, dot, ext = filepath.rpartition(".")
     
-    lexer_map = {
-        ".py": "python",
-        ".js": "javascript",
-        ".ts": "typescript",
-        ".html": "html",
-        ".css": "css",
-        ".json": "json",
-        ".md": "markdown",
-        ".txt": "text",
-        ".sh": "bash",
-        ".yml": "yaml",
-        ".yaml": "yaml"
-    }
+    # No extension, or the last dot belongs to a directory name
+    if not dot or "/" in ext or os.sep in ext:
+        return "text"
     
-    return lexer_map.get(ext, "text")
+    return _LEXER_MAP.get("." + ext.lower(), "text")
 
 def handle_iteration_complete(progress) -> Callable:
     """Create a callback for iteration completion"""
@@ -222,7 +339,36 @@ def handle_iteration_complete(progress) -> Callable:
         
     return on_iteration_complete
 
-@click.group()
+# Package this module lives in; falls back to "cli" when run as a script
+_PACKAGE = __package__ or "cli"
+
+class LazyGroup(click.Group):
+    """Click group that imports subcommand modules only when they are invoked"""
+    
+    def __init__(self, *args, lazy_subcommands: Optional[Dict[str, str]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Maps command name -> "module:attribute" relative to this package
+        self.lazy_subcommands = lazy_subcommands or {}
+    
+    def list_commands(self, ctx) -> List[str]:
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_subcommands))
+    
+    def get_command(self, ctx, cmd_name):
+        if cmd_name in self.lazy_subcommands:
+            return self._load_command(cmd_name)
+        return super().get_command(ctx, cmd_name)
+    
+    def _load_command(self, cmd_name: str) -> click.Command:
+        """Import the module defining a subcommand and return the command"""
+        module_name, attr = self.lazy_subcommands[cmd_name].split(":")
+        module = importlib.import_module(f"{_PACKAGE}.{module_name}")
+        return getattr(module, attr)
+
+@click.group(cls=LazyGroup, lazy_subcommands={
+    'run': 'commands.run:run',
+    'test-model': 'commands.model_check:test_model',
+    'init': 'commands.init:init'
+})
 @click.option('--workspace', '-w', default='./workspace', help='Workspace directory')
 @click.option('--config', '-c', help='Path to config file')
 @click.option('--log-file', '-l', help='Log file path')
@@ -242,260 +388,20 @@ def cli(ctx, workspace, config, log_file, verbose):
     # Load settings
     config_settings = load_settings(config)
     
-    # Override workspace in settings
-    config_settings.filesystem.workspace_path = workspace
+    # Override workspace in settings (settings are frozen, so copy)
+    config_settings = config_settings.model_copy(update={
+        'filesystem': config_settings.filesystem.model_copy(update={'workspace_path': workspace})
+    })
     
     # Save context for subcommands
     ctx.obj = {
         'workspace': workspace,
-        'settings': config_settings
+        'settings': config_settings,
+        'verbose': verbose
     }
 
-@cli.command()
-@click.argument('prompt')
-@click.option('--mode', '-m', type=click.Choice(['approval', 'autonomous']), default='approval', 
-              help='Agent operation mode')
-@click.option('--model-type', type=click.Choice(['llamacpp', 'transformers']), default='llamacpp',
-              help='Type of model to use')
-@click.option('--model-id', help='Model ID or path')
-@click.option('--iterations', '-i', type=int, help='Maximum number of iterations')
-@click.option('--context-docs', '-d', multiple=True, help='Path to context documents')
-@click.pass_context
-def run(ctx, prompt, mode, model_type, model_id, iterations, context_docs):
-    """Run the agent with the given prompt"""
-    workspace = ctx.obj['workspace']
-    config_settings = ctx.obj['settings']
-    
-    # Override settings
-    config_settings.agent.mode = mode
-    if iterations:
-        config_settings.agent.max_iterations = iterations
-    if model_id:
-        config_settings.model.model_id = model_id
-    
-    # Initialize components
-    model_kwargs = {"model_id": model_id} if model_id else {}
-    agent = Agent(
-        workspace_path=workspace,
-        model_type=model_type,
-        model_kwargs=model_kwargs
-    )
-    
-    # Load context documents
-    for doc_path in context_docs:
-        try:
-            with open(doc_path, 'r') as f:
-                content = f.read()
-            agent.add_context_doc(os.path.basename(doc_path), content)
-            console.print(f"[green]Loaded context document: {doc_path}[/green]")
-        except Exception as e:
-            console.print(f"[red]Error loading context document {doc_path}: {str(e)}[/red]")
-    
-    # Create progress display
-    progress = Progress(
-        TextColumn("[bold blue]{task.description}"),
-        BarColumn(),
-        TaskProgressColumn(),
-        TextColumn("•"),
-        TimeElapsedColumn(),
-    )
-    
-    # Start agent
-    console.print(f"[bold green]Starting agent with prompt:[/bold green] {prompt}")
-    console.print(f"[dim]Mode: {mode}, Model: {model_type}, Workspace: {workspace}[/dim]\n")
-    
-    with progress:
-        # Create task
-        task_id = progress.add_task(
-            "Running agent", 
-            total=iterations or config_settings.agent.max_iterations
-        )
-        
-        # Define iteration callback
-        def on_iteration_complete(data):
-            iteration = data.get("iteration", 0)
-            progress.update(task_id, completed=iteration)
-            
-            # Print thinking if available
-            if "thinking" in data:
-                console.print("\n[bold]Agent's thinking:[/bold]")
-                console.print(data["thinking"])
-            
-            # Print action results
-            for action_result in data.get("actions", []):
-                action = action_result.get("action", {})
-                result = action_result.get("result", {})
-                
-                if action and result:
-                    console.print("\n[bold cyan]Action:[/bold cyan]", action.get("type"))
-                    print_action(action)
-                    print_result(result)
-        
-        try:
-            # Run agent
-            if mode == "approval":
-                summary = agent.run(
-                    initial_prompt=prompt,
-                    on_action=handle_actions(agent, None),
-                    on_iteration_complete=on_iteration_complete
-                )
-            else:
-                summary = agent.run(
-                    initial_prompt=prompt,
-                    on_iteration_complete=on_iteration_complete
-                )
-            
-            # Print summary
-            console.print("\n[bold green]Agent execution complete![/bold green]")
-            console.print(f"[bold]Summary:[/bold]")
-            
-            summary_table = Table(show_header=False)
-            summary_table.add_column("Property")
-            summary_table.add_column("Value")
-            
-            summary_table.add_row("Iterations", str(summary.get("iterations", 0)))
-            summary_table.add_row("Total files", str(summary.get("total_files", 0)))
-            summary_table.add_row("Elapsed time", f"{summary.get('elapsed_time', 0):.2f}s")
-            
-            file_types = summary.get("file_types", {})
-            if file_types:
-                file_types_str = ", ".join([f"{ext}: {count}" for ext, count in file_types.items()])
-                summary_table.add_row("File types", file_types_str)
-                
-            console.print(summary_table)
-            
-            # Show workspace files
-            console.print("\n[bold]Workspace files:[/bold]")
-            files = summary.get("files", [])
-            
-            if files:
-                file_table = Table(show_header=True)
-                file_table.add_column("Type")
-                file_table.add_column("Name")
-                file_table.add_column("Path")
-                file_table.add_column("Size")
-                
-                for file in files:
-                    if file.get("is_dir", False):
-                        file_table.add_row(
-                            "📁", 
-                            file.get("name", ""),
-                            file.get("path", ""),
-                            ""
-                        )
-                    else:
-                        size_str = f"{file.get('size', 0) / 1024:.1f} KB" if file.get('size', 0) > 0 else ""
-                        file_table.add_row(
-                            "📄",
-                            file.get("name", ""),
-                            file.get("path", ""),
-                            size_str
-                        )
-                
-                console.print(file_table)
-            else:
-                console.print("[yellow]No files created[/yellow]")
-            
-        except KeyboardInterrupt:
-            console.print("\n[bold yellow]Agent execution interrupted by user[/bold yellow]")
-            agent.stop()
-        except Exception as e:
-            console.print(f"\n[bold red]Error during agent execution: {str(e)}[/bold red]")
-            agent.stop()
-            raise
-    
-    console.print("\n[bold green]Done![/bold green]")
-
-@cli.command()
-@click.option('--model-type', type=click.Choice(['llamacpp', 'transformers']), default='llamacpp', 
-              help='Type of model to use')
-@click.option('--model-id', help='Model ID or path')
-@click.pass_context
-def test_model(ctx, model_type, model_id):
-    """Test the LLM model"""
-    console.print(f"[bold]Testing {model_type} model[/bold]")
-    
-    if model_id:
-        console.print(f"Model ID: {model_id}")
-    
-    try:
-        # Initialize model
-        model_kwargs = {"model_id": model_id} if model_id else {}
-        model = get_model(model_type, **model_kwargs)
-        
-        # Test loading
-        console.print("Loading model...")
-        start_time = time.time()
-        model.load()
-        load_time = time.time() - start_time
-        console.print(f"[green]Model loaded successfully in {load_time:.2f}s[/green]")
-        
-        # Test generation
-        console.print("\nTesting text generation...")
-        prompt = "Write a function that calculates the factorial of a number."
-        
-        start_time = time.time()
-        response = model.generate(prompt, temperature=0.7, max_tokens=200)
-        generation_time = time.time() - start_time
-        
-        console.print(f"[bold]Prompt:[/bold] {prompt}")
-        console.print("[bold]Response:[/bold]")
-        console.print(response)
-        console.print(f"[dim]Generation time: {generation_time:.2f}s[/dim]")
-        
-        # Test tokenization
-        console.print("\nTesting tokenization...")
-        tokens = model.tokenize(prompt)
-        console.print(f"[green]Tokenized prompt into {len(tokens)} tokens[/green]")
-        
-        console.print("\n[bold green]Model test completed successfully![/bold green]")
-        
-    except Exception as e:
-        console.print(f"[bold red]Error testing model: {str(e)}[/bold red]")
-
-@cli.command()
-@click.pass_context
-def init(ctx):
-    """Initialize a new project in the workspace"""
-    workspace = ctx.obj['workspace']
-    
-    console.print(f"[bold]Initializing new project in {workspace}[/bold]")
-    
-    try:
-        # Create standard project structure
-        os.makedirs(os.path.join(workspace, "src"), exist_ok=True)
-        os.makedirs(os.path.join(workspace, "tests"), exist_ok=True)
-        os.makedirs(os.path.join(workspace, "docs"), exist_ok=True)
-        
-        # Create README.md
-        with open(os.path.join(workspace, "README.md"), 'w') as f:
-            f.write("# Project\n\nCreated with LLMAgent\n")
-        
-        # Create .gitignore
-        with open(os.path.join(workspace, ".gitignore"), 'w') as f:
-            f.write("__pycache__/\n*.py[cod]\n*$py.class\n.env\nvenv/\n.vscode/\n")
-        
-        # Create initial files
-        with open(os.path.join(workspace, "src", "__init__.py"), 'w') as f:
-            f.write("")
-            
-        with open(os.path.join(workspace, "tests", "__init__.py"), 'w') as f:
-            f.write("")
-            
-        console.print("[green]Project initialized successfully![/green]")
-        
-        # Print structure
-        console.print("\n[bold]Project structure:[/bold]")
-        console.print("├── src/")
-        console.print("│   └── __init__.py")
-        console.print("├── tests/")
-        console.print("│   └── __init__.py")
-        console.print("├── docs/")
-        console.print("├── README.md")
-        console.print("└── .gitignore")
-        
-    except Exception as e:
-        console.print(f"[bold red]Error initializing project: {str(e)}[/bold red]")
-
 if __name__ == '__main__':
+    # Let the subcommand modules import helpers from this module instead of
+    # loading a second copy of it
+    sys.modules.setdefault(f"{_PACKAGE}.main", sys.modules[__name__])
     cli(obj={})
@@ -1,8 +1,21 @@
 import os
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any, Union, Literal
+import json
+import pickle
+import hashlib
+import threading
+from collections import OrderedDict
+from pydantic import BaseModel, ConfigDict, Field
+from typing import List, Optional, Dict, Any, Union, Literal, Tuple
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
 
 class ModelSettings(BaseModel):
+    model_config = ConfigDict(frozen=True, validate_assignment=False, extra='ignore')
+    
     model_id: str = "TheBloke/Mistral-7B-Instruct-v0.2-GGUF"
     model_file: str = "mistral-7b-instruct-v0.2.Q4_K_M.gguf"
     context_length: int = 8192
@@ -11,8 +24,16 @@ class ModelSettings(BaseModel):
     max_tokens: int = 2048
     repetition_penalty: float = 1.1
     stop_tokens: List[str] = ["<|im_end|>", "<|endoftext|>"]
+    n_gpu_layers: int = -1
+    kv_cache_quantization: Optional[Literal["f16", "q8_0", "q4_0"]] = None
+    prompt_cache_mb: int = 0
+    router_model_id: Optional[str] = None
+    router_model_file: Optional[str] = None
+    router_model_type: str = "llamacpp"
 
 class FileSystemSettings(BaseModel):
+    model_config = ConfigDict(frozen=True, validate_assignment=False, extra='ignore')
+    
     workspace_path: str = Field(default_factory=lambda: os.path.join(os.getcwd(), "workspace"))
     allowed_extensions: List[str] = [".py", ".txt", ".md", ".json", ".yaml", ".yml", ".html", ".css", ".js", ".jsx", ".ts", ".tsx"]
     max_file_size_mb: int = 10
@@ -20,27 +41,43 @@ class FileSystemSettings(BaseModel):
     backup_path: Optional[str] = None
 
 class ExecutorSettings(BaseModel):
+    model_config = ConfigDict(frozen=True, validate_assignment=False, extra='ignore')
+    
     timeout_seconds: int = 30
     max_output_size_kb: int = 1024
     sandbox_enabled: bool = True
+    persistent_worker: bool = False
     environment_vars: Dict[str, str] = {}
     allowed_modules: List[str] = ["os", "sys", "pathlib", "json", "yaml", "re", "datetime", "collections", "math", "random", "time"]
 
 class AgentSettings(BaseModel):
+    model_config = ConfigDict(frozen=True, validate_assignment=False, extra='ignore')
+    
     mode: Literal["approval", "autonomous"] = "approval"
     max_iterations: int = 100
     think_aloud: bool = True
     max_thinking_tokens: int = 2000
     memory_enabled: bool = True
     memory_limit_mb: int = 100
+    context_window_turns: int = 8
+    semantic_cache_enabled: bool = False
+    semantic_cache_threshold: float = 0.92
+    semantic_cache_size: int = 512
+    template_cache_enabled: bool = False
+    template_cache_path: Optional[str] = None
 
 class MonitoringSettings(BaseModel):
+    model_config = ConfigDict(frozen=True, validate_assignment=False, extra='ignore')
+    
     status_interval_seconds: int = 60
     log_level: str = "INFO"
     telemetry_enabled: bool = True
     metrics_path: Optional[str] = None
+    status_history_path: Optional[str] = None
 
 class Settings(BaseModel):
+    model_config = ConfigDict(frozen=True, validate_assignment=False, extra='ignore')
+    
     model: ModelSettings = ModelSettings()
     filesystem: FileSystemSettings = FileSystemSettings()
     executor: ExecutorSettings = ExecutorSettings()
@@ -49,19 +86,101 @@ class Settings(BaseModel):
     
     @classmethod
     def load_from_file(cls, filepath: str) -> 'Settings':
-        """Load settings from a YAML or JSON file"""
-        import json
-        import yaml
+        """Load settings from a YAML or JSON file
         
-        with open(filepath, 'r') as f:
-            if filepath.endswith('.json'):
-                data = json.load(f)
-            elif filepath.endswith(('.yaml', '.yml')):
-                data = yaml.safe_load(f)
-            else:
-                raise ValueError(f"Unsupported file format: {filepath}")
+        Results for the most recently used files are cached in memory, and in
+        a pickled copy of the parsed file under the user cache directory, both
+        keyed by path and modification time, so an edited file is always re-parsed.
+        """
+        key = (os.path.abspath(filepath), os.path.getmtime(filepath))
+        
+        with _PRIMARY_LOCK:
+            cached = _PRIMARY.get(key[0])
+            if cached is not None and cached[0] == key[1]:
+                _PRIMARY.move_to_end(key[0])
+                return cached[1]
+            
+        data = _load_secondary(key)
+        if data is None:
+            data = _parse_file(filepath)
+            _store_secondary(key, data)
+            
+        loaded = cls(**data)
+        # Replaces any entry for an older version of the file
+        with _PRIMARY_LOCK:
+            _PRIMARY[key[0]] = (key[1], loaded)
+            _PRIMARY.move_to_end(key[0])
+            if len(_PRIMARY) > _PRIMARY_SIZE:
+                _PRIMARY.popitem(last=False)
+        return loaded
+
+# Settings are frozen, so loaded instances can be shared between callers;
+# (mtime, settings) by path, least recently used first
+_PRIMARY: 'OrderedDict[str, Tuple[float, Settings]]' = OrderedDict()
+_PRIMARY_SIZE = 8
+_PRIMARY_LOCK = threading.Lock()
+
+_CACHE_DIR = os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+    'llmagent'
+)
+
+# PyYAML is only imported the first time a YAML file is loaded
+_yaml = None
+
+def _get_yaml():
+    """Import PyYAML on first use"""
+    global _yaml
+    if _yaml is None:
+        import yaml
+        _yaml = yaml
+    return _yaml
+
+def _parse_file(filepath: str) -> Dict[str, Any]:
+    """Parse a YAML or JSON settings file"""
+    if filepath.endswith('.json'):
+        # Both parsers accept bytes, which skips decoding to str first
+        with open(filepath, 'rb') as f:
+            return _json_loads(f.read())
+    
+    with open(filepath, 'r') as f:
+        if filepath.endswith(('.yaml', '.yml')):
+            return _get_yaml().safe_load(f)
+        else:
+            raise ValueError(f"Unsupported file format: {filepath}")
+
+def _secondary_path(abspath: str) -> str:
+    """Get the on-disk cache file for a settings file"""
+    digest = hashlib.sha1(abspath.encode('utf-8')).hexdigest()
+    return os.path.join(_CACHE_DIR, f"{digest}.pkl")
+
+def _load_secondary(key: Tuple[str, float]) -> Optional[Dict[str, Any]]:
+    """Load parsed settings data from the on-disk cache if still current"""
+    abspath, mtime = key
+    try:
+        with open(_secondary_path(abspath), 'rb') as f:
+            entry = pickle.load(f)
+    except Exception:
+        return None
         
-        return cls(**data)
+    if entry.get('path') != abspath or entry.get('mtime') != mtime:
+        return None
+    return entry.get('data')
+
+def _store_secondary(key: Tuple[str, float], data: Dict[str, Any]) -> None:
+    """Write parsed settings data to the on-disk cache"""
+    abspath, mtime = key
+    cache_file = _secondary_path(abspath)
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+    
+    try:
+        os.makedirs(_CACHE_DIR, exist_ok=True)
+        with open(tmp_file, 'wb') as f:
+            pickle.dump({'path': abspath, 'mtime': mtime, 'data': data}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, cache_file)
+    except OSError:
+        # The cache is only an optimization
+        pass
 
-# Default settings instance
-settings = Settings()
+# Default settings instance (built from trusted defaults, so skip validation)
+settings = Settings.model_construct()
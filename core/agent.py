@@ -1,19 +1,85 @@
 import os
 import logging
-import json
 import time
 import re
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, Optional, Union, Tuple, Callable
 from datetime import datetime
-from .models import get_model, ModelBase
+import orjson
+from .models import get_model, ModelBase, ModelSession
 from .file_manager import FileManager
 from .executor import CodeExecutor, CodeExecutionResult
 from .prompt_manager import get_system_prompt, format_user_prompt
+from .semantic_cache import SemanticCache
+from .template_cache import TemplateCache
 from ..config.settings import settings
 from ..monitoring.status_reporter import StatusReporter
 
+_json_loads = orjson.loads
+_json_dumps = lambda obj: orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+_json_dumps_sorted = lambda obj: orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+
 logger = logging.getLogger(__name__)
 
+# Fenced code blocks with an optional language tag
+_CODEBLOCK_RE = re.compile(r"```(?:(\w+))?\s*\n(.*?)```", re.DOTALL)
+
+# Fallback command syntax like READ_FILE("path"), used when no JSON actions are
+# found. All commands are matched by one alternation in a single pass; quoted
+# arguments use '[^']*'|"[^"]*" rather than a back-referenced quote with a
+# negative lookahead, so the scan doesn't backtrack on unterminated strings.
+_CMD_RE = re.compile(
+    r"""(?P<read_file>READ_FILE\s*\(\s*['"](?P<read_path>[^'"]+)['"]\s*\))"""
+    r"""|(?P<write_file>WRITE_FILE\s*\(\s*['"](?P<write_path>[^'"]+)['"]\s*,\s*"""
+    r"""(?:'(?P<write_sq>[^']*)'|"(?P<write_dq>[^"]*)")\s*\))"""
+    r"""|(?P<run_code>RUN_CODE\s*\(\s*(?:'(?P<code_sq>[^']*)'|"(?P<code_dq>[^"]*)")\s*\))"""
+    r"""|(?P<list_files>LIST_FILES\s*\(\s*(?:['"](?P<list_path>[^'"]+)['"]\s*)?\))"""
+    r"""|(?P<create_directory>CREATE_DIR\s*\(\s*['"](?P<dir_path>[^'"]+)['"]\s*\))"""
+)
+
+# Builds the action for a command match, keyed by the matched group name
+_CMD_ACTIONS = {
+    "read_file": lambda m: {"type": "read_file", "params": {"filepath": m.group("read_path")}},
+    "write_file": lambda m: {"type": "write_file", "params": {
+        "filepath": m.group("write_path"),
+        "content": m.group("write_sq") if m.group("write_sq") is not None else m.group("write_dq")
+    }},
+    "run_code": lambda m: {"type": "run_code", "params": {
+        "code": m.group("code_sq") if m.group("code_sq") is not None else m.group("code_dq")
+    }},
+    "list_files": lambda m: {"type": "list_files", "params": {"path": m.group("list_path") or ""}},
+    "create_directory": lambda m: {"type": "create_directory", "params": {"path": m.group("dir_path")}}
+}
+
+# Phrases that mark the agent as finished, matched case-insensitively in one pass
+_DONE_PHRASES = [
+    "all tasks complete",
+    "tasks completed",
+    "implementation complete",
+    "finished all tasks",
+    "project complete",
+    "completed all requested tasks",
+    "implementation is now complete",
+    "work is complete"
+]
+_DONE_RE = re.compile("|".join(re.escape(phrase) for phrase in _DONE_PHRASES), re.IGNORECASE)
+
+# Actions that don't change the workspace and can run while the model is still generating
+_READ_ONLY_ACTIONS = frozenset({"read_file", "list_files", "read_logs"})
+
+# Prompt for classifying the next turn; only the tail of long messages is sent
+_ROUTER_PROMPT = (
+    "Classify what the assistant must do next. Answer with one word: "
+    "EXPLORE (only list or read files and logs), EDIT (write files or run code) "
+    "or REASON (plan, debug or anything else)."
+)
+_ROUTER_MAX_CHARS = 2000
+
+def _action_key(action: Dict[str, Any]) -> Union[str, bytes]:
+    """Identify an action by its canonical JSON form"""
+    return _json_dumps_sorted(action)
+
 class Agent:
     """LLM-powered development agent"""
     
@@ -27,6 +93,14 @@ class Agent:
         
         # Initialize components
         self.model = get_model(model_type, **self.model_kwargs)
+        
+        # Optional small model that serves file-exploration turns
+        self.router_model = None
+        if settings.model.router_model_id:
+            router_kwargs = {"model_id": settings.model.router_model_id}
+            if settings.model.router_model_file:
+                router_kwargs["model_file"] = settings.model.router_model_file
+            self.router_model = get_model(settings.model.router_model_type, **router_kwargs)
         self.file_manager = FileManager(self.workspace_path)
         self.executor = CodeExecutor(self.workspace_path)
         self.status_reporter = StatusReporter()
@@ -37,10 +111,37 @@ class Agent:
         self.iteration = 0
         self.memory = [] if settings.agent.memory_enabled else None
         self.context_docs = []
-        self.conversation_history = []
-        self.last_action_time = time.time()
+        self._system_prompt_cache: Optional[Tuple[Tuple, str]] = None
+        self.conversation_history = []  # Transcript; the model sees the session
+        self.session: Optional[ModelSession] = None
+        self._summary: Optional[str] = None  # Running summary of compacted turns
+        
+        # Pool for read-only actions; those started while a response streams
+        # are kept in _prefetched, keyed by _action_key
+        self._io_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="agent-io")
+        self._prefetched = {}
+        self.last_action_time = time.monotonic()
+        self._start_time = self.last_action_time
         self.is_active = False
         
+        # Workspace listing by relative path, updated as actions change files;
+        # None means it has to be rebuilt with a full scan
+        self._file_index: Optional[Dict[str, Dict[str, Any]]] = None
+        
+        # Reuse responses to recurring prompts instead of calling the model
+        self.semantic_cache = None
+        if settings.agent.semantic_cache_enabled:
+            self.semantic_cache = SemanticCache(
+                os.path.join(self.workspace_path, ".semantic_cache"),
+                threshold=settings.agent.semantic_cache_threshold,
+                max_entries=settings.agent.semantic_cache_size
+            )
+        
+        # Replay cached steps of recurring tasks
+        self.template_cache = None
+        if settings.agent.template_cache_enabled:
+            self.template_cache = TemplateCache(settings.agent.template_cache_path)
+        
     def set_context_docs(self, docs: List[Dict[str, str]]) -> None:
         """Set documents to be used as context for the agent"""
         self.context_docs = docs
@@ -56,6 +157,13 @@ class Agent:
         """Clear all context documents"""
         self.context_docs = []
         
+    def _get_system_prompt(self) -> str:
+        """Get the system prompt, rebuilding it only when the context docs change"""
+        key = tuple((doc.get('name'), hash(doc.get('content'))) for doc in self.context_docs)
+        if self._system_prompt_cache is None or self._system_prompt_cache[0] != key:
+            self._system_prompt_cache = (key, get_system_prompt(self.context_docs))
+        return self._system_prompt_cache[1]
+        
     def run(self, 
             initial_prompt: str, 
             max_iterations: Optional[int] = None,
@@ -78,30 +186,57 @@ class Agent:
             
         self.iteration = 0
         self.is_active = True
+        self._start_time = time.monotonic()
+        
+        # Report status about 100 times per run at most, not on every iteration
+        status_every = max(1, self.max_iterations // 100)
         self.status_reporter.start_task("Agent execution", self.max_iterations)
         
         # Initialize conversation with system prompt
-        system_prompt = get_system_prompt(self.context_docs)
-        self.conversation_history = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": initial_prompt}
-        ]
+        system_prompt = self._get_system_prompt()
+        self.conversation_history = [{"role": "system", "content": system_prompt}]
+        self.session = self.model.start_session(system_prompt)
+        self._summary = None
+        self._add_message("user", initial_prompt)
+        
+        # Action types executed so far, and whether cached steps still apply
+        action_sequence = []
+        replaying = self.template_cache is not None
         
         try:
             while self.iteration < self.max_iterations and self.is_active:
                 self.iteration += 1
-                self.status_reporter.update_status(f"Iteration {self.iteration}/{self.max_iterations}")
+                if self.iteration % status_every == 0:
+                    self.status_reporter.update_status(f"Iteration {self.iteration}/{self.max_iterations}")
+                
+                # Keep the prompt bounded by folding old turns into a summary
+                self._compact_history()
+                
+                self._prefetched = {}
                 
-                # Generate agent response
-                agent_response = self._get_agent_response()
+                # Replay a cached step of a recurring task if there is one
+                template_key = None
+                cached_step = None
+                if self.template_cache is not None:
+                    template_key = TemplateCache.make_key(initial_prompt, action_sequence)
+                    if replaying:
+                        cached_step = self.template_cache.get(template_key)
                 
-                # Extract actions from the response
-                actions = self._parse_actions(agent_response)
+                if cached_step is not None:
+                    logger.info("Replaying cached step from template cache")
+                    agent_response = cached_step["response"]
+                    actions = cached_step["actions"]
+                else:
+                    # Generate agent response
+                    agent_response = self._get_agent_response()
+                    
+                    # Extract actions from the response
+                    actions = self._parse_actions(agent_response)
                 
                 if not actions:
                     # No actions found, just treat as thinking
                     logger.info(f"No actions found in agent response, treating as thinking")
-                    self.conversation_history.append({"role": "assistant", "content": agent_response})
+                    self._add_message("assistant", agent_response)
                     
                     if on_iteration_complete:
                         on_iteration_complete({
@@ -113,34 +248,29 @@ class Agent:
                     continue
                 
                 # Process each action
-                all_results = []
-                for action in actions:
-                    action_type = action.get("type", "")
-                    action_params = action.get("params", {})
-                    
-                    # Check if action should be approved
-                    if self.mode == "approval" and on_action:
-                        approved = on_action(action)
-                        if not approved:
-                            result = {"status": "rejected", "message": "Action rejected by user"}
-                            all_results.append({"action": action, "result": result})
-                            continue
+                all_results = self._execute_actions(actions, on_action)
                     
-                    # Execute the action
-                    result = self._execute_action(action_type, action_params)
-                    all_results.append({"action": action, "result": result})
+                # Record the step, or stop replaying once results differ from the cached ones
+                if self.template_cache is not None:
+                    statuses = [item["result"].get("status") for item in all_results]
+                    if cached_step is None:
+                        self.template_cache.put(template_key, agent_response, actions, statuses)
+                    elif statuses != cached_step["statuses"]:
+                        logger.info("Action results differ from cached step, falling back to the model")
+                        replaying = False
+                    action_sequence.extend(action.get("type", "") for action in actions)
                     
                 # Format action results for LLM
-                results_str = json.dumps(all_results, indent=2)
-                self.conversation_history.append({"role": "assistant", "content": agent_response})
-                self.conversation_history.append({
-                    "role": "user", 
-                    "content": f"Action results:\n```json\n{results_str}\n```\n\nContinue based on these results."
-                })
+                results_str = _json_dumps(all_results)
+                self._add_message("assistant", agent_response)
+                self._add_message(
+                    "user",
+                    f"Action results:\n```json\n{results_str}\n```\n\nContinue based on these results."
+                )
                 
                 # Update status and call iteration callback
                 self.status_reporter.increment_progress()
-                self.last_action_time = time.time()
+                self.last_action_time = time.monotonic()
                 
                 if on_iteration_complete:
                     on_iteration_complete({
@@ -161,6 +291,10 @@ class Agent:
         finally:
             self.is_active = False
             self.status_reporter.complete_task()
+            if self.semantic_cache is not None:
+                self.semantic_cache.save()
+            if self.template_cache is not None:
+                self.template_cache.save()
             
         # Generate final summary
         return self._generate_summary()
@@ -170,17 +304,144 @@ class Agent:
         self.is_active = False
         logger.info("Agent execution stopped")
         
+    def close(self) -> None:
+        """Stop the agent and release its worker process, thread pool and model handles"""
+        self.stop()
+        self.executor.close()
+        self.status_reporter.close()
+        self._io_pool.shutdown(wait=False)
+        
+        # llama.cpp models free their weights and KV cache on close()
+        for model in (self.model, self.router_model):
+            close = getattr(getattr(model, "model", None), "close", None)
+            if callable(close):
+                close()
+        
+    def _add_message(self, role: str, content: str) -> None:
+        """Add a message to the model session and the transcript"""
+        self.session.append(role, content)
+        self.conversation_history.append({"role": role, "content": content})
+        
+    def _compact_history(self) -> None:
+        """Replace older turns with a running summary once the history outgrows the window
+        
+        The system prompt, the initial request and the last K turns are kept
+        verbatim. Compaction only starts after 2*K turns beyond those, so the
+        summary is updated every K iterations from just the turns being
+        dropped instead of from the whole history.
+        """
+        window = 2 * settings.agent.context_window_turns  # Two messages per turn
+        if window <= 0:
+            return
+            
+        head = 3 if self._summary is not None else 2
+        if len(self.conversation_history) - head <= 2 * window:
+            return
+            
+        older = self.conversation_history[head:-window]
+        recent = self.conversation_history[-window:]
+        
+        self._summary = self._summarize(older)
+        self.conversation_history = self.conversation_history[:2] + [
+            {"role": "system", "content": f"[PRIOR WORK SUMMARY]:\n{self._summary}"}
+        ] + recent
+        logger.info(f"Compacted {len(older)} messages into the work summary")
+        
+        # Start a fresh session from the compacted transcript
+        self.session = self.model.start_session(self.conversation_history[0]["content"])
+        for message in self.conversation_history[1:]:
+            self.session.append(message["role"], message["content"])
+        
+    def _summarize(self, messages: List[Dict[str, str]]) -> str:
+        """Summarize messages into bullet points, extending the current summary"""
+        transcript = "\n\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        if self._summary:
+            transcript = f"Summary so far:\n{self._summary}\n\nNew work:\n{transcript}"
+            
+        prompt = format_user_prompt([
+            {"role": "system", "content": "Summarize the agent's work below as short bullet points. "
+                                          "Keep file names, decisions, errors and open problems."},
+            {"role": "user", "content": transcript}
+        ])
+        return self.model.generate(prompt=prompt, temperature=0.0, max_tokens=256)
+        
+    def _route_turn(self, message: str) -> str:
+        """Classify the next turn as EXPLORE, EDIT or REASON using the router model
+        
+        Anything but a clear EXPLORE answer (including when there is no router)
+        is treated as REASON, so the main model handles the turn.
+        """
+        if self.router_model is None:
+            return "REASON"
+            
+        prompt = format_user_prompt([
+            {"role": "system", "content": _ROUTER_PROMPT},
+            {"role": "user", "content": message[-_ROUTER_MAX_CHARS:]}
+        ])
+        try:
+            answer = self.router_model.generate(prompt=prompt, temperature=0.0, max_tokens=3)
+        except Exception as e:
+            logger.warning(f"Router model failed, using main model: {e}")
+            return "REASON"
+            
+        label = answer.strip().split(maxsplit=1)[0].strip(".:").upper() if answer.strip() else ""
+        return label if label in ("EXPLORE", "EDIT") else "REASON"
+        
     def _get_agent_response(self) -> str:
         """Get the next response from the LLM agent"""
-        # Combine context and conversation history
         prompt = self.conversation_history
         
-        # Generate response
-        response = self.model.generate(
-            prompt=format_user_prompt(prompt),
-            temperature=settings.model.temperature,
-            max_tokens=settings.model.max_tokens
-        )
+        # Check for a cached response to a similar turn in the same conversation
+        if self.semantic_cache is not None:
+            query = prompt[-1]["content"]
+            context_key = SemanticCache.context_key(prompt[:-1])
+            cached = self.semantic_cache.get(query, context_key)
+            if cached is not None:
+                logger.info("Using cached response from semantic cache")
+                return cached
+        
+        # Stream the response; the session only submits what changed since the
+        # last turn. In autonomous mode, read-only actions that come before any
+        # other action are started as soon as their code block is complete.
+        prefetch = self.mode == "autonomous"
+        response = ""
+        scan_pos = 0
+        
+        generation_kwargs = {
+            "temperature": settings.model.temperature,
+            "max_tokens": settings.model.max_tokens
+        }
+        if self._route_turn(prompt[-1]["content"]) == "EXPLORE":
+            # The router keeps no session, but llama.cpp still reuses the
+            # prefix it evaluated on its previous turn
+            logger.debug("Routing turn to the router model")
+            stream = self.router_model.generate_stream(format_user_prompt(prompt), **generation_kwargs)
+        else:
+            stream = self.session.generate_stream(**generation_kwargs)
+        
+        for chunk in stream:
+            response += chunk
+            
+            # A code block can only have been closed by a chunk containing a backtick
+            if not prefetch or "`" not in chunk:
+                continue
+                
+            for match in _CODEBLOCK_RE.finditer(response, scan_pos):
+                scan_pos = match.end()
+                for action in self._parse_code_block(match.group(1) or "", match.group(2)):
+                    if action.get("type") not in _READ_ONLY_ACTIONS:
+                        prefetch = False
+                        break
+                    self._prefetched.setdefault(_action_key(action), self._io_pool.submit(
+                        self._execute_action, action["type"], action.get("params", {})
+                    ))
+                if not prefetch:
+                    break
+        
+        response = response.strip()
+        
+        if self.semantic_cache is not None:
+            self.semantic_cache.put(query, context_key, response)
         
         return response
         
@@ -189,63 +450,112 @@ class Agent:
         actions = []
         
         # Match code blocks with language and content
-        pattern = r"```(?:(\w+))?\s*\n(.*?)```"
-        matches = re.finditer(pattern, text, re.DOTALL)
+        for match in _CODEBLOCK_RE.finditer(text):
+            actions.extend(self._parse_code_block(match.group(1) or "", match.group(2)))
         
-        for match in matches:
-            language = match.group(1) or ""
-            content = match.group(2).strip()
-            
-            # Check for action blocks
-            if language.lower() == "json" and content.startswith("{") and "type" in content:
-                try:
-                    action = json.loads(content)
-                    if isinstance(action, dict) and "type" in action:
-                        actions.append(action)
-                except:
-                    pass
-                    
-            # Check for multiple actions in a JSON array
-            elif language.lower() == "json" and content.startswith("["):
+        # If no JSON actions found, look for command patterns
+        if not actions:
+            # Look for command patterns like READ_FILE, WRITE_FILE, etc.
+            for match in _CMD_RE.finditer(text):
                 try:
-                    action_list = json.loads(content)
-                    if isinstance(action_list, list):
-                        for item in action_list:
-                            if isinstance(item, dict) and "type" in item:
-                                actions.append(item)
+                    action = _CMD_ACTIONS[match.lastgroup](match)
+                    actions.append(action)
                 except:
                     pass
         
-        # If no JSON actions found, look for command patterns
-        if not actions:
-            # Look for command patterns like READ_FILE, WRITE_FILE, etc.
-            cmd_patterns = {
-                r"READ_FILE\s*\(\s*['\"]([^'\"]+)['\"]\s*\)": 
-                    lambda m: {"type": "read_file", "params": {"filepath": m.group(1)}},
-                    
-                r"WRITE_FILE\s*\(\s*['\"]([^'\"]+)['\"]\s*,\s*(['\"])(((?!\2).)*)\2\s*\)":
-                    lambda m: {"type": "write_file", "params": {"filepath": m.group(1), "content": m.group(3)}},
-                    
-                r"RUN_CODE\s*\(\s*(['\"])(((?!\1).)*)\1\s*\)":
-                    lambda m: {"type": "run_code", "params": {"code": m.group(2)}},
-                    
-                r"LIST_FILES\s*\(\s*(?:['\"]([^'\"]+)['\"]\s*)?\)":
-                    lambda m: {"type": "list_files", "params": {"path": m.group(1) or ""}},
-                    
-                r"CREATE_DIR\s*\(\s*['\"]([^'\"]+)['\"]\s*\)":
-                    lambda m: {"type": "create_directory", "params": {"path": m.group(1)}}
-            }
-            
-            for pattern, action_fn in cmd_patterns.items():
-                for match in re.finditer(pattern, text, re.DOTALL):
-                    try:
-                        action = action_fn(match)
-                        actions.append(action)
-                    except:
-                        pass
+        return actions
+        
+    def _parse_code_block(self, language: str, content: str) -> List[Dict[str, Any]]:
+        """Parse the actions in a single fenced code block"""
+        actions = []
+        
+        # Only JSON objects or arrays can hold actions; skip anything else
+        # without paying for a failed parse, or for copying it to strip it
+        if language.lower() != "json":
+            return actions
+        content = content.strip()
+        if not content or content[0] not in "{[" or content[-1] not in "}]":
+            return actions
         
+        # Check for action blocks
+        if content[0] == "{" and "type" in content:
+            try:
+                action = _json_loads(content)
+                if isinstance(action, dict) and "type" in action:
+                    actions.append(action)
+            except ValueError:
+                pass
+                
+        # Check for multiple actions in a JSON array
+        elif content[0] == "[":
+            try:
+                action_list = _json_loads(content)
+                if isinstance(action_list, list):
+                    for item in action_list:
+                        if isinstance(item, dict) and "type" in item:
+                            actions.append(item)
+            except ValueError:
+                pass
+                
         return actions
         
+    def _execute_actions(self, 
+                         actions: List[Dict[str, Any]], 
+                         on_action: Optional[Callable[[Dict[str, Any]], bool]] = None) -> List[Dict[str, Any]]:
+        """Execute actions in order and return their results
+        
+        When actions don't need approval, each run of consecutive read-only
+        actions is executed concurrently; mutating actions run one at a time
+        between them, so reads still see the writes that precede them.
+        """
+        needs_approval = self.mode == "approval" and on_action is not None
+        all_results = []
+        batch = []
+        
+        for action in actions:
+            action_type = action.get("type", "")
+            action_params = action.get("params", {})
+            
+            if not needs_approval and action_type in _READ_ONLY_ACTIONS:
+                batch.append(action)
+                continue
+            self._run_read_batch(batch, all_results)
+            
+            # Check if action should be approved
+            if needs_approval:
+                approved = on_action(action)
+                if not approved:
+                    result = {"status": "rejected", "message": "Action rejected by user"}
+                    all_results.append({"action": action, "result": result})
+                    continue
+            
+            # Execute the action, unless it already ran while the response streamed
+            future = self._prefetched.pop(_action_key(action), None) if self._prefetched else None
+            if future is not None:
+                result = future.result()
+            else:
+                result = self._execute_action(action_type, action_params)
+            all_results.append({"action": action, "result": result})
+            
+        self._run_read_batch(batch, all_results)
+        return all_results
+        
+    def _run_read_batch(self, batch: List[Dict[str, Any]], all_results: List[Dict[str, Any]]) -> None:
+        """Run a batch of read-only actions concurrently, appending results in order"""
+        if not batch:
+            return
+            
+        futures = []
+        for action in batch:
+            future = self._prefetched.pop(_action_key(action), None) if self._prefetched else None
+            if future is None:
+                future = self._io_pool.submit(self._execute_action, action.get("type", ""), action.get("params", {}))
+            futures.append(future)
+            
+        for action, future in zip(batch, futures):
+            all_results.append({"action": action, "result": future.result()})
+        batch.clear()
+        
     def _execute_action(self, action_type: str, params: Dict[str, Any]) -> Dict[str, Any]:
         """Execute a single action and return the result"""
         try:
@@ -261,6 +571,8 @@ class Agent:
                 filepath = params.get("filepath", "")
                 content = params.get("content", "")
                 success = self.file_manager.write_file(filepath, content)
+                if success:
+                    self._index_path(filepath)
                 return {
                     "status": "success" if success else "error",
                     "message": f"File {'written' if success else 'write failed'}: {filepath}"
@@ -277,6 +589,8 @@ class Agent:
             elif action_type == "create_directory":
                 path = params.get("path", "")
                 success = self.file_manager.create_directory(path)
+                if success:
+                    self._index_path(path)
                 return {
                     "status": "success" if success else "error",
                     "message": f"Directory {'created' if success else 'creation failed'}: {path}"
@@ -285,6 +599,8 @@ class Agent:
             elif action_type == "delete_file":
                 filepath = params.get("filepath", "")
                 success = self.file_manager.delete_file(filepath)
+                if success:
+                    self._unindex_path(filepath)
                 return {
                     "status": "success" if success else "error",
                     "message": f"File {'deleted' if success else 'deletion failed'}: {filepath}"
@@ -294,6 +610,7 @@ class Agent:
                 code = params.get("code", "")
                 mode = params.get("mode", "exec")
                 result = self.executor.execute_code(code, mode)
+                self._file_index = None  # Code may have changed any file
                 return {
                     "status": "success" if result.success else "error",
                     "output": result.output,
@@ -305,6 +622,7 @@ class Agent:
             elif action_type == "run_command":
                 command = params.get("command", "")
                 result = self.executor.run_command(command)
+                self._file_index = None  # Code may have changed any file
                 return {
                     "status": "success" if result.success else "error",
                     "output": result.output,
@@ -315,6 +633,7 @@ class Agent:
             elif action_type == "run_test":
                 test_path = params.get("test_path", "")
                 result = self.executor.run_test(test_path)
+                self._file_index = None  # Code may have changed any file
                 return {
                     "status": "success" if result.success else "error",
                     "output": result.output,
@@ -346,42 +665,57 @@ class Agent:
     
     def _check_if_done(self, response: str) -> bool:
         """Check if the agent has completed all tasks"""
-        lower_response = response.lower()
-        
-        done_phrases = [
-            "all tasks complete",
-            "tasks completed",
-            "implementation complete",
-            "finished all tasks",
-            "project complete",
-            "completed all requested tasks",
-            "implementation is now complete",
-            "work is complete"
-        ]
-        
-        for phrase in done_phrases:
-            if phrase in lower_response:
-                return True
+        return _DONE_RE.search(response) is not None
+        
+    def _index_path(self, path: str) -> None:
+        """Refresh the file index entries for a path and any new parent directories"""
+        if self._file_index is None:
+            return
+            
+        rel_path = os.path.relpath(os.path.join(self.workspace_path, path), self.workspace_path)
+        if rel_path.startswith(os.pardir):
+            return
+            
+        parts = rel_path.split(os.sep)
+        for i in range(1, len(parts) + 1):
+            sub_path = os.sep.join(parts[:i])
+            if i < len(parts) and sub_path in self._file_index:
+                continue
+            info = self.file_manager.get_file_info(sub_path)
+            if info:
+                self._file_index[sub_path] = info
                 
-        return False
+    def _unindex_path(self, path: str) -> None:
+        """Remove a deleted path, and anything below it, from the file index"""
+        if self._file_index is None:
+            return
+            
+        rel_path = os.path.relpath(os.path.join(self.workspace_path, path), self.workspace_path)
+        prefix = rel_path + os.sep
+        for key in [key for key in self._file_index if key == rel_path or key.startswith(prefix)]:
+            del self._file_index[key]
+        
+    def _generate_summary(self, full_rescan: bool = False) -> Dict[str, Any]:
+        """Generate a summary of the agent's work
         
-    def _generate_summary(self) -> Dict[str, Any]:
-        """Generate a summary of the agent's work"""
-        files = self.file_manager.list_files()
+        Args:
+            full_rescan: Rebuild the file index from disk, e.g. when something
+                other than the agent changed the workspace
+        """
+        if full_rescan or self._file_index is None:
+            self._file_index = {f['path']: f for f in self.file_manager.list_files()}
+        files = list(self._file_index.values())
         
         # Get file counts by type
-        file_types = {}
-        for file in files:
-            if not file['is_dir']:
-                ext = file.get('extension', '')
-                file_types[ext] = file_types.get(ext, 0) + 1
+        non_dir = [f for f in files if not f['is_dir']]
+        file_types = Counter(f['extension'] for f in non_dir)
                 
         # Format summary
         return {
             "iterations": self.iteration,
-            "total_files": len([f for f in files if not f['is_dir']]),
-            "file_types": file_types,
-            "elapsed_time": time.time() - self.last_action_time,
+            "total_files": len(non_dir),
+            "file_types": dict(file_types),
+            "elapsed_time": time.monotonic() - self._start_time,
             "timestamp": datetime.now().isoformat(),
             "workspace": self.workspace_path,
             "files": files
@@ -1,20 +1,78 @@
 import os
 import sys
 import subprocess
-import tempfile
 import logging
 import time
 import json
 import io
 import traceback
+import importlib
+import multiprocessing
+from contextlib import redirect_stdout, redirect_stderr
 from typing import Dict, List, Any, Optional, Tuple, Union
 from pathlib import Path
-import threading
 import signal
 from ..config.settings import settings
 
 logger = logging.getLogger(__name__)
 
+# Block size for reading log files backward from the end
+_TAIL_BLOCK_SIZE = 8192
+
+def _kill_process_tree(process: subprocess.Popen) -> None:
+    """Kill a process and, on POSIX, the session it leads so no child keeps the pipes open"""
+    if os.name == "posix":
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+            return
+        except OSError:
+            pass
+    process.kill()
+
+def _worker_main(conn, workspace_path: str, environment_vars: Dict[str, str]) -> None:
+    """Loop of the persistent worker process: run code sent over the pipe"""
+    os.chdir(workspace_path)
+    os.environ.update(environment_vars)
+    sys.path.insert(0, workspace_path)
+    workspace_prefix = os.path.join(os.path.abspath(workspace_path), "")
+    
+    while True:
+        try:
+            mode, code = conn.recv()
+        except EOFError:
+            break
+            
+        output_buffer = io.StringIO()
+        error_buffer = io.StringIO()
+        return_value = None
+        success = False
+        
+        # Each snippet gets a fresh namespace, as with a new interpreter
+        namespace = {"__name__": "__main__", "__builtins__": __builtins__}
+        loaded_modules = set(sys.modules)
+        try:
+            with redirect_stdout(output_buffer), redirect_stderr(error_buffer):
+                if mode == "eval":
+                    return_value = json.loads(json.dumps(eval(code, namespace), default=str))
+                else:
+                    exec(code, namespace)
+            success = True
+        except SystemExit as e:
+            success = e.code in (None, 0)
+        except BaseException as e:
+            error_buffer.write(f"ERROR: {e}\n")
+            error_buffer.write(traceback.format_exc())
+            
+        # Forget workspace modules the snippet imported, so the next one sees
+        # any edits to them; other modules stay cached
+        for name in set(sys.modules) - loaded_modules:
+            module_file = getattr(sys.modules.get(name), "__file__", None)
+            if module_file and os.path.abspath(module_file).startswith(workspace_prefix):
+                del sys.modules[name]
+        importlib.invalidate_caches()
+            
+        conn.send((success, output_buffer.getvalue(), error_buffer.getvalue(), return_value))
+
 class CodeExecutionResult:
     """Stores the result of code execution"""
     
@@ -68,17 +126,22 @@ class CodeExecutor:
         self.sandbox_enabled = settings.executor.sandbox_enabled
         self.environment_vars = settings.executor.environment_vars.copy()
         self.allowed_modules = set(settings.executor.allowed_modules)
+        self.persistent_worker = settings.executor.persistent_worker
+        self._worker = None
+        self._worker_conn = None
         
     def execute_code(self, code: str, mode: str = "exec") -> CodeExecutionResult:
         """Execute Python code string in a safe environment"""
         if self.sandbox_enabled:
+            if self.persistent_worker:
+                return self._execute_in_worker(code, mode)
             return self._execute_sandboxed(code, mode)
         else:
             return self._execute_direct(code, mode)
     
     def _execute_direct(self, code: str, mode: str = "exec") -> CodeExecutionResult:
         """Execute code directly in the current process (unsafe)"""
-        start_time = time.time()
+        start_time = time.monotonic()
         output_buffer = io.StringIO()
         error_buffer = io.StringIO()
         return_value = None
@@ -111,7 +174,7 @@ class CodeExecutor:
             sys.stderr = original_stderr
             
             # Get execution time
-            execution_time = time.time() - start_time
+            execution_time = time.monotonic() - start_time
             
             # Get output and error messages
             output = output_buffer.getvalue()
@@ -133,15 +196,11 @@ class CodeExecutor:
     
     def _execute_sandboxed(self, code: str, mode: str = "exec") -> CodeExecutionResult:
         """Execute code in a separate process (safer)"""
-        start_time = time.time()
+        start_time = time.monotonic()
         
-        # Create a temporary file
-        with tempfile.NamedTemporaryFile(suffix=".py", delete=False) as temp_file:
-            temp_path = temp_file.name
-            
-            # Prepare the code
-            if mode == "eval":
-                wrapped_code = f"""
+        # Prepare the code
+        if mode == "eval":
+            wrapped_code = f"""
 import sys
 import json
 import traceback
@@ -155,8 +214,8 @@ except Exception as e:
     traceback.print_exc(file=sys.stderr)
     sys.exit(1)
 """
-            else:
-                wrapped_code = f"""
+        else:
+            wrapped_code = f"""
 import sys
 import traceback
 
@@ -168,10 +227,7 @@ except Exception as e:
     traceback.print_exc(file=sys.stderr)
     sys.exit(1)
 """
-            
-            # Write code to temp file
-            temp_file.write(wrapped_code.encode('utf-8'))
-            
+        
         try:
             # Set environment variables
             env = os.environ.copy()
@@ -184,28 +240,25 @@ except Exception as e:
             else:
                 env['PYTHONPATH'] = self.workspace_path
                 
-            # Run in subprocess
+            # Run in subprocess, feeding the code through stdin
             process = subprocess.Popen(
-                [sys.executable, temp_path],
+                [sys.executable, "-"],
+                stdin=subprocess.PIPE,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
                 cwd=self.workspace_path,
                 env=env,
-                text=True
+                text=True,
+                start_new_session=os.name == "posix"
             )
             
-            # Set timeout using a thread
-            timer = threading.Timer(self.timeout_seconds, lambda: process.kill())
-            timer.start()
-            
             try:
-                stdout, stderr = process.communicate()
+                stdout, stderr = process.communicate(input=wrapped_code, timeout=self.timeout_seconds)
                 exit_code = process.returncode
-            finally:
-                timer.cancel()
-                
-            # Process was killed due to timeout
-            if exit_code == -9:
+            except subprocess.TimeoutExpired:
+                # Kill the process and drain its pipes
+                _kill_process_tree(process)
+                stdout, _ = process.communicate()
                 return CodeExecutionResult(
                     success=False,
                     output=stdout[:self.max_output_size] if stdout else "",
@@ -225,7 +278,7 @@ except Exception as e:
                 
             # Create result
             success = exit_code == 0
-            execution_time = time.time() - start_time
+            execution_time = time.monotonic() - start_time
                 
             return CodeExecutionResult(
                 success=success,
@@ -236,35 +289,117 @@ except Exception as e:
             )
                 
         except Exception as e:
-            execution_time = time.time() - start_time
+            execution_time = time.monotonic() - start_time
             return CodeExecutionResult(
                 success=False,
                 output="",
                 error=f"Execution failed: {str(e)}\n{traceback.format_exc()}",
                 execution_time=execution_time
             )
-        finally:
-            # Remove temporary file
-            try:
-                os.unlink(temp_path)
-            except:
-                pass
+    
+    def _start_worker(self) -> None:
+        """Start the persistent worker process"""
+        # Spawn rather than fork: the agent process runs threads of its own
+        context = multiprocessing.get_context("spawn")
+        parent_conn, child_conn = context.Pipe()
+        self._worker = context.Process(
+            target=_worker_main,
+            args=(child_conn, self.workspace_path, self.environment_vars),
+            daemon=True
+        )
+        self._worker.start()
+        child_conn.close()
+        self._worker_conn = parent_conn
+        logger.debug(f"Started persistent worker (pid {self._worker.pid})")
+        
+    def _stop_worker(self) -> None:
+        """Terminate the persistent worker process"""
+        if self._worker is None:
+            return
+            
+        self._worker_conn.close()
+        self._worker.terminate()
+        self._worker.join(timeout=1)
+        self._worker = None
+        self._worker_conn = None
+        
+    def _execute_in_worker(self, code: str, mode: str = "exec") -> CodeExecutionResult:
+        """Execute code in a long-lived worker process instead of a new interpreter per call"""
+        start_time = time.monotonic()
+        
+        if self._worker is None or not self._worker.is_alive():
+            self._start_worker()
+            
+        try:
+            self._worker_conn.send((mode, code))
+            
+            if not self._worker_conn.poll(self.timeout_seconds):
+                # Replace the stuck worker; the next call starts a fresh one
+                self._stop_worker()
+                return CodeExecutionResult(
+                    success=False,
+                    output="",
+                    error=f"Execution timed out after {self.timeout_seconds} seconds",
+                    execution_time=self.timeout_seconds
+                )
+                
+            success, stdout, stderr, return_value = self._worker_conn.recv()
+            
+        except (EOFError, OSError) as e:
+            # The worker died (e.g. the code called os._exit or crashed)
+            self._stop_worker()
+            return CodeExecutionResult(
+                success=False,
+                output="",
+                error=f"Execution failed: worker process exited ({e})",
+                execution_time=time.monotonic() - start_time
+            )
+            
+        return CodeExecutionResult(
+            success=success,
+            output=stdout[:self.max_output_size],
+            error=stderr[:self.max_output_size],
+            return_value=return_value,
+            execution_time=time.monotonic() - start_time
+        )
+        
+    def close(self) -> None:
+        """Release the persistent worker, if one is running"""
+        self._stop_worker()
     
     def run_test(self, test_path: str) -> CodeExecutionResult:
         """Run pytest on a specific test file or directory"""
-        import pytest
-        
-        start_time = time.time()
-        output_buffer = io.StringIO()
+        start_time = time.monotonic()
         
         try:
-            exit_code = pytest.main([
-                "-v",
-                os.path.join(self.workspace_path, test_path)
-            ], plugins=[PytestCapture(output_buffer)])
+            env = os.environ.copy()
+            env.update(self.environment_vars)
             
-            success = exit_code == 0
-            output = output_buffer.getvalue()
+            # Run pytest in a fresh interpreter so its plugins and the imported
+            # test modules never load into the agent process
+            process = subprocess.Popen(
+                [sys.executable, "-m", "pytest", "-v", os.path.join(self.workspace_path, test_path)],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                cwd=self.workspace_path,
+                env=env,
+                text=True,
+                start_new_session=os.name == "posix"
+            )
+            
+            try:
+                output, _ = process.communicate(timeout=self.timeout_seconds)
+            except subprocess.TimeoutExpired:
+                _kill_process_tree(process)
+                output, _ = process.communicate()
+                return CodeExecutionResult(
+                    success=False,
+                    output=output[:self.max_output_size] if output else "",
+                    error=f"Test run timed out after {self.timeout_seconds} seconds",
+                    execution_time=self.timeout_seconds
+                )
+            
+            success = process.returncode == 0
             
             if len(output) > self.max_output_size:
                 output = output[:self.max_output_size] + "\n... [output truncated]"
@@ -273,7 +408,7 @@ except Exception as e:
                 success=success,
                 output=output,
                 error="" if success else "Tests failed",
-                execution_time=time.time() - start_time
+                execution_time=time.monotonic() - start_time
             )
             
         except Exception as e:
@@ -281,12 +416,12 @@ except Exception as e:
                 success=False,
                 output="",
                 error=f"Failed to run tests: {str(e)}\n{traceback.format_exc()}",
-                execution_time=time.time() - start_time
+                execution_time=time.monotonic() - start_time
             )
     
     def run_command(self, command: str) -> CodeExecutionResult:
         """Run a shell command in the workspace directory"""
-        start_time = time.time()
+        start_time = time.monotonic()
         
         try:
             # Set environment variables
@@ -301,21 +436,17 @@ except Exception as e:
                 stderr=subprocess.PIPE,
                 cwd=self.workspace_path,
                 env=env,
-                text=True
+                text=True,
+                start_new_session=os.name == "posix"
             )
             
-            # Set timeout using a thread
-            timer = threading.Timer(self.timeout_seconds, lambda: process.kill())
-            timer.start()
-            
             try:
-                stdout, stderr = process.communicate()
+                stdout, stderr = process.communicate(timeout=self.timeout_seconds)
                 exit_code = process.returncode
-            finally:
-                timer.cancel()
-                
-            # Process was killed due to timeout
-            if exit_code == -9:
+            except subprocess.TimeoutExpired:
+                # Kill the process and drain its pipes
+                _kill_process_tree(process)
+                stdout, _ = process.communicate()
                 return CodeExecutionResult(
                     success=False,
                     output=stdout[:self.max_output_size] if stdout else "",
@@ -333,7 +464,7 @@ except Exception as e:
                 success=exit_code == 0,
                 output=stdout,
                 error=stderr,
-                execution_time=time.time() - start_time
+                execution_time=time.monotonic() - start_time
             )
             
         except Exception as e:
@@ -341,7 +472,7 @@ except Exception as e:
                 success=False,
                 output="",
                 error=f"Command execution failed: {str(e)}\n{traceback.format_exc()}",
-                execution_time=time.time() - start_time
+                execution_time=time.monotonic() - start_time
             )
             
     def read_logs(self, log_path: str, num_lines: int = 100) -> str:
@@ -351,25 +482,28 @@ except Exception as e:
         if not os.path.exists(full_path):
             return f"Error: Log file '{log_path}' does not exist"
             
+        if num_lines <= 0:
+            return ""
+            
         try:
-            # Read last N lines
-            with open(full_path, 'r', encoding='utf-8', errors='replace') as f:
-                lines = f.readlines()
-                return ''.join(lines[-num_lines:]) if lines else ""
+            # Read blocks backward from the end until we have N lines
+            with open(full_path, 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                pos = f.tell()
+                blocks = []
+                newlines = 0
+                
+                while pos > 0 and newlines <= num_lines:
+                    read_size = min(_TAIL_BLOCK_SIZE, pos)
+                    pos -= read_size
+                    f.seek(pos)
+                    block = f.read(read_size)
+                    blocks.append(block)
+                    newlines += block.count(b'\n')
+                    
+            data = b''.join(reversed(blocks))
+            lines = data.splitlines(keepends=True)
+            return b''.join(lines[-num_lines:]).decode('utf-8', errors='replace')
         except Exception as e:
             return f"Error reading log file: {str(e)}"
 
-
-class PytestCapture:
-    """Pytest plugin to capture test output"""
-    
-    def __init__(self, buffer):
-        self.buffer = buffer
-        
-    def pytest_runtest_logreport(self, report):
-        """Called for test setup/call/teardown report"""
-        if report.when == 'call':
-            if hasattr(report, 'capstdout'):
-                self.buffer.write(report.capstdout)
-            if hasattr(report, 'capstderr'):
-                self.buffer.write(report.capstderr)
@@ -1,26 +1,64 @@
 import os
 import shutil
+import stat
+import tarfile
 import logging
 import time
 from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Optional, Union, Set, Tuple
+from typing import List, Dict, Optional, Union, Set, Tuple, Iterator
 import hashlib
 import json
+import marshal
+import mmap
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .exceptions import FileOperationError
 from ..config.settings import settings
 
 logger = logging.getLogger(__name__)
 
+def _ext(name: str) -> str:
+    """Get the extension of a bare file name, as os.path.splitext would"""
+    i = name.rfind('.')
+    return name[i:] if i > 0 else ''
+
+try:
+    import blake3
+    _CHECKSUM_ALGO = "blake3"
+except ImportError:
+    blake3 = None
+    _CHECKSUM_ALGO = "sha256"
+
+# Large blocks keep the hasher in C (with the GIL released) for longer per call
+_CHECKSUM_BLOCK_SIZE = 1024 * 1024
+# Files at least this large are hashed and read through a memory map
+_MMAP_THRESHOLD = 4 * 1024 * 1024
+_HASH_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+# Checksum index file, and the JSON file older versions wrote
+_CHECKSUM_FILE = ".checksums.bin"
+_LEGACY_CHECKSUM_FILE = ".checksums.json"
+_CHECKSUM_FILES = frozenset((_CHECKSUM_FILE, _LEGACY_CHECKSUM_FILE))
+# Bumped when the layout of the checksum entries changes
+_CHECKSUM_FORMAT = 2
+
 class FileManager:
     """Manages file operations within a predefined workspace"""
     
     def __init__(self, workspace_path: Optional[str] = None):
         self.workspace_path = workspace_path or settings.filesystem.workspace_path
-        self.allowed_extensions = set(settings.filesystem.allowed_extensions)
+        self.allowed_extensions = frozenset(settings.filesystem.allowed_extensions)
         self.max_file_size = settings.filesystem.max_file_size_mb * 1024 * 1024  # Convert to bytes
         self.backup_enabled = settings.filesystem.backup_enabled
         self.backup_path = settings.filesystem.backup_path or os.path.join(self.workspace_path, "_backups")
-        self.file_checksums = {}  # Track file checksums to detect changes
+        self._backup_prefix = os.path.join(os.path.abspath(self.backup_path), "")
+        # Absolute workspace path; relative paths are sliced off after the prefix
+        self._workspace_abs = os.path.abspath(self.workspace_path)
+        self._workspace_prefix = os.path.join(self._workspace_abs, "")
+        self._workspace_prefix_len = len(self._workspace_prefix)
+        # Track file checksums to detect changes: rel_path -> {"size", "mtime_ns", "sha"},
+        # where sha is None until it's needed
+        self.file_checksums = {}
         
         # Initialize the workspace
         self._initialize_workspace()
@@ -36,56 +74,177 @@ class FileManager:
                 logger.info(f"Backup directory initialized at: {self.backup_path}")
                 
             # Load file checksums if present
-            checksum_file = os.path.join(self.workspace_path, ".checksums.json")
-            if os.path.exists(checksum_file):
-                with open(checksum_file, 'r') as f:
-                    self.file_checksums = json.load(f)
+            self._load_checksums()
                     
         except Exception as e:
             logger.error(f"Failed to initialize workspace: {e}")
             raise
     
+    def _make_abs(self, rel_path: str) -> str:
+        """Resolve a workspace-relative path, rejecting paths outside the workspace"""
+        abs_path = os.path.normpath(os.path.join(self._workspace_abs, rel_path))
+        if abs_path != self._workspace_abs and not abs_path.startswith(self._workspace_prefix):
+            raise FileOperationError(f"Path is outside the workspace: {rel_path}")
+        return abs_path
+    
+    def _rel(self, abs_path: str) -> str:
+        """Get the workspace-relative form of an absolute path inside the workspace"""
+        return abs_path[self._workspace_prefix_len:]
+    
+    def _scan_tree(self, path: str) -> Iterator[os.DirEntry]:
+        """Yield the file entries under path, recursing into subdirectories (not symlinks)"""
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                    except OSError:
+                        is_dir = False
+                    if is_dir:
+                        yield from self._scan_tree(entry.path)
+                    else:
+                        yield entry
+        except OSError as e:
+            logger.error(f"Error scanning {path}: {e}")
+    
+    def _load_checksums(self) -> None:
+        """Load the checksum index, migrating the older JSON file if needed"""
+        checksum_file = os.path.join(self.workspace_path, _CHECKSUM_FILE)
+        legacy_file = os.path.join(self.workspace_path, _LEGACY_CHECKSUM_FILE)
+        data = None
+        
+        try:
+            if os.path.exists(checksum_file):
+                with open(checksum_file, 'rb') as f:
+                    data = marshal.load(f)
+            elif os.path.exists(legacy_file):
+                with open(legacy_file, 'r') as f:
+                    data = json.load(f)
+            else:
+                return
+        except (OSError, ValueError, EOFError, TypeError) as e:
+            logger.warning(f"Could not read checksum index: {e}")
+            
+        # Rehash checksums that are unreadable, in an older layout or made
+        # with another algorithm
+        if (isinstance(data, dict) and data.get("format") == _CHECKSUM_FORMAT
+                and data.get("algo") == _CHECKSUM_ALGO and isinstance(data.get("files"), dict)):
+            self.file_checksums = data["files"]
+            if not os.path.exists(checksum_file):
+                self._save_checksums()
+        else:
+            logger.info(f"Rehashing workspace checksums with {_CHECKSUM_ALGO}")
+            self._update_checksums()
+            
+        if os.path.exists(legacy_file):
+            os.remove(legacy_file)
+    
     def _update_checksums(self) -> None:
         """Update checksums for all files in workspace"""
-        self.file_checksums = {}
+        file_checksums = {}
+        to_hash = []
         
-        for root, _, files in os.walk(self.workspace_path):
-            for file in files:
-                filepath = os.path.join(root, file)
+        for entry in self._scan_tree(self._workspace_abs):
+            # Skip backup directory and checksum file
+            if entry.name in _CHECKSUM_FILES or entry.path.startswith(self._backup_prefix):
+                continue
                 
-                # Skip backup directory and checksum file
-                if self.backup_path in filepath or ".checksums.json" in filepath:
-                    continue
+            try:
+                stats = entry.stat()
+            except OSError:
+                continue
                 
-                rel_path = os.path.relpath(filepath, self.workspace_path)
-                try:
-                    self.file_checksums[rel_path] = self._get_file_checksum(filepath)
-                except:
-                    pass
+            # Keep the digest of files whose size and mtime haven't changed
+            rel_path = self._rel(entry.path)
+            cached = self.file_checksums.get(rel_path)
+            if self._stat_matches(cached, stats):
+                file_checksums[rel_path] = cached
+            else:
+                to_hash.append((rel_path, entry.path, stats))
+                
+        checksums = self._hash_files([path for _, path, _ in to_hash])
+        for (rel_path, _, stats), checksum in zip(to_hash, checksums):
+            if checksum is not None:
+                file_checksums[rel_path] = self._checksum_entry(stats, checksum)
+        
+        self.file_checksums = file_checksums
+        self._save_checksums()
+    
+    @staticmethod
+    def _checksum_entry(stats: os.stat_result, checksum: Optional[str]) -> Dict[str, Union[int, str, None]]:
+        """Build a checksum table entry"""
+        return {"size": stats.st_size, "mtime_ns": stats.st_mtime_ns, "sha": checksum}
+    
+    @staticmethod
+    def _stat_matches(cached: Optional[Dict[str, Union[int, str]]], stats: os.stat_result) -> bool:
+        """Check whether a file's size and mtime still match its checksum entry"""
+        return (cached is not None
+                and cached["size"] == stats.st_size
+                and cached["mtime_ns"] == stats.st_mtime_ns)
+    
+    def _save_checksums(self) -> None:
+        """Write the current checksums to disk without recomputing them"""
+        checksum_file = os.path.join(self.workspace_path, _CHECKSUM_FILE)
+        temp_file = checksum_file + ".tmp"
         
-        # Save checksums
-        checksum_file = os.path.join(self.workspace_path, ".checksums.json")
-        with open(checksum_file, 'w') as f:
-            json.dump(self.file_checksums, f)
+        # Write to a temporary file and rename it over the index, so an
+        # interrupted save can't leave a truncated index behind
+        with open(temp_file, 'wb') as f:
+            marshal.dump({"format": _CHECKSUM_FORMAT, "algo": _CHECKSUM_ALGO, "files": self.file_checksums}, f)
+        os.replace(temp_file, checksum_file)
     
     def _get_file_checksum(self, filepath: str) -> str:
-        """Calculate file checksum using SHA256"""
-        sha256 = hashlib.sha256()
+        """Calculate file checksum using BLAKE3 if installed, otherwise SHA256"""
+        hasher = blake3.blake3() if blake3 is not None else hashlib.sha256()
+            
         with open(filepath, 'rb') as f:
-            for byte_block in iter(lambda: f.read(4096), b""):
-                sha256.update(byte_block)
-        return sha256.hexdigest()
+            # Hash large files straight from the page cache, without copying
+            # them through Python buffers
+            if os.fstat(f.fileno()).st_size >= _MMAP_THRESHOLD:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    hasher.update(mm)
+                return hasher.hexdigest()
+                
+            # Python 3.11+: the SHA256 read/update loop runs in C (OpenSSL uses
+            # the CPU's SHA extensions when available)
+            if blake3 is None and hasattr(hashlib, "file_digest"):
+                return hashlib.file_digest(f, "sha256").hexdigest()
+                
+            # Otherwise reuse one buffer instead of allocating per block
+            view = memoryview(bytearray(_CHECKSUM_BLOCK_SIZE))
+            while True:
+                n = f.readinto(view)
+                if not n:
+                    break
+                hasher.update(view[:n])
+        return hasher.hexdigest()
+    
+    def _try_file_checksum(self, filepath: str) -> Optional[str]:
+        """Calculate a file checksum, or None if the file can't be read"""
+        try:
+            return self._get_file_checksum(filepath)
+        except OSError as e:
+            logger.debug(f"Failed to checksum {filepath}: {e}")
+            return None
+    
+    def _hash_files(self, paths: List[str]) -> List[Optional[str]]:
+        """Checksum files concurrently, returning results in the order of paths"""
+        if len(paths) < 2:
+            return [self._try_file_checksum(path) for path in paths]
+            
+        with ThreadPoolExecutor(max_workers=min(_HASH_WORKERS, len(paths))) as pool:
+            return list(pool.map(self._try_file_checksum, paths, chunksize=16))
     
     def _is_file_allowed(self, filepath: str) -> bool:
         """Check if the file is allowed based on extension and size"""
-        _, ext = os.path.splitext(filepath)
+        ext = _ext(os.path.basename(filepath))
         
         # Special case: allow directories
         if os.path.isdir(filepath):
             return True
             
         # Check extension is allowed
-        if ext not in self.allowed_extensions and ext != "":
+        if ext and ext not in self.allowed_extensions:
             logger.warning(f"File extension not allowed: {ext}")
             return False
             
@@ -101,7 +260,7 @@ class FileManager:
         if not self.backup_enabled or not os.path.exists(filepath):
             return None
             
-        rel_path = os.path.relpath(filepath, self.workspace_path)
+        rel_path = self._rel(filepath)
         timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
         backup_dir = os.path.join(self.backup_path, timestamp)
         backup_file = os.path.join(backup_dir, rel_path)
@@ -115,55 +274,145 @@ class FileManager:
             logger.error(f"Failed to create backup for {filepath}: {e}")
             return None
     
+    def _backup_directory(self, dirpath: str) -> Optional[str]:
+        """Create a backup of a directory as a single tar archive"""
+        if not self.backup_enabled or not os.path.isdir(dirpath):
+            return None
+            
+        rel_path = self._rel(dirpath)
+        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+        backup_file = os.path.join(self.backup_path, timestamp, rel_path + ".tar")
+        
+        try:
+            os.makedirs(os.path.dirname(backup_file), exist_ok=True)
+            with tarfile.open(backup_file, "w") as tf:
+                tf.add(dirpath, arcname=os.path.basename(dirpath))
+            logger.debug(f"Backup created: {backup_file}")
+            return backup_file
+        except Exception as e:
+            logger.error(f"Failed to create backup for {dirpath}: {e}")
+            return None
+    
     def list_files(self, relative_path: str = "") -> List[Dict[str, Union[str, int, bool]]]:
         """List all files in the workspace or a subdirectory"""
-        target_path = os.path.join(self.workspace_path, relative_path)
+        try:
+            target_path = self._make_abs(relative_path)
+        except FileOperationError as e:
+            logger.warning(str(e))
+            return []
         
         if not os.path.exists(target_path):
             logger.warning(f"Path does not exist: {target_path}")
             return []
             
         result = []
+        # Walk top-down like os.walk, but take is_dir/stat from the scandir
+        # entries so each entry costs at most one stat call
+        pending = [target_path]
         
-        for root, dirs, files in os.walk(target_path):
-            for dir_name in dirs:
-                dir_path = os.path.join(root, dir_name)
-                rel_path = os.path.relpath(dir_path, self.workspace_path)
+        while pending:
+            root = pending.pop()
+            dir_entries = []
+            file_entries = []
+            
+            try:
+                with os.scandir(root) as it:
+                    for entry in it:
+                        try:
+                            is_dir = entry.is_dir()
+                        except OSError:
+                            is_dir = False
+                        (dir_entries if is_dir else file_entries).append(entry)
+            except OSError as e:
+                logger.error(f"Error scanning {root}: {e}")
+                continue
+            
+            for entry in dir_entries:
+                rel_path = self._rel(entry.path)
+                
+                try:
+                    modified = datetime.fromtimestamp(entry.stat().st_mtime).isoformat()
+                except OSError as e:
+                    logger.error(f"Error getting stats for {entry.path}: {e}")
+                    continue
                 
                 result.append({
-                    'name': dir_name,
+                    'name': entry.name,
                     'path': rel_path,
                     'is_dir': True,
                     'size': 0,
-                    'modified': datetime.fromtimestamp(os.path.getmtime(dir_path)).isoformat(),
+                    'modified': modified,
                 })
                 
-            for file_name in files:
-                file_path = os.path.join(root, file_name)
-                rel_path = os.path.relpath(file_path, self.workspace_path)
-                
+            for entry in file_entries:
                 # Skip backup directory and hidden files
-                if self.backup_path in file_path or file_name.startswith('.'):
+                if entry.path.startswith(self._backup_prefix) or entry.name.startswith('.'):
                     continue
                     
+                rel_path = self._rel(entry.path)
+                
                 try:
-                    stats = os.stat(file_path)
+                    stats = entry.stat()
                     result.append({
-                        'name': file_name,
+                        'name': entry.name,
                         'path': rel_path,
                         'is_dir': False,
                         'size': stats.st_size,
                         'modified': datetime.fromtimestamp(stats.st_mtime).isoformat(),
-                        'extension': os.path.splitext(file_name)[1]
+                        'extension': _ext(entry.name)
                     })
                 except Exception as e:
-                    logger.error(f"Error getting stats for {file_path}: {e}")
+                    logger.error(f"Error getting stats for {entry.path}: {e}")
+            
+            # Descend into subdirectories in listing order, skipping symlinks
+            # as os.walk does by default
+            pending.extend(entry.path for entry in reversed(dir_entries) if not entry.is_symlink())
         
         return result
     
+    def get_file_info(self, filepath: str) -> Optional[Dict[str, Union[str, int, bool]]]:
+        """Get the list_files() entry for a single path, or None if it isn't listed"""
+        try:
+            full_path = self._make_abs(filepath)
+        except FileOperationError:
+            return None
+        rel_path = self._rel(full_path)
+        name = os.path.basename(rel_path)
+        
+        try:
+            stats = os.stat(full_path)
+        except OSError:
+            return None
+            
+        if stat.S_ISDIR(stats.st_mode):
+            return {
+                'name': name,
+                'path': rel_path,
+                'is_dir': True,
+                'size': 0,
+                'modified': datetime.fromtimestamp(stats.st_mtime).isoformat(),
+            }
+            
+        # Skip backup directory and hidden files, as list_files does
+        if full_path.startswith(self._backup_prefix) or name.startswith('.'):
+            return None
+            
+        return {
+            'name': name,
+            'path': rel_path,
+            'is_dir': False,
+            'size': stats.st_size,
+            'modified': datetime.fromtimestamp(stats.st_mtime).isoformat(),
+            'extension': _ext(name)
+        }
+    
     def read_file(self, filepath: str) -> str:
         """Read file content"""
-        full_path = os.path.join(self.workspace_path, filepath)
+        try:
+            full_path = self._make_abs(filepath)
+        except FileOperationError as e:
+            logger.warning(str(e))
+            return f"Error: '{filepath}' is outside the workspace"
         
         if not os.path.exists(full_path):
             logger.warning(f"File does not exist: {full_path}")
@@ -178,6 +427,15 @@ class FileManager:
             return f"Error: File '{filepath}' type or size not allowed"
             
         try:
+            # Decode large files directly from a memory map
+            if os.path.getsize(full_path) >= _MMAP_THRESHOLD:
+                with open(full_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    content = str(mm, 'utf-8')
+                # Translate newlines as text mode would
+                if '\r' in content:
+                    content = content.replace('\r\n', '\n').replace('\r', '\n')
+                return content
+                
             with open(full_path, 'r', encoding='utf-8') as f:
                 content = f.read()
             return content
@@ -187,7 +445,11 @@ class FileManager:
     
     def write_file(self, filepath: str, content: str) -> bool:
         """Write content to a file"""
-        full_path = os.path.join(self.workspace_path, filepath)
+        try:
+            full_path = self._make_abs(filepath)
+        except FileOperationError as e:
+            logger.warning(str(e))
+            return False
         
         # Create directories if they don't exist
         os.makedirs(os.path.dirname(full_path), exist_ok=True)
@@ -205,9 +467,10 @@ class FileManager:
             with open(full_path, 'w', encoding='utf-8') as f:
                 f.write(content)
                 
-            # Update checksum
-            rel_path = os.path.relpath(full_path, self.workspace_path)
-            self.file_checksums[rel_path] = self._get_file_checksum(full_path)
+            # Record size and mtime only; the digest is computed when a later
+            # stat no longer matches
+            rel_path = self._rel(full_path)
+            self.file_checksums[rel_path] = self._checksum_entry(os.stat(full_path), None)
             logger.info(f"File written: {full_path}")
             
             return True
@@ -217,7 +480,11 @@ class FileManager:
     
     def delete_file(self, filepath: str) -> bool:
         """Delete a file or directory"""
-        full_path = os.path.join(self.workspace_path, filepath)
+        try:
+            full_path = self._make_abs(filepath)
+        except FileOperationError as e:
+            logger.warning(str(e))
+            return False
         
         if not os.path.exists(full_path):
             logger.warning(f"Path does not exist: {full_path}")
@@ -228,17 +495,18 @@ class FileManager:
             if os.path.isfile(full_path):
                 self._backup_file(full_path)
                 os.remove(full_path)
+                deleted = [full_path]
             else:
-                # For directories, backup all files inside
-                for root, _, files in os.walk(full_path):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        self._backup_file(file_path)
-                        
+                deleted = [entry.path for entry in self._scan_tree(full_path)]
+                
+                # For directories, backup the whole tree as one archive
+                self._backup_directory(full_path)
                 shutil.rmtree(full_path)
                 
-            # Update checksums
-            self._update_checksums()
+            # Drop the deleted files' checksums instead of rehashing the workspace
+            for path in deleted:
+                self.file_checksums.pop(self._rel(path), None)
+            self._save_checksums()
             logger.info(f"Deleted: {full_path}")
             
             return True
@@ -248,7 +516,11 @@ class FileManager:
     
     def create_directory(self, dirpath: str) -> bool:
         """Create a directory"""
-        full_path = os.path.join(self.workspace_path, dirpath)
+        try:
+            full_path = self._make_abs(dirpath)
+        except FileOperationError as e:
+            logger.warning(str(e))
+            return False
         
         try:
             os.makedirs(full_path, exist_ok=True)
@@ -266,48 +538,145 @@ class FileManager:
         rel_path = filepath
         history = []
         
-        for root, dirs, _ in os.walk(self.backup_path):
-            for backup_dir in dirs:
-                backup_timestamp = backup_dir
-                backup_file = os.path.join(root, backup_dir, rel_path)
+        # Backups are laid out as <backup_path>/<timestamp>/<rel_path>, so only
+        # the top-level snapshot directories need to be checked
+        try:
+            with os.scandir(self.backup_path) as it:
+                snapshots = [entry for entry in it if entry.is_dir(follow_symlinks=False)]
+        except OSError as e:
+            logger.error(f"Error scanning {self.backup_path}: {e}")
+            return []
+            
+        for snapshot in snapshots:
+            try:
+                timestamp = datetime.strptime(snapshot.name, "%Y%m%d%H%M%S").isoformat()
+            except ValueError:
+                continue
                 
-                if os.path.exists(backup_file):
-                    timestamp = datetime.strptime(backup_timestamp, "%Y%m%d%H%M%S")
-                    history.append({
-                        'timestamp': timestamp.isoformat(),
-                        'path': os.path.relpath(backup_file, self.backup_path)
-                    })
+            backup_file = os.path.join(snapshot.path, rel_path)
+            if os.path.exists(backup_file):
+                history.append({
+                    'timestamp': timestamp,
+                    'path': os.path.relpath(backup_file, self.backup_path)
+                })
+                
+            # Files from deleted directories live in a tar archive named
+            # after the directory
+            for archive, member in self._find_archived(snapshot.path, rel_path):
+                history.append({
+                    'timestamp': timestamp,
+                    'path': os.path.relpath(archive, self.backup_path),
+                    'member': member
+                })
         
         # Sort by timestamp descending
         history.sort(key=lambda x: x['timestamp'], reverse=True)
         return history
     
+    def _find_archived(self, backup_dir: str, rel_path: str) -> List[Tuple[str, str]]:
+        """Find directory archives in a backup that contain a file, as (archive, member) pairs"""
+        found = []
+        parts = os.path.normpath(rel_path).split(os.sep)
+        
+        for i in range(1, len(parts)):
+            archive = os.path.join(backup_dir, *parts[:i]) + ".tar"
+            if not os.path.isfile(archive):
+                continue
+                
+            member = "/".join(parts[i - 1:])
+            try:
+                with tarfile.open(archive, "r") as tf:
+                    tf.getmember(member)
+                found.append((archive, member))
+            except (KeyError, tarfile.TarError, OSError):
+                pass
+                
+        return found
+    
+    def read_backup(self, backup_path: str, member: Optional[str] = None) -> str:
+        """Read a backed up file, or a member of a directory archive
+        
+        Args:
+            backup_path: Path relative to the backup directory, as returned by get_file_history
+            member: Name of the file inside the archive, for archived directories
+        """
+        full_path = os.path.normpath(os.path.join(self.backup_path, backup_path))
+        if not full_path.startswith(os.path.join(os.path.normpath(self.backup_path), "")):
+            return f"Error: '{backup_path}' is outside the backup directory"
+            
+        try:
+            if member is None:
+                with open(full_path, 'r', encoding='utf-8') as f:
+                    return f.read()
+                    
+            with tarfile.open(full_path, "r") as tf:
+                extracted = tf.extractfile(member)
+                if extracted is None:
+                    return f"Error: '{member}' is not a file"
+                return extracted.read().decode('utf-8')
+        except KeyError:
+            return f"Error: '{member}' is not in backup '{backup_path}'"
+        except Exception as e:
+            logger.error(f"Failed to read backup {full_path}: {e}")
+            return f"Error reading backup: {e}"
+    
     def get_changed_files(self) -> List[str]:
         """Get list of files that have changed since last checksum update"""
-        changed_files = []
+        return list(self.iter_changed_files())
+    
+    def iter_changed_files(self) -> Iterator[str]:
+        """Yield files that have changed since last checksum update, as soon as each is known
         
-        for root, _, files in os.walk(self.workspace_path):
-            for file in files:
-                filepath = os.path.join(root, file)
-                
+        New files are yielded while scanning; files whose size or mtime changed
+        are hashed concurrently and yielded in completion order.
+        """
+        pool = None
+        futures = {}
+        
+        try:
+            for entry in self._scan_tree(self._workspace_abs):
                 # Skip backup directory and checksum file
-                if self.backup_path in filepath or ".checksums.json" in filepath:
+                if entry.name in _CHECKSUM_FILES or entry.path.startswith(self._backup_prefix):
                     continue
                     
-                rel_path = os.path.relpath(filepath, self.workspace_path)
-                
                 # Skip if file type not allowed
-                _, ext = os.path.splitext(filepath)
-                if ext not in self.allowed_extensions and ext != "":
+                ext = _ext(entry.name)
+                if ext and ext not in self.allowed_extensions:
                     continue
+                    
+                rel_path = self._rel(entry.path)
+                cached = self.file_checksums.get(rel_path)
                 
-                current_checksum = self._get_file_checksum(filepath)
-                
-                if rel_path not in self.file_checksums:
+                if cached is None:
                     # New file
-                    changed_files.append(rel_path)
-                elif self.file_checksums[rel_path] != current_checksum:
+                    yield rel_path
+                    continue
+                    
+                # Only rehash files whose size or mtime changed
+                try:
+                    if self._stat_matches(cached, entry.stat()):
+                        continue
+                except OSError:
+                    continue
+                    
+                # Without a recorded digest there is nothing to compare against
+                if cached["sha"] is None:
+                    yield rel_path
+                    continue
+                    
+                if pool is None:
+                    pool = ThreadPoolExecutor(max_workers=_HASH_WORKERS)
+                futures[pool.submit(self._try_file_checksum, entry.path)] = rel_path
+                
+            for future in as_completed(futures):
+                rel_path = futures[future]
+                current_checksum = future.result()
+                if current_checksum is not None and current_checksum != self.file_checksums[rel_path]["sha"]:
                     # Modified file
-                    changed_files.append(rel_path)
-        
-        return changed_files
+                    yield rel_path
+        finally:
+            # If the caller stopped early, don't hash the rest
+            if pool is not None:
+                for future in futures:
+                    future.cancel()
+                pool.shutdown(wait=True)
@@ -1,7 +1,8 @@
 import os
-from typing import List, Dict, Any, Optional, Union, Callable
+import functools
+from typing import List, Dict, Any, Optional, Union, Callable, Iterator
 import logging
-from huggingface_hub import hf_hub_download
+from .prompt_manager import format_message, ASSISTANT_PREFIX
 from ..config.settings import settings
 
 logger = logging.getLogger(__name__)
@@ -23,17 +24,6 @@ class ModelBase:
         """Generate text from a prompt"""
         raise NotImplementedError("Subclasses must implement generate()")
     
-    def tokenize(self, text: str) -> List[int]:
-        """Tokenize the input text"""
-        raise NotImplementedError("Subclasses must implement tokenize()")
-    
-    def get_num_tokens(self, text: str) -> int:
-        """Count the number of tokens in the text"""
-        return len(self.tokenize(text))
-
-class ModelBase:
-    # Add to existing methods
-    
     def generate_stream(self, prompt: str, **kwargs) -> Iterator[str]:
         """Generate text from a prompt with streaming output
         
@@ -44,44 +34,105 @@ class ModelBase:
         Yields:
             Text chunks as they are generated
         """
-        raise NotImplementedError("Subclasses must implement generate_stream()")
+        # Backends without streaming produce the whole response as one chunk
+        yield self.generate(prompt, **kwargs)
+    
+    def tokenize(self, text: str) -> List[int]:
+        """Tokenize the input text"""
+        raise NotImplementedError("Subclasses must implement tokenize()")
+    
+    def get_num_tokens(self, text: str) -> int:
+        """Count the number of tokens in the text"""
+        return len(self.tokenize(text))
+    
+    def get_num_message_tokens(self, messages: List[Dict[str, str]]) -> int:
+        """Count the tokens of a formatted conversation, one message at a time
+        
+        Messages are counted separately so unchanged history hits the token
+        count cache of backends that have one.
+        """
+        return sum(self.get_num_tokens(format_message(message.get("role", ""), message.get("content", "")))
+                   for message in messages)
+    
+    def start_session(self, system_prompt: str) -> 'ModelSession':
+        """Start a conversation that is extended one message at a time"""
+        return ModelSession(self, system_prompt)
 
+class ModelSession:
+    """Conversation with a model, built up incrementally
+    
+    The base session keeps the formatted messages and sends the whole
+    transcript on every generate() call. Backends that can keep their KV
+    cache between calls override it so only appended text is processed.
+    """
+    
+    def __init__(self, model: ModelBase, system_prompt: str):
+        self.model = model
+        self.messages: List[str] = []
+        self.append("system", system_prompt)
+        
+    def append(self, role: str, content: str) -> None:
+        """Add a message to the conversation"""
+        self.messages.append(format_message(role, content))
+        
+    def generate(self, **kwargs) -> str:
+        """Generate the assistant's next message"""
+        return self.model.generate("".join(self.messages) + ASSISTANT_PREFIX, **kwargs)
+    
+    def generate_stream(self, **kwargs) -> Iterator[str]:
+        """Generate the assistant's next message as a stream of text chunks"""
+        return self.model.generate_stream("".join(self.messages) + ASSISTANT_PREFIX, **kwargs)
+    
+    def rollback(self, n_messages: int = 1) -> None:
+        """Drop the last messages, always keeping the system prompt"""
+        keep = max(1, len(self.messages) - n_messages)
+        del self.messages[keep:]
 
-class LlamaCppModel(ModelBase):
-    # Add to existing methods
+class LlamaCppSession(ModelSession):
+    """Session that keeps the transcript as tokens for llama.cpp
     
-    def generate_stream(self, prompt: str, **kwargs) -> Iterator[str]:
-        """Generate text using the loaded model with streaming output"""
-        if not self.initialized:
-            self.load()
+    llama.cpp reuses its KV cache for the longest prefix shared with the
+    previous evaluation, so sending the same token list plus the new message
+    only evaluates the new tokens. Messages are tokenized once, when added.
+    """
+    
+    def __init__(self, model: 'LlamaCppModel', system_prompt: str):
+        self.tokens: List[int] = []
+        self._offsets: List[int] = []  # Token offset where each message starts
+        super().__init__(model, system_prompt)
+        self._assistant_tokens = model.tokenize_chunk(ASSISTANT_PREFIX)
         
-        temperature = kwargs.get('temperature', settings.model.temperature)
-        max_tokens = kwargs.get('max_tokens', settings.model.max_tokens)
-        top_p = kwargs.get('top_p', settings.model.top_p)
+    def append(self, role: str, content: str) -> None:
+        """Add a message to the conversation"""
+        super().append(role, content)
+        self._offsets.append(len(self.tokens))
+        self.tokens.extend(self.model.tokenize_chunk(self.messages[-1], add_bos=not self.tokens))
         
-        try:
-            stream = self.model(
-                prompt,
-                max_tokens=max_tokens,
-                temperature=temperature,
-                top_p=top_p,
-                repeat_penalty=settings.model.repetition_penalty,
-                stream=True,  # Enable streaming
-                echo=False
-            )
-            
-            # Yield text chunks as they come
-            for chunk in stream:
-                if isinstance(chunk, dict) and 'choices' in chunk:
-                    yield chunk['choices'][0]['text']
-                elif isinstance(chunk, list) and len(chunk) > 0:
-                    yield chunk[0]['text']
-                else:
-                    yield str(chunk)
-                    
-        except Exception as e:
-            logger.error(f"Streaming text generation failed: {e}")
-            yield f"Error generating text: {str(e)}"
+    def generate(self, **kwargs) -> str:
+        """Generate the assistant's next message"""
+        return self.model.generate(self.tokens + self._assistant_tokens, **kwargs)
+    
+    def generate_stream(self, **kwargs) -> Iterator[str]:
+        """Generate the assistant's next message as a stream of text chunks"""
+        return self.model.generate_stream(self.tokens + self._assistant_tokens, **kwargs)
+    
+    def rollback(self, n_messages: int = 1) -> None:
+        """Drop the last messages, always keeping the system prompt"""
+        keep = max(1, len(self.messages) - n_messages)
+        if keep < len(self._offsets):
+            del self.tokens[self._offsets[keep]:]
+            del self._offsets[keep:]
+        super().rollback(n_messages)
+
+def _completion_text_getter(output: Any) -> Callable[[Any], str]:
+    """Pick how to read the text out of llama.cpp completion output, based on its shape"""
+    if isinstance(output, dict) and 'choices' in output:
+        return lambda chunk: chunk['choices'][0]['text']
+    elif isinstance(output, list) and len(output) > 0:
+        return lambda chunk: chunk[0]['text']
+    else:
+        return str
+
 class LlamaCppModel(ModelBase):
     """LLM implementation using llama-cpp-python"""
     
@@ -89,11 +140,17 @@ class LlamaCppModel(ModelBase):
         super().__init__(model_id, **kwargs)
         self.model_file = model_file or settings.model.model_file
         self.context_length = kwargs.get('context_length', settings.model.context_length)
+        self.n_gpu_layers = kwargs.get('n_gpu_layers', settings.model.n_gpu_layers)
+        self.kv_cache_quantization = kwargs.get('kv_cache_quantization', settings.model.kv_cache_quantization)
+        # Per-instance cache of token counts, e.g. for a system prompt counted every turn
+        self._count_tokens = functools.lru_cache(maxsize=4096)(self._tokenize_length)
         self.loaded_model_path = None
         
     def load(self) -> None:
         """Download and load the model"""
+        import llama_cpp
         from llama_cpp import Llama
+        from huggingface_hub import hf_hub_download
         
         if self.initialized:
             return
@@ -115,14 +172,34 @@ class LlamaCppModel(ModelBase):
             else:
                 self.loaded_model_path = self.model_file
             
-            # Load the model
+            # Offload layers to the GPU when llama.cpp was built with GPU support
+            # (-1 offloads all); CPU-only builds ignore it
+            llama_kwargs = {"n_gpu_layers": self.n_gpu_layers}
+            
+            # Quantize the KV cache; a quantized V cache needs flash attention
+            if self.kv_cache_quantization:
+                cache_type = getattr(llama_cpp, f"GGML_TYPE_{self.kv_cache_quantization.upper()}")
+                llama_kwargs.update(type_k=cache_type, type_v=cache_type, flash_attn=True)
+            
+            # Load the model. Only the last position's logits are needed for
+            # sampling. Llama.generate keeps the evaluated tokens and, on the
+            # next call, evaluates only what follows the longest common prefix,
+            # so consecutive prompts that share a prefix reuse the KV cache.
             self.model = Llama(
                 model_path=self.loaded_model_path,
                 n_ctx=self.context_length,
                 n_batch=512,
-                verbose=False
+                logits_all=False,
+                verbose=False,
+                **llama_kwargs
             )
             
+            # Keep evaluated prompt states (e.g. the system prompt) in RAM so a
+            # new session or run can restore them instead of re-evaluating
+            if settings.model.prompt_cache_mb > 0:
+                from llama_cpp import LlamaRAMCache
+                self.model.set_cache(LlamaRAMCache(capacity_bytes=settings.model.prompt_cache_mb * 1024 * 1024))
+            
             logger.info(f"Model loaded successfully: {self.model_id}")
             self.initialized = True
             
@@ -130,8 +207,8 @@ class LlamaCppModel(ModelBase):
             logger.error(f"Failed to load model: {e}")
             raise
     
-    def generate(self, prompt: str, **kwargs) -> str:
-        """Generate text using the loaded model"""
+    def generate(self, prompt: Union[str, List[int]], **kwargs) -> str:
+        """Generate text using the loaded model from a prompt string or token list"""
         if not self.initialized:
             self.load()
         
@@ -150,17 +227,49 @@ class LlamaCppModel(ModelBase):
             )
             
             # Extract generated text from output
-            if isinstance(output, dict) and 'choices' in output:
-                return output['choices'][0]['text'].strip()
-            elif isinstance(output, list) and len(output) > 0:
-                return output[0]['text'].strip()
-            else:
-                return str(output).strip()
+            return _completion_text_getter(output)(output).strip()
                 
         except Exception as e:
             logger.error(f"Text generation failed: {e}")
             return f"Error generating text: {str(e)}"
     
+    def generate_stream(self, prompt: Union[str, List[int]], **kwargs) -> Iterator[str]:
+        """Generate text using the loaded model with streaming output"""
+        if not self.initialized:
+            self.load()
+        
+        temperature = kwargs.get('temperature', settings.model.temperature)
+        max_tokens = kwargs.get('max_tokens', settings.model.max_tokens)
+        top_p = kwargs.get('top_p', settings.model.top_p)
+        
+        try:
+            stream = self.model(
+                prompt,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                top_p=top_p,
+                repeat_penalty=settings.model.repetition_penalty,
+                stream=True,  # Enable streaming
+                echo=False
+            )
+            
+            # The chunk format is the same for the whole stream, so detect it
+            # once from the first chunk
+            stream = iter(stream)
+            first = next(stream, None)
+            if first is None:
+                return
+            get_text = _completion_text_getter(first)
+            yield get_text(first)
+            
+            # Yield text chunks as they come
+            for chunk in stream:
+                yield get_text(chunk)
+                    
+        except Exception as e:
+            logger.error(f"Streaming text generation failed: {e}")
+            yield f"Error generating text: {str(e)}"
+    
     def tokenize(self, text: str) -> List[int]:
         """Tokenize text using the model's tokenizer"""
         if not self.initialized:
@@ -172,6 +281,25 @@ class LlamaCppModel(ModelBase):
         except:
             # Fallback to approximate token counting
             return [0] * (len(text.split()) * 3 // 4)  # Rough approximation
+    
+    def _tokenize_length(self, text: str) -> int:
+        """Count tokens without caching"""
+        return len(self.tokenize(text))
+    
+    def get_num_tokens(self, text: str) -> int:
+        """Count the number of tokens in the text, caching results by text"""
+        return self._count_tokens(text)
+    
+    def tokenize_chunk(self, text: str, add_bos: bool = False) -> List[int]:
+        """Tokenize part of a prompt, parsing special tokens like the full prompt would"""
+        if not self.initialized:
+            self.load()
+        
+        return self.model.tokenize(text.encode('utf-8'), add_bos=add_bos, special=True)
+    
+    def start_session(self, system_prompt: str) -> LlamaCppSession:
+        """Start a conversation that reuses the KV cache between turns"""
+        return LlamaCppSession(self, system_prompt)
             
             
 class TransformersModel(ModelBase):
@@ -179,6 +307,41 @@ class TransformersModel(ModelBase):
     
     def __init__(self, model_id: Optional[str] = None, **kwargs):
         super().__init__(model_id, **kwargs)
+        # None picks by hardware; "none", "8bit" or "4bit" force a choice
+        self.quantization = kwargs.get('quantization')
+        self.torch_dtype = kwargs.get('torch_dtype')
+        
+    def _weight_kwargs(self) -> Dict[str, Any]:
+        """Choose the weight dtype and quantization for the available hardware"""
+        import torch
+        
+        quantization = self.quantization
+        if quantization is None:
+            if not torch.cuda.is_available():
+                return {"torch_dtype": self.torch_dtype or torch.float32}
+            if torch.cuda.get_device_capability()[0] >= 8:
+                # Ampere and newer run bf16 natively
+                return {"torch_dtype": self.torch_dtype or torch.bfloat16}
+            # Older GPUs: 4-bit weights when bitsandbytes is installed
+            try:
+                import bitsandbytes
+                quantization = "4bit"
+            except ImportError:
+                return {"torch_dtype": self.torch_dtype or torch.float16}
+                
+        if quantization == "none":
+            default_dtype = torch.float16 if torch.cuda.is_available() else torch.float32
+            return {"torch_dtype": self.torch_dtype or default_dtype}
+            
+        from transformers import BitsAndBytesConfig
+        
+        if quantization == "8bit":
+            quant = BitsAndBytesConfig(load_in_8bit=True)
+        elif quantization == "4bit":
+            quant = BitsAndBytesConfig(load_in_4bit=True, bnb_4bit_compute_dtype=self.torch_dtype or torch.float16)
+        else:
+            raise ValueError(f"Unsupported quantization: {quantization}")
+        return {"quantization_config": quant}
         
     def load(self) -> None:
         """Load the model and tokenizer from HuggingFace"""
@@ -191,16 +354,24 @@ class TransformersModel(ModelBase):
         logger.info(f"Loading model: {self.model_id}")
         
         try:
-            self.tokenizer = AutoTokenizer.from_pretrained(self.model_id)
+            # Fast (Rust) tokenizers are much quicker than the Python ones
+            self.tokenizer = AutoTokenizer.from_pretrained(self.model_id, use_fast=True)
             
             # Load model with optimal settings based on available hardware
             self.model = AutoModelForCausalLM.from_pretrained(
                 self.model_id,
-                torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32,
                 low_cpu_mem_usage=True,
-                device_map="auto"
+                device_map="auto",
+                **self._weight_kwargs()
             )
             
+            # Generation settings that don't change between calls
+            self._base_gen_kwargs = {
+                "top_p": settings.model.top_p,
+                "repetition_penalty": settings.model.repetition_penalty,
+                "pad_token_id": self.tokenizer.eos_token_id
+            }
+            
             logger.info(f"Model loaded successfully: {self.model_id}")
             self.initialized = True
             
@@ -213,28 +384,30 @@ class TransformersModel(ModelBase):
         if not self.initialized:
             self.load()
         
+        import torch
+        
         temperature = kwargs.get('temperature', settings.model.temperature)
         max_tokens = kwargs.get('max_tokens', settings.model.max_tokens)
         
         try:
-            input_ids = self.tokenizer.encode(prompt, return_tensors="pt").to(self.model.device)
+            inputs = self.tokenizer(prompt, return_tensors="pt", padding=False).to(self.model.device)
+            prompt_length = inputs["input_ids"].shape[1]
             
-            gen_kwargs = {
-                "input_ids": input_ids,
-                "max_length": input_ids.shape[1] + max_tokens,
-                "temperature": temperature,
-                "top_p": settings.model.top_p,
-                "repetition_penalty": settings.model.repetition_penalty,
-                "do_sample": temperature > 0.0,
-                "pad_token_id": self.tokenizer.eos_token_id
-            }
+            gen_kwargs = dict(
+                self._base_gen_kwargs,
+                input_ids=inputs["input_ids"],
+                attention_mask=inputs["attention_mask"],
+                max_length=prompt_length + max_tokens,
+                temperature=temperature,
+                do_sample=temperature > 0.0
+            )
             
             with torch.no_grad():
                 output = self.model.generate(**gen_kwargs)
             
             # Decode and return only the newly generated tokens
             return self.tokenizer.decode(
-                output[0][input_ids.shape[1]:], 
+                output[0][prompt_length:], 
                 skip_special_tokens=True
             )
                 
@@ -1,4 +1,19 @@
 from typing import List, Dict, Any, Optional
+# Opening tag for each known role
+_ROLE_TAGS = {
+    "system": "<|system|>\n",
+    "user": "<|user|>\n",
+    "assistant": "<|assistant|>\n",
+}
+
+# Marker after which the model writes the assistant's reply
+ASSISTANT_PREFIX = _ROLE_TAGS["assistant"]
+
+def format_message(role: str, content: str) -> str:
+    """Format a single conversation message for the LLM"""
+    tag = _ROLE_TAGS.get(role) or _ROLE_TAGS.get(role.lower()) or f"<|{role}|>\n"
+    return f"{tag}{content}\n"
+
 def format_user_prompt(conversation_history: List[Dict[str, str]]) -> str:
     """Format the conversation history into a prompt string for the LLM.
     
@@ -8,26 +23,22 @@ def format_user_prompt(conversation_history: List[Dict[str, str]]) -> str:
     Returns:
         Formatted prompt string for the model
     """
-    formatted_prompt = ""
+    parts = []
+    append = parts.append
+    tags = _ROLE_TAGS
     
+    # format_message inlined, since this runs over the whole history on every generation
     for message in conversation_history:
         role = message.get("role", "")
-        content = message.get("content", "")
-        
-        if role.lower() == "system":
-            formatted_prompt += f"<|system|>\n{content}\n"
-        elif role.lower() == "user":
-            formatted_prompt += f"<|user|>\n{content}\n"
-        elif role.lower() == "assistant":
-            formatted_prompt += f"<|assistant|>\n{content}\n"
-        else:
-            # Handle unknown roles
-            formatted_prompt += f"<|{role}|>\n{content}\n"
+        append(tags.get(role) or tags.get(role.lower()) or f"<|{role}|>\n")
+        append(message.get("content", ""))
+        append("\n")
     
     # Add final assistant marker to indicate where the model should continue
-    formatted_prompt += "<|assistant|>\n"
+    append(ASSISTANT_PREFIX)
     
-    return formatted_prompt
+    return "".join(parts)
+
 def get_system_prompt(context_docs: Optional[List[Dict[str, str]]] = None) -> str:
     """Get the system prompt for the agent"""
     base_prompt = """
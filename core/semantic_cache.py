@@ -0,0 +1,150 @@
+import os
+import json
+import hashlib
+import logging
+import numpy as np
+from typing import List, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class SemanticCache:
+    """Cache model responses keyed by prompt embeddings
+
+    A response is reused when the prior conversation matches exactly and the
+    latest user turn is close enough (cosine similarity) to a cached one.
+    """
+
+    def __init__(self,
+                 storage_path: str,
+                 embedding_model: str = "all-MiniLM-L6-v2",
+                 threshold: float = 0.92,
+                 max_entries: int = 512):
+        self.storage_path = storage_path
+        self.embedding_model_name = embedding_model
+        self.embedding_model = None
+        self.threshold = threshold
+        self.max_entries = max_entries
+
+        # Row i of embeddings belongs to context_keys[i] / responses[i]
+        self.embeddings = None
+        self.context_keys: List[str] = []
+        self.responses: List[str] = []
+        self.last_used: List[int] = []
+        self._clock = 0
+        self._last_query: Optional[Tuple[str, np.ndarray]] = None
+        self._dirty = False
+
+        self._load()
+
+    def _load(self) -> None:
+        """Load a saved cache if present"""
+        embeddings_path = os.path.join(self.storage_path, "embeddings.npy")
+        entries_path = os.path.join(self.storage_path, "entries.json")
+
+        if not (os.path.exists(embeddings_path) and os.path.exists(entries_path)):
+            return
+
+        try:
+            embeddings = np.load(embeddings_path)
+            with open(entries_path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+
+            if len(entries) != len(embeddings):
+                logger.warning("Semantic cache files are out of sync, ignoring them")
+                return
+
+            self.embeddings = embeddings.astype(np.float32, copy=False)
+            self.context_keys = [entry["context"] for entry in entries]
+            self.responses = [entry["response"] for entry in entries]
+            self.last_used = list(range(len(entries)))
+            self._clock = len(entries)
+            logger.info(f"Loaded semantic cache with {len(entries)} entries")
+        except Exception as e:
+            logger.error(f"Failed to load semantic cache: {e}")
+
+    def save(self) -> None:
+        """Persist the cache if it changed since the last save"""
+        if not self._dirty or self.embeddings is None:
+            return
+
+        try:
+            os.makedirs(self.storage_path, exist_ok=True)
+            np.save(os.path.join(self.storage_path, "embeddings.npy"), self.embeddings)
+
+            entries = [{"context": context, "response": response}
+                       for context, response in zip(self.context_keys, self.responses)]
+            with open(os.path.join(self.storage_path, "entries.json"), 'w', encoding='utf-8') as f:
+                json.dump(entries, f)
+
+            self._dirty = False
+        except Exception as e:
+            logger.error(f"Failed to save semantic cache: {e}")
+
+    @staticmethod
+    def context_key(messages: List[Dict[str, str]]) -> str:
+        """Hash the conversation that precedes the latest user turn"""
+        sha1 = hashlib.sha1()
+        for message in messages:
+            sha1.update(message.get("role", "").encode('utf-8'))
+            sha1.update(b"\0")
+            sha1.update(message.get("content", "").encode('utf-8'))
+            sha1.update(b"\0")
+        return sha1.hexdigest()
+
+    def _embed(self, text: str) -> np.ndarray:
+        """Embed text as an L2-normalized vector, reusing the last result"""
+        if self._last_query is not None and self._last_query[0] == text:
+            return self._last_query[1]
+
+        if self.embedding_model is None:
+            from sentence_transformers import SentenceTransformer
+            self.embedding_model = SentenceTransformer(self.embedding_model_name)
+
+        vector = self.embedding_model.encode([text], normalize_embeddings=True)[0].astype(np.float32, copy=False)
+        self._last_query = (text, vector)
+        return vector
+
+    def get(self, query: str, context_key: str) -> Optional[str]:
+        """Get a cached response for a query, or None on a miss"""
+        if not self.responses:
+            return None
+
+        scores = self.embeddings @ self._embed(query)
+
+        # Only entries recorded after the same conversation can match
+        same_context = np.fromiter((key == context_key for key in self.context_keys),
+                                   dtype=bool, count=len(self.context_keys))
+        scores[~same_context] = -1.0
+
+        best = int(scores.argmax())
+        if scores[best] < self.threshold:
+            return None
+
+        self._clock += 1
+        self.last_used[best] = self._clock
+        logger.debug(f"Semantic cache hit (similarity {scores[best]:.3f})")
+        return self.responses[best]
+
+    def put(self, query: str, context_key: str, response: str) -> None:
+        """Add a model response to the cache, evicting the least recently used entry when full"""
+        vector = self._embed(query)
+        self._clock += 1
+
+        if self.embeddings is None:
+            self.embeddings = vector[np.newaxis, :].copy()
+            self.context_keys.append(context_key)
+            self.responses.append(response)
+            self.last_used.append(self._clock)
+        elif len(self.responses) >= self.max_entries:
+            slot = int(np.argmin(self.last_used))
+            self.embeddings[slot] = vector
+            self.context_keys[slot] = context_key
+            self.responses[slot] = response
+            self.last_used[slot] = self._clock
+        else:
+            self.embeddings = np.vstack([self.embeddings, vector])
+            self.context_keys.append(context_key)
+            self.responses.append(response)
+            self.last_used.append(self._clock)
+
+        self._dirty = True
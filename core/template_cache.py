@@ -0,0 +1,74 @@
+import os
+import json
+import hashlib
+import logging
+from typing import List, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+class TemplateCache:
+    """Cache of agent steps (response and actions) for recurring tasks
+
+    Steps are keyed by the normalized initial prompt and the sequence of
+    action types executed so far, so a task that was solved before can be
+    replayed without calling the model.
+    """
+
+    def __init__(self, cache_path: Optional[str] = None, max_entries: int = 1000):
+        self.cache_path = cache_path or os.path.join(os.path.expanduser("~"), ".llmagent", "template_cache.json")
+        self.max_entries = max_entries
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self._dirty = False
+
+        self._load()
+
+    def _load(self) -> None:
+        """Load saved steps if present"""
+        if not os.path.exists(self.cache_path):
+            return
+
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+            logger.info(f"Loaded template cache with {len(self.entries)} entries")
+        except Exception as e:
+            logger.error(f"Failed to load template cache: {e}")
+            self.entries = {}
+
+    def save(self) -> None:
+        """Persist the cache if it changed since the last save"""
+        if not self._dirty:
+            return
+
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            with open(self.cache_path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f)
+            self._dirty = False
+        except Exception as e:
+            logger.error(f"Failed to save template cache: {e}")
+
+    @staticmethod
+    def make_key(initial_prompt: str, action_types: List[str]) -> str:
+        """Build the cache key for the next step of a task"""
+        normalized = " ".join(initial_prompt.lower().split())
+        return hashlib.sha1(f"{normalized}|{json.dumps(action_types)}".encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Get a cached step with 'response', 'actions' and 'statuses'"""
+        return self.entries.get(key)
+
+    def put(self, key: str, response: str, actions: List[Dict[str, Any]], statuses: List[str]) -> None:
+        """Record a step produced by the model"""
+        self.entries.pop(key, None)
+        self.entries[key] = {
+            "response": response,
+            "actions": actions,
+            "statuses": statuses
+        }
+
+        # Drop the oldest entries once over the limit
+        while len(self.entries) > self.max_entries:
+            del self.entries[next(iter(self.entries))]
+
+        self._dirty = True
@@ -1,25 +1,137 @@
 import os
 import json
 import logging
+import sqlite3
+import functools
+import time
+import queue
+import importlib.util
 import numpy as np
 from typing import List, Dict, Any, Optional, Tuple
+import sentence_transformers
 from sentence_transformers import SentenceTransformer
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 import faiss
 from ..config.settings import settings
 
 logger = logging.getLogger(__name__)
 
+def _onnx_backend_available() -> bool:
+    """Check for sentence-transformers>=3.2 with its ONNX extra (optimum and onnxruntime)"""
+    return (hasattr(sentence_transformers, "export_dynamic_quantized_onnx_model")
+            and importlib.util.find_spec("optimum") is not None
+            and importlib.util.find_spec("onnxruntime") is not None)
+
+# HNSW graph parameters
+_HNSW_M = 32
+_HNSW_EF_CONSTRUCTION = 200
+_HNSW_EF_SEARCH = 64
+
+# IVF-PQ parameters. Training 2^nbits PQ centroids well takes ~39 points each,
+# so until there are that many vectors the store keeps an exact flat index
+_IVFPQ_M = 16
+_IVFPQ_NBITS = 8
+_IVFPQ_NPROBE = 8
+_IVFPQ_MIN_TRAIN = 10000
+
+# Texts per encoder forward pass when embedding documents
+_ENCODE_BATCH_SIZE = 256
+
+# Token length every batch is padded to when the embedder is compiled for a fixed shape
+_COMPILED_SEQ_LENGTH = 128
+
+# add_documents commits its SQLite inserts once per this many encoded chunks
+_COMMIT_EVERY = 4
+
+# Single-document embeddings are queued and added to the index this many at a time
+_ADD_BATCH_SIZE = 64
+
+# Dynamic INT8 quantization of the ONNX embedder (uses VNNI dot products where available)
+_ONNX_QUANTIZATION = "avx512_vnni"
+_ONNX_QUANTIZED_FILE = f"onnx/model_qint8_{_ONNX_QUANTIZATION}.onnx"
+
+# Index writes are deferred until this many seconds or documents have accumulated
+_FLUSH_INTERVAL = 5.0
+_FLUSH_EVERY = 128
+
+# Saves between full index rewrites only append the new vectors as delta shards,
+# until there are this many shards or they hold this fraction of the base index
+_MAX_DELTAS = 16
+_MAX_DELTA_FRACTION = 0.1
+_DELTA_PREFIX = "faiss_index.delta."
+
+# Query embeddings kept for repeated searches
+_QUERY_CACHE_SIZE = 1024
+
 class VectorStore:
     """Store and retrieve document embeddings for semantic search"""
     
-    def __init__(self, workspace_path: Optional[str] = None, embedding_model: str = "all-MiniLM-L6-v2"):
+    def __init__(self, 
+                 workspace_path: Optional[str] = None, 
+                 embedding_model: str = "all-MiniLM-L6-v2",
+                 index_type: str = "flat",
+                 embedding_backend: str = "torch",
+                 compile_embedder: bool = False):
+        """Initialize the vector store
+        
+        Args:
+            workspace_path: Workspace the store is kept in
+            embedding_model: SentenceTransformer model name
+            index_type: "flat" (exact), "hnsw" or "ivfpq" (approximate)
+            embedding_backend: "torch", or "onnx-int8" for an INT8-quantized
+                ONNX Runtime embedder (faster on CPU; needs the onnx extra)
+            compile_embedder: Compile the torch embedder with torch.compile for a
+                single padded sequence length (faster repeated GPU encoding, at the
+                cost of a slow first call)
+        """
+        if index_type not in ("flat", "hnsw", "ivfpq"):
+            raise ValueError(f"Unsupported index type: {index_type}")
+        if embedding_backend not in ("torch", "onnx-int8"):
+            raise ValueError(f"Unsupported embedding backend: {embedding_backend}")
+        if embedding_backend == "onnx-int8" and not _onnx_backend_available():
+            raise ValueError("The onnx-int8 embedding backend needs sentence-transformers>=3.2 "
+                             "with ONNX support: pip install 'llmagent[onnx]'")
+        if compile_embedder and embedding_backend != "torch":
+            raise ValueError("compile_embedder requires the torch embedding backend")
+            
         self.workspace_path = workspace_path or settings.filesystem.workspace_path
         self.storage_path = os.path.join(self.workspace_path, ".vector_store")
         self.embedding_model_name = embedding_model
+        self.index_type = index_type
+        self.embedding_backend = embedding_backend
+        self.compile_embedder = compile_embedder
         self.embedding_model = None
         self.index = None
-        self.documents = []
+        self.db = None
+        
+        # Unsaved index changes, flushed in batches
+        self._dirty = False
+        self._last_flush = time.monotonic()
+        
+        # Documents get increasing ids, which the index maps its vectors to
+        self._next_id = 0
+        
+        # Vectors added since the last save, and the on-disk layout they will be appended to
+        self._unsaved: List[Tuple[np.ndarray, np.ndarray]] = []
+        self._n_unsaved = 0
+        self._needs_full_save = False
+        self._base_n = 0
+        self._n_deltas = 0
+        self._n_delta_vectors = 0
+        
+        # Embeddings from add_document waiting to be added to the index together
+        self._pending = None
+        self._pending_ids = None
+        self._n_pending = 0
+        
+        # Repeated queries reuse their embedding instead of running the model again
+        self._query_embedding = functools.lru_cache(maxsize=_QUERY_CACHE_SIZE)(self._encode_query)
+        
+        # Keep the index on the GPU when faiss was built with GPU support
+        self._gpu_res = None
+        if hasattr(faiss, "StandardGpuResources") and faiss.get_num_gpus() > 0:
+            self._gpu_res = faiss.StandardGpuResources()
         
         # Create storage directory
         os.makedirs(self.storage_path, exist_ok=True)
@@ -31,32 +143,295 @@ class VectorStore:
         """Initialize the vector store"""
         try:
             # Load embedding model
-            self.embedding_model = SentenceTransformer(self.embedding_model_name)
+            self.embedding_model = self._load_embedding_model()
+            
+            # Documents live in SQLite so adding one writes only that row
+            self.db = sqlite3.connect(os.path.join(self.storage_path, "documents.db"), check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.execute("CREATE TABLE IF NOT EXISTS docs (id INTEGER PRIMARY KEY, text TEXT, metadata TEXT)")
+            self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)")
+            self._migrate_documents_json()
             
             # Check if we have an existing index
             index_path = os.path.join(self.storage_path, "faiss_index.bin")
-            documents_path = os.path.join(self.storage_path, "documents.json")
             
-            if os.path.exists(index_path) and os.path.exists(documents_path):
-                # Load existing index
+            if os.path.exists(index_path):
+                # Load existing index; stores without a recorded id were numbered by position
                 self.index = faiss.read_index(index_path)
+                saved_max_id = self._saved_max_id()
+                if saved_max_id is None:
+                    saved_max_id = self.index.ntotal - 1
+                self._configure_index()
+                base_max_id = self._max_id()
+                self.index = self._to_device(self.index)
+                self._base_n = self.index.ntotal
+                self._load_deltas(base_max_id)
                 
-                # Load documents
-                with open(documents_path, 'r') as f:
-                    self.documents = json.load(f)
+                # Drop documents added after the last index save began
+                with self.db:
+                    self.db.execute("DELETE FROM docs WHERE id > ?", (saved_max_id,))
+                self._next_id = saved_max_id + 1
                     
-                logger.info(f"Loaded existing vector store with {len(self.documents)} documents")
+                logger.info(f"Loaded existing vector store with {self.index.ntotal} documents")
             else:
                 # Create new index
                 embedding_dim = self.embedding_model.get_sentence_embedding_dimension()
-                self.index = faiss.IndexFlatL2(embedding_dim)
-                self.documents = []
+                self.index = self._new_index(embedding_dim)
+                self._remove_deltas()
+                self._needs_full_save = True
+                self.db.execute("DELETE FROM docs")
+                self.db.commit()
                 logger.info(f"Created new vector store with dimension {embedding_dim}")
+            
+            self._unsaved = []
+            self._n_unsaved = 0
+            self._pending = np.empty((_ADD_BATCH_SIZE, self.index.d), dtype=np.float32)
+            self._pending_ids = np.empty(_ADD_BATCH_SIZE, dtype=np.int64)
         
         except Exception as e:
             logger.error(f"Error initializing vector store: {e}")
             raise
     
+    def _delta_files(self) -> List[Tuple[int, str]]:
+        """Delta shards on disk as (id of their first document, path), in order"""
+        deltas = []
+        for name in os.listdir(self.storage_path):
+            if name.startswith(_DELTA_PREFIX) and name.endswith(".bin"):
+                start = name[len(_DELTA_PREFIX):-len(".bin")]
+                if start.isdigit():
+                    deltas.append((int(start), os.path.join(self.storage_path, name)))
+        return sorted(deltas)
+    
+    def _delta_dtype(self) -> np.dtype:
+        """Record layout of delta shards: a document id and its vector"""
+        return np.dtype([("id", "<i8"), ("vector", "<f4", (self.index.d,))])
+    
+    def _load_deltas(self, base_max_id: int) -> None:
+        """Append the vectors saved in delta shards since the last full index write"""
+        for start, path in self._delta_files():
+            if start <= base_max_id:
+                # Already in the base index; left behind by an interrupted compaction
+                os.remove(path)
+                continue
+                
+            records = np.fromfile(path, dtype=self._delta_dtype())
+            self._add_vectors(np.ascontiguousarray(records["vector"]), np.ascontiguousarray(records["id"]))
+            self._n_deltas += 1
+            self._n_delta_vectors += len(records)
+            
+        if self._n_deltas:
+            logger.info(f"Loaded {self._n_delta_vectors} vectors from {self._n_deltas} delta shards")
+    
+    def _remove_deltas(self) -> None:
+        """Delete all delta shards"""
+        for _, path in self._delta_files():
+            os.remove(path)
+        self._n_deltas = 0
+        self._n_delta_vectors = 0
+    
+    def _saved_max_id(self) -> Optional[int]:
+        """Largest document id covered by the last index save, if one was recorded"""
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'saved_max_id'").fetchone()
+        return row[0] if row else None
+    
+    def _max_id(self) -> int:
+        """Largest document id in the (CPU) index, or -1 when it is empty"""
+        if self.index.ntotal == 0:
+            return -1
+        if isinstance(self.index, faiss.IndexIDMap):
+            return int(faiss.vector_to_array(self.index.id_map).max())
+            
+        # IVF indexes keep the ids in their inverted lists
+        invlists = faiss.extract_index_ivf(self.index).invlists
+        return max(
+            int(faiss.rev_swig_ptr(invlists.get_ids(i), invlists.list_size(i)).max())
+            for i in range(invlists.nlist) if invlists.list_size(i)
+        )
+    
+    def _migrate_documents_json(self) -> None:
+        """Move documents from the documents.json file older versions wrote into SQLite"""
+        documents_path = os.path.join(self.storage_path, "documents.json")
+        if not os.path.exists(documents_path):
+            return
+            
+        with open(documents_path, 'r') as f:
+            documents = json.load(f)
+            
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO docs (id, text, metadata) VALUES (?, ?, ?)",
+                [(doc["id"], doc["text"], json.dumps(doc.get("metadata", {}))) for doc in documents]
+            )
+        os.remove(documents_path)
+        logger.info(f"Migrated {len(documents)} documents to SQLite")
+    
+    def _load_embedding_model(self) -> SentenceTransformer:
+        """Load the embedding model for the configured backend"""
+        if self.embedding_backend == "torch":
+            model = SentenceTransformer(self.embedding_model_name)
+            
+            # Run in FP16 on GPU (SentenceTransformer picks CUDA when available)
+            import torch
+            if torch.cuda.is_available():
+                model.half()
+                
+            # Inputs are padded to one fixed length, so the compiled graph is never re-specialized
+            if self.compile_embedder:
+                model[0].auto_model = torch.compile(model[0].auto_model, mode="reduce-overhead", dynamic=False)
+            return model
+            
+        # Export and quantize the model once, then load the cached copy
+        model_dir = os.path.join(self.storage_path, "onnx_int8", self.embedding_model_name.replace("/", "__"))
+        if not os.path.exists(os.path.join(model_dir, _ONNX_QUANTIZED_FILE)):
+            from sentence_transformers import export_dynamic_quantized_onnx_model
+            
+            logger.info(f"Exporting INT8 ONNX embedder to {model_dir}")
+            model = SentenceTransformer(self.embedding_model_name, backend="onnx")
+            model.save(model_dir)
+            export_dynamic_quantized_onnx_model(model, _ONNX_QUANTIZATION, model_dir)
+            
+        return SentenceTransformer(model_dir, backend="onnx", model_kwargs={"file_name": _ONNX_QUANTIZED_FILE})
+    
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """Embed texts as unit-length float32 vectors"""
+        if self.compile_embedder:
+            return self._encode_fixed_length(texts)
+            
+        # encode() already sorts texts by length into batches to minimize padding
+        embeddings = self.embedding_model.encode(
+            texts,
+            batch_size=_ENCODE_BATCH_SIZE,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        )
+        # faiss copies anything that is not C-contiguous float32
+        return np.ascontiguousarray(embeddings, dtype=np.float32)
+    
+    def _encode_fixed_length(self, texts: List[str]) -> np.ndarray:
+        """Embed texts padded or truncated to _COMPILED_SEQ_LENGTH tokens, for the compiled embedder"""
+        import torch
+        
+        batches = []
+        for start in range(0, len(texts), _ENCODE_BATCH_SIZE):
+            features = self.embedding_model.tokenizer(
+                texts[start:start + _ENCODE_BATCH_SIZE],
+                padding="max_length",
+                truncation=True,
+                max_length=_COMPILED_SEQ_LENGTH,
+                return_tensors="pt"
+            )
+            features = {name: tensor.to(self.embedding_model.device) for name, tensor in features.items()}
+            with torch.inference_mode():
+                embeddings = self.embedding_model(features)["sentence_embedding"]
+                embeddings = torch.nn.functional.normalize(embeddings, p=2, dim=1)
+            batches.append(embeddings.float().cpu().numpy())
+            
+        return np.ascontiguousarray(np.concatenate(batches), dtype=np.float32)
+    
+    def _encode_query(self, query: str) -> bytes:
+        """Embed a normalized query, as bytes so cached values cannot be modified"""
+        return self._encode([query]).tobytes()
+    
+    def _base_index(self, index: faiss.Index) -> faiss.Index:
+        """Unwrap the IndexIDMap that gives flat and HNSW indexes explicit ids"""
+        return faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    
+    def _on_gpu(self, index: faiss.Index) -> bool:
+        """Check whether an index lives on the GPU"""
+        return self._gpu_res is not None and isinstance(self._base_index(index), faiss.GpuIndex)
+    
+    def _to_device(self, index: faiss.Index) -> faiss.Index:
+        """Move an index to the GPU if one is available (HNSW has no GPU version)"""
+        if self._gpu_res is None or self._on_gpu(index) or isinstance(self._base_index(index), faiss.IndexHNSW):
+            return index
+        return faiss.index_cpu_to_gpu(self._gpu_res, 0, index)
+    
+    def _is_flat(self, index: faiss.Index) -> bool:
+        """Check whether an index is an exact flat index, on CPU or GPU"""
+        base = self._base_index(index)
+        return isinstance(base, faiss.IndexFlat) or (self._on_gpu(index) and isinstance(base, faiss.GpuIndexFlat))
+    
+    def _new_index(self, embedding_dim: int) -> faiss.Index:
+        """Create an empty index of the configured type"""
+        if self.index_type == "hnsw":
+            index = faiss.IndexHNSWFlat(embedding_dim, _HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = _HNSW_EF_CONSTRUCTION
+            index.hnsw.efSearch = _HNSW_EF_SEARCH
+            return faiss.IndexIDMap(index)
+            
+        # IVF-PQ starts out flat; see _maybe_build_ivfpq
+        return self._to_device(faiss.IndexIDMap(faiss.IndexFlatIP(embedding_dim)))
+    
+    def _configure_index(self) -> None:
+        """Apply search-time parameters, which aren't all kept by write_index"""
+        # Older stores numbered flat and HNSW vectors by position; rebuild them with
+        # those positions as explicit ids. Flat L2 indexes from before the switch to
+        # inner product may also hold unnormalized vectors.
+        if not isinstance(self.index, (faiss.IndexIDMap, faiss.IndexIVF)):
+            vectors = self.index.reconstruct_n(0, self.index.ntotal)
+            if self.index.metric_type == faiss.METRIC_L2:
+                faiss.normalize_L2(vectors)
+            self.index = self._new_index(self.index.d)
+            self._add_vectors(vectors, np.arange(len(vectors), dtype=np.int64))
+            self._needs_full_save = True
+            self._dirty = True
+            logger.info(f"Converted vector store index to an id-mapped inner product index ({len(vectors)} vectors)")
+            
+        base = self._base_index(self.index)
+        if isinstance(base, faiss.IndexHNSWFlat):
+            base.hnsw.efSearch = _HNSW_EF_SEARCH
+        elif isinstance(base, faiss.IndexIVF):
+            base.nprobe = _IVFPQ_NPROBE
+    
+    def _add_vectors(self, embeddings: np.ndarray, ids: np.ndarray) -> None:
+        """Add embeddings to the index under their document ids"""
+        self.index.add_with_ids(embeddings, ids)
+        self._unsaved.append((ids, embeddings))
+        self._n_unsaved += len(ids)
+        self._maybe_build_ivfpq()
+        
+    def _queue_vector(self, embedding: np.ndarray, doc_id: int) -> None:
+        """Queue one embedding, adding the queue to the index once it is full"""
+        self._pending[self._n_pending] = embedding
+        self._pending_ids[self._n_pending] = doc_id
+        self._n_pending += 1
+        if self._n_pending == _ADD_BATCH_SIZE:
+            self._flush_pending()
+            
+    def _flush_pending(self) -> None:
+        """Add queued embeddings to the index in one call"""
+        if self._n_pending:
+            # Copied, since the buffers are reused and the vectors are kept until the next save
+            self._add_vectors(self._pending[:self._n_pending].copy(), self._pending_ids[:self._n_pending].copy())
+            self._n_pending = 0
+        
+    def _maybe_build_ivfpq(self) -> None:
+        """Replace the flat index with a trained IVF-PQ index once there are enough vectors"""
+        if self.index_type != "ivfpq" or not self._is_flat(self.index):
+            return
+            
+        n = self.index.ntotal
+        if n < _IVFPQ_MIN_TRAIN:
+            return
+            
+        embedding_dim = self.index.d
+        vectors = self._base_index(self.index).reconstruct_n(0, n)
+        ids = faiss.vector_to_array(self.index.id_map)
+        
+        # IVF indexes store ids themselves, so this one needs no IndexIDMap
+        quantizer = faiss.IndexFlatIP(embedding_dim)
+        index = faiss.IndexIVFPQ(quantizer, embedding_dim, int(np.sqrt(n)), _IVFPQ_M, _IVFPQ_NBITS,
+                                 faiss.METRIC_INNER_PRODUCT)
+        index.train(vectors)
+        index.add_with_ids(vectors, ids)
+        index.nprobe = _IVFPQ_NPROBE
+        
+        self.index = self._to_device(index)
+        self._needs_full_save = True
+        logger.info(f"Built IVF-PQ index over {n} vectors")
+    
     def add_document(self, text: str, metadata: Dict[str, Any] = None) -> int:
         """Add a document to the vector store
         
@@ -69,21 +444,23 @@ class VectorStore:
         """
         try:
             # Get embedding
-            embedding = self.embedding_model.encode([text])
+            embedding = self._encode([text])
+            
+            doc_id = self._next_id
+            self._next_id += 1
             
-            # Add to index
-            self.index.add(embedding)
+            # Queue for the index
+            self._queue_vector(embedding[0], doc_id)
             
             # Add to documents
-            doc_id = len(self.documents)
-            self.documents.append({
-                "id": doc_id,
-                "text": text,
-                "metadata": metadata or {}
-            })
+            with self.db:
+                self.db.execute(
+                    "INSERT INTO docs (id, text, metadata) VALUES (?, ?, ?)",
+                    (doc_id, text, json.dumps(metadata or {}))
+                )
             
             # Save
-            self._save()
+            self._mark_dirty()
             
             return doc_id
             
@@ -101,26 +478,38 @@ class VectorStore:
             List of document IDs
         """
         try:
-            # Get embeddings for all documents
-            texts = [doc["text"] for doc in documents]
-            embeddings = self.embedding_model.encode(texts)
-            
-            # Add to index
-            self.index.add(embeddings)
+            self._flush_pending()
+            first_id = self._next_id
+            self._next_id += len(documents)
+            doc_ids = list(range(first_id, first_id + len(documents)))
             
-            # Add to documents
-            doc_ids = []
-            for i, doc in enumerate(documents):
-                doc_id = len(self.documents)
-                self.documents.append({
-                    "id": doc_id,
-                    "text": doc["text"],
-                    "metadata": doc.get("metadata", {})
-                })
-                doc_ids.append(doc_id)
+            if len(documents) <= _ENCODE_BATCH_SIZE:
+                # A single chunk has nothing to overlap
+                rows = self._document_rows(first_id, documents)
+                self._add_vectors(self._encode([doc["text"] for doc in documents]),
+                                  np.arange(first_id, first_id + len(documents), dtype=np.int64))
+                with self.db:
+                    self.db.executemany("INSERT INTO docs (id, text, metadata) VALUES (?, ?, ?)", rows)
+            else:
+                # Encode the next chunk while earlier ones are added to the index and written to SQLite
+                add_queue = queue.Queue(maxsize=2)
+                write_queue = queue.Queue(maxsize=2)
+                with ThreadPoolExecutor(max_workers=2) as pool:
+                    indexed = pool.submit(self._index_stage, add_queue, write_queue)
+                    written = pool.submit(self._write_stage, write_queue)
+                    try:
+                        for start in range(0, len(documents), _ENCODE_BATCH_SIZE):
+                            chunk = documents[start:start + _ENCODE_BATCH_SIZE]
+                            embeddings = self._encode([doc["text"] for doc in chunk])
+                            ids = np.arange(first_id + start, first_id + start + len(chunk), dtype=np.int64)
+                            add_queue.put((embeddings, ids, self._document_rows(first_id + start, chunk)))
+                    finally:
+                        add_queue.put(None)
+                    indexed.result()
+                    written.result()
             
             # Save
-            self._save()
+            self._mark_dirty()
             
             return doc_ids
             
@@ -128,6 +517,54 @@ class VectorStore:
             logger.error(f"Error adding documents: {e}")
             return []
     
+    def _document_rows(self, first_id: int, documents: List[Dict[str, Any]]) -> List[Tuple[int, str, str]]:
+        """Build the SQLite rows for documents numbered from first_id"""
+        return [(first_id + i, doc["text"], json.dumps(doc.get("metadata", {})))
+                for i, doc in enumerate(documents)]
+    
+    def _index_stage(self, add_queue: queue.Queue, write_queue: queue.Queue) -> None:
+        """Pipeline stage: add encoded chunks to the index and pass their rows on to be written"""
+        error = None
+        while True:
+            item = add_queue.get()
+            if item is None:
+                break
+            if error is not None:
+                # Keep draining so the encoder is never left blocked on a full queue
+                continue
+            try:
+                embeddings, ids, rows = item
+                self._add_vectors(embeddings, ids)
+                write_queue.put(rows)
+            except Exception as e:
+                error = e
+                
+        write_queue.put(None)
+        if error is not None:
+            raise error
+    
+    def _write_stage(self, write_queue: queue.Queue) -> None:
+        """Pipeline stage: insert document rows, committing every few chunks"""
+        error = None
+        chunks = 0
+        while True:
+            rows = write_queue.get()
+            if rows is None:
+                break
+            if error is not None:
+                continue
+            try:
+                self.db.executemany("INSERT INTO docs (id, text, metadata) VALUES (?, ?, ?)", rows)
+                chunks += 1
+                if chunks % _COMMIT_EVERY == 0:
+                    self.db.commit()
+            except Exception as e:
+                error = e
+                
+        self.db.commit()
+        if error is not None:
+            raise error
+    
     def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
         """Search for documents similar to the query
         
@@ -140,21 +577,35 @@ class VectorStore:
         """
         try:
             # Get query embedding
-            query_embedding = self.embedding_model.encode([query])
+            self._flush_pending()
+            query_embedding = np.frombuffer(
+                self._query_embedding(" ".join(query.split())), dtype=np.float32
+            ).reshape(1, -1)
             
-            # Search
-            distances, indices = self.index.search(query_embedding, top_k)
+            # Search; vectors are unit length, so inner product is cosine similarity
+            scores, indices = self.index.search(query_embedding, top_k)
+            
+            # Fetch the matched documents in one query
+            hits = [(int(idx), float(score)) for idx, score in zip(indices[0], scores[0]) if idx >= 0]
+            if not hits:
+                return []
+                
+            rows = self.db.execute(
+                f"SELECT id, text, metadata FROM docs WHERE id IN ({','.join('?' * len(hits))})",
+                [idx for idx, _ in hits]
+            ).fetchall()
+            documents = {row[0]: row for row in rows}
             
             # Get results
             results = []
-            for i, idx in enumerate(indices[0]):
-                if idx < len(self.documents) and idx >= 0:
-                    doc = self.documents[idx]
+            for idx, score in hits:
+                doc = documents.get(idx)
+                if doc is not None:
                     results.append({
-                        "id": doc["id"],
-                        "text": doc["text"],
-                        "metadata": doc["metadata"],
-                        "score": float(1.0 - distances[0][i] / 2.0)  # Convert L2 distance to similarity score
+                        "id": doc[0],
+                        "text": doc[1],
+                        "metadata": json.loads(doc[2]),
+                        "score": score
                     })
             
             return results
@@ -163,28 +614,109 @@ class VectorStore:
             logger.error(f"Error searching: {e}")
             return []
     
+    def _mark_dirty(self) -> None:
+        """Record unsaved index changes and save once enough have built up"""
+        self._dirty = True
+        if (time.monotonic() - self._last_flush > _FLUSH_INTERVAL
+                or self._n_unsaved + self._n_pending >= _FLUSH_EVERY):
+            self._save()
+    
+    def flush(self) -> None:
+        """Write any unsaved index changes to disk"""
+        if self._dirty:
+            self._save()
+    
     def _save(self) -> None:
         """Save the vector store to disk"""
         try:
-            # Save index
-            index_path = os.path.join(self.storage_path, "faiss_index.bin")
-            faiss.write_index(self.index, index_path)
+            self._flush_pending()
             
-            # Save documents
-            documents_path = os.path.join(self.storage_path, "documents.json")
-            with open(documents_path, 'w') as f:
-                json.dump(self.documents, f)
+            # Record the newest id first, so documents up to it are kept on load
+            # even if the process stops partway through writing the index
+            with self.db:
+                self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('saved_max_id', ?)",
+                                (self._next_id - 1,))
+            
+            if (self._needs_full_save or self._n_deltas >= _MAX_DELTAS
+                    or self._n_delta_vectors + self._n_unsaved > _MAX_DELTA_FRACTION * self._base_n):
+                self._save_full()
+            elif self._n_unsaved:
+                # Append only the new vectors
+                ids = np.concatenate([ids for ids, _ in self._unsaved])
+                records = np.empty(len(ids), dtype=self._delta_dtype())
+                records["id"] = ids
+                records["vector"] = np.concatenate([vectors for _, vectors in self._unsaved])
                 
+                delta_path = os.path.join(self.storage_path, f"{_DELTA_PREFIX}{ids[0]}.bin")
+                tmp_path = delta_path + ".tmp"
+                records.tofile(tmp_path)
+                os.replace(tmp_path, delta_path)
+                self._n_deltas += 1
+                self._n_delta_vectors += len(records)
+            
+            self._unsaved = []
+            self._n_unsaved = 0
+            self._dirty = False
+            self._last_flush = time.monotonic()
+            
         except Exception as e:
             logger.error(f"Error saving vector store: {e}")
             
+    def _save_full(self) -> None:
+        """Rewrite the whole index and drop the delta shards it now contains"""
+        # Save index, replacing the old file only once the new one is complete
+        index_path = os.path.join(self.storage_path, "faiss_index.bin")
+        tmp_path = index_path + ".tmp"
+        index = faiss.index_gpu_to_cpu(self.index) if self._on_gpu(self.index) else self.index
+        faiss.write_index(index, tmp_path)
+        os.replace(tmp_path, index_path)
+        
+        self._remove_deltas()
+        self._base_n = self.index.ntotal
+        self._needs_full_save = False
+        
+    def delete_document(self, doc_id: int) -> bool:
+        """Delete a document from the vector store
+        
+        Args:
+            doc_id: ID returned when the document was added
+            
+        Returns:
+            True if the document existed
+        """
+        try:
+            self._flush_pending()
+            with self.db:
+                if self.db.execute("DELETE FROM docs WHERE id = ?", (doc_id,)).rowcount == 0:
+                    return False
+                    
+            try:
+                removed = self.index.remove_ids(np.array([doc_id], dtype=np.int64))
+            except RuntimeError:
+                # HNSW and GPU indexes can't remove vectors; search skips ids with no document
+                removed = 0
+                
+            # Delta shards can only add vectors, so a removal needs a full rewrite
+            if removed:
+                self._needs_full_save = True
+                self._mark_dirty()
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error deleting document: {e}")
+            return False
+    
     def clear(self) -> None:
         """Clear the vector store"""
         try:
             # Create new index
             embedding_dim = self.embedding_model.get_sentence_embedding_dimension()
-            self.index = faiss.IndexFlatL2(embedding_dim)
-            self.documents = []
+            self.index = self._new_index(embedding_dim)
+            self._n_pending = 0
+            self._next_id = 0
+            self._needs_full_save = True
+            with self.db:
+                self.db.execute("DELETE FROM docs")
             
             # Save
             self._save()
@@ -192,4 +724,24 @@ class VectorStore:
             logger.info("Vector store cleared")
             
         except Exception as e:
-            logger.error(f"Error clearing vector store: {e}")
\ No newline at end of file
+            logger.error(f"Error clearing vector store: {e}")
+            
+    def close(self) -> None:
+        """Flush the index and close the document database"""
+        if self.index is not None:
+            self.flush()
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+            
+    def __enter__(self) -> "VectorStore":
+        return self
+        
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+        
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
\ No newline at end of file
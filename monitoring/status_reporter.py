@@ -1,16 +1,34 @@
+import os
 import time
+import json
 import logging
 import threading
 import sys
+from collections import deque
 from typing import Optional, Dict, Any, List, Union
 from datetime import datetime, timedelta
+from ..config.settings import settings
 
 logger = logging.getLogger(__name__)
 
+# Events kept in memory; the full history goes to the JSON Lines file when one is configured
+_HISTORY_SIZE = 1000
+
+# History entries are (monotonic_ns, event code, payload values), and only become
+# dicts with ISO timestamps when the history is read
+_EVENTS = (
+    ("start_task", ("task_name", "total_steps")),
+    ("update_status", ("status",)),
+    ("increment_progress", ("progress", "total_steps")),
+    ("complete_task", ("duration",)),
+    ("fail_task", ("error", "duration")),
+)
+_EVENT_CODES = {name: code for code, (name, _) in enumerate(_EVENTS)}
+
 class StatusReporter:
     """Reports status of the agent's tasks"""
     
-    def __init__(self):
+    def __init__(self, history_path: Optional[str] = None):
         self.task_name = "Idle"
         self.status = "Not started"
         self.progress = 0
@@ -20,7 +38,15 @@ class StatusReporter:
         self.update_time = None
         self.success = None
         self.error = None
-        self.history = []
+        self.history = deque(maxlen=_HISTORY_SIZE)
+        self.history_path = history_path or settings.monitoring.status_history_path
+        if self.history_path:
+            self.history_path = os.path.expanduser(self.history_path)
+        self._history_file = None
+        self._wall_offset_ns = time.time_ns() - time.monotonic_ns()
+        
+        # Steps reported since the progress was last brought up to date
+        self._pending_increment = 0
         self._lock = threading.Lock()
         self._progress_thread = None
         self._stop_progress = threading.Event()
@@ -37,14 +63,10 @@ class StatusReporter:
             self.update_time = self.start_time
             self.success = None
             self.error = None
+            self._pending_increment = 0
             
             # Add event to history
-            self.history.append({
-                "timestamp": self.start_time.isoformat(),
-                "event": "start_task",
-                "task_name": task_name,
-                "total_steps": total_steps
-            })
+            self._record("start_task", task_name, total_steps)
             
             # Log start of task
             logger.info(f"Started task: {task_name} ({total_steps} steps)")
@@ -62,32 +84,38 @@ class StatusReporter:
             self.update_time = datetime.now()
             
             # Add event to history
-            self.history.append({
-                "timestamp": self.update_time.isoformat(),
-                "event": "update_status",
-                "status": status
-            })
+            self._record("update_status", status)
             
             # Log status update
             logger.info(f"Status update: {status}")
     
     def increment_progress(self, steps: int = 1) -> None:
-        """Increment the progress"""
+        """Increment the progress
+        
+        Steps are only counted here; they are applied and recorded in the
+        history when the progress thread or a status read next catches up.
+        """
+        # += is not atomic, and readers drain the count from other threads
         with self._lock:
-            self.progress = min(self.progress + steps, self.total_steps)
-            self.update_time = datetime.now()
-            
-            # Add event to history
-            self.history.append({
-                "timestamp": self.update_time.isoformat(),
-                "event": "increment_progress",
-                "progress": self.progress,
-                "total_steps": self.total_steps
-            })
+            self._pending_increment += steps
+    
+    def _apply_pending_progress(self) -> None:
+        """Apply steps counted since the last update as one history event; caller holds the lock"""
+        steps = self._pending_increment
+        if not steps:
+            return
+        self._pending_increment -= steps
+        
+        self.progress = min(self.progress + steps, self.total_steps)
+        self.update_time = datetime.now()
+        
+        # Add event to history
+        self._record("increment_progress", self.progress, self.total_steps)
     
     def complete_task(self) -> None:
         """Mark the task as complete"""
         with self._lock:
+            self._apply_pending_progress()
             self.progress = self.total_steps
             self.status = "Completed"
             self.end_time = datetime.now()
@@ -95,11 +123,8 @@ class StatusReporter:
             self.success = True
             
             # Add event to history
-            self.history.append({
-                "timestamp": self.end_time.isoformat(),
-                "event": "complete_task",
-                "duration": (self.end_time - self.start_time).total_seconds()
-            })
+            self._record("complete_task", (self.end_time - self.start_time).total_seconds())
+            self._close_history_file()
             
             # Log task completion
             duration = (self.end_time - self.start_time).total_seconds()
@@ -113,6 +138,7 @@ class StatusReporter:
     def fail_task(self, error: str) -> None:
         """Mark the task as failed"""
         with self._lock:
+            self._apply_pending_progress()
             self.status = "Failed"
             self.end_time = datetime.now()
             self.update_time = self.end_time
@@ -120,12 +146,8 @@ class StatusReporter:
             self.error = error
             
             # Add event to history
-            self.history.append({
-                "timestamp": self.end_time.isoformat(),
-                "event": "fail_task",
-                "error": error,
-                "duration": (self.end_time - self.start_time).total_seconds()
-            })
+            self._record("fail_task", error, (self.end_time - self.start_time).total_seconds())
+            self._close_history_file()
             
             # Log task failure
             duration = (self.end_time - self.start_time).total_seconds()
@@ -139,6 +161,7 @@ class StatusReporter:
     def get_status(self) -> Dict[str, Any]:
         """Get the current status"""
         with self._lock:
+            self._apply_pending_progress()
             duration = None
             estimated_time_remaining = None
             
@@ -169,12 +192,55 @@ class StatusReporter:
     def get_history(self) -> List[Dict[str, Any]]:
         """Get the history of events"""
         with self._lock:
-            return self.history.copy()
+            self._apply_pending_progress()
+            return [self._event_dict(entry) for entry in self.history]
+    
+    def _record(self, event: str, *payload: Any) -> None:
+        """Add an event to the history; caller holds the lock"""
+        entry = (time.monotonic_ns(), _EVENT_CODES[event], payload)
+        self.history.append(entry)
+        
+        if not self.history_path:
+            return
+            
+        try:
+            if self._history_file is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.history_path)), exist_ok=True)
+                self._history_file = open(self.history_path, 'a', buffering=1)
+            self._history_file.write(json.dumps(self._event_dict(entry), separators=(",", ":")) + "\n")
+        except Exception as e:
+            logger.error(f"Error writing status history: {e}")
+    
+    def _close_history_file(self) -> None:
+        """Close the history file until the next event; caller holds the lock"""
+        if self._history_file is not None:
+            try:
+                self._history_file.close()
+            except Exception as e:
+                logger.error(f"Error closing status history: {e}")
+            self._history_file = None
+            
+    def close(self) -> None:
+        """Close the history file"""
+        with self._lock:
+            self._close_history_file()
+    
+    def _event_dict(self, entry: tuple) -> Dict[str, Any]:
+        """Expand a history entry into an event dict"""
+        timestamp_ns, code, payload = entry
+        name, fields = _EVENTS[code]
+        event = {
+            "timestamp": datetime.fromtimestamp((timestamp_ns + self._wall_offset_ns) / 1e9).isoformat(),
+            "event": name
+        }
+        event.update(zip(fields, payload))
+        return event
     
     def _progress_reporter(self) -> None:
         """Thread to periodically report progress"""
         while not self._stop_progress.is_set():
             with self._lock:
+                self._apply_pending_progress()
                 if self.progress < self.total_steps:
                     percentage = int(100 * self.progress / self.total_steps) if self.total_steps > 0 else 0
                     elapsed = (datetime.now() - self.start_time).total_seconds()
@@ -1,15 +1,39 @@
 import os
 import logging
-import json
 import time
 from typing import Dict, Any, Optional, List
 from datetime import datetime
 import threading
-from pympler import asizeof
+import psutil
+import orjson
 from ..config.settings import settings
 
+_json_dumps_bytes = orjson.dumps
+
 logger = logging.getLogger(__name__)
 
+# Hot-path counters, as (section, field); each thread increments its own slot of these
+_COUNTERS = (
+    ("agent", "iterations"),
+    ("agent", "actions"),
+    ("agent", "successful_actions"),
+    ("agent", "failed_actions"),
+    ("agent", "tokens_generated"),
+    ("agent", "tokens_processed"),
+    ("model", "inference_count"),
+    ("model", "inference_time"),
+    ("filesystem", "files_created"),
+    ("filesystem", "files_modified"),
+    ("filesystem", "files_deleted"),
+    ("executor", "executions"),
+    ("executor", "successful_executions"),
+    ("executor", "failed_executions"),
+    ("executor", "total_execution_time"),
+)
+(_ITERATIONS, _ACTIONS, _SUCCESSFUL_ACTIONS, _FAILED_ACTIONS, _TOKENS_GENERATED, _TOKENS_PROCESSED,
+ _INFERENCE_COUNT, _INFERENCE_TIME, _FILES_CREATED, _FILES_MODIFIED, _FILES_DELETED,
+ _EXECUTIONS, _SUCCESSFUL_EXECUTIONS, _FAILED_EXECUTIONS, _EXECUTION_TIME) = range(len(_COUNTERS))
+
 class Telemetry:
     """Collects and reports telemetry data for the agent"""
     
@@ -52,7 +76,24 @@ class Telemetry:
         self._collection_thread = None
         self._stop_collection = threading.Event()
         self._lock = threading.Lock()
+        
+        # Per-thread counter slots, so recording never contends on the lock
+        self._local = threading.local()
+        self._thread_slots: List[tuple] = []
+        self._retired_slots = [0] * len(_COUNTERS)
+        self._tokens_per_second = 0.0
         self._collection_interval = 60  # seconds
+        self._proc = psutil.Process(os.getpid())
+        
+        # Prime the non-blocking CPU and network counters; later reads report the change since the previous one
+        psutil.cpu_percent(interval=None)
+        self._proc.cpu_percent(interval=None)
+        self._prev_net = psutil.net_io_counters()
+        
+        # Workspace size, scanned once and then kept current by record_file_operation
+        self._file_sizes: Dict[str, int] = {}
+        self._fs_total_bytes = 0
+        self._fs_scanned = False
         
         # Initialize if metrics path provided
         if self.metrics_path:
@@ -65,6 +106,7 @@ class Telemetry:
             return
             
         logger.info("Starting telemetry collection")
+        self._scan_workspace()
         self._stop_collection.clear()
         self._collection_thread = threading.Thread(target=self._collect_data)
         self._collection_thread.daemon = True
@@ -83,77 +125,118 @@ class Telemetry:
         # Save final metrics
         self._save_metrics()
     
+    def _slots(self) -> List[float]:
+        """Get the calling thread's counter slots, registering them on first use"""
+        try:
+            return self._local.slots
+        except AttributeError:
+            slots = [0] * len(_COUNTERS)
+            with self._lock:
+                self._thread_slots.append((threading.current_thread(), slots))
+            self._local.slots = slots
+            return slots
+    
     def record_agent_iteration(self) -> None:
         """Record an agent iteration"""
-        with self._lock:
-            self.metrics["agent"]["iterations"] += 1
+        self._slots()[_ITERATIONS] += 1
     
     def record_agent_action(self, success: bool) -> None:
         """Record an agent action"""
-        with self._lock:
-            self.metrics["agent"]["actions"] += 1
-            if success:
-                self.metrics["agent"]["successful_actions"] += 1
-            else:
-                self.metrics["agent"]["failed_actions"] += 1
+        slots = self._slots()
+        slots[_ACTIONS] += 1
+        slots[_SUCCESSFUL_ACTIONS if success else _FAILED_ACTIONS] += 1
     
     def record_token_usage(self, generated: int, processed: int) -> None:
         """Record token usage"""
-        with self._lock:
-            self.metrics["agent"]["tokens_generated"] += generated
-            self.metrics["agent"]["tokens_processed"] += processed
+        slots = self._slots()
+        slots[_TOKENS_GENERATED] += generated
+        slots[_TOKENS_PROCESSED] += processed
     
     def record_model_inference(self, time_taken: float, tokens: int) -> None:
         """Record model inference stats"""
-        with self._lock:
-            self.metrics["model"]["inference_count"] += 1
-            self.metrics["model"]["inference_time"] += time_taken
-            
-            # Update averages
-            count = self.metrics["model"]["inference_count"]
-            total_time = self.metrics["model"]["inference_time"]
-            
-            self.metrics["model"]["avg_inference_time"] = total_time / count
-            
-            if time_taken > 0:
-                self.metrics["model"]["tokens_per_second"] = tokens / time_taken
+        slots = self._slots()
+        slots[_INFERENCE_COUNT] += 1
+        slots[_INFERENCE_TIME] += time_taken
+        
+        if time_taken > 0:
+            self._tokens_per_second = tokens / time_taken
     
-    def record_file_operation(self, operation: str) -> None:
-        """Record file operation"""
-        with self._lock:
-            if operation == "create":
-                self.metrics["filesystem"]["files_created"] += 1
-            elif operation == "modify":
-                self.metrics["filesystem"]["files_modified"] += 1
-            elif operation == "delete":
-                self.metrics["filesystem"]["files_deleted"] += 1
+    def record_file_operation(self, operation: str, path: Optional[str] = None, size: Optional[int] = None) -> None:
+        """Record file operation
+        
+        Args:
+            operation: "create", "modify" or "delete"
+            path: Path of the affected file, used to keep the workspace size current
+            size: New size of the file in bytes; taken from the file itself if omitted
+        """
+        if path is not None and operation in ("create", "modify") and size is None:
+            try:
+                size = os.stat(path).st_size
+            except OSError:
+                size = 0
+                
+        slots = self._slots()
+        if operation == "create":
+            slots[_FILES_CREATED] += 1
+        elif operation == "modify":
+            slots[_FILES_MODIFIED] += 1
+        elif operation == "delete":
+            slots[_FILES_DELETED] += 1
+            
+        if path is not None:
+            with self._lock:
+                old_size = self._file_sizes.pop(path, 0)
+                if operation == "delete":
+                    self._fs_total_bytes -= old_size
+                else:
+                    self._file_sizes[path] = size
+                    self._fs_total_bytes += size - old_size
     
     def record_code_execution(self, success: bool, time_taken: float) -> None:
         """Record code execution"""
-        with self._lock:
-            self.metrics["executor"]["executions"] += 1
-            self.metrics["executor"]["total_execution_time"] += time_taken
-            
-            if success:
-                self.metrics["executor"]["successful_executions"] += 1
+        slots = self._slots()
+        slots[_EXECUTIONS] += 1
+        slots[_EXECUTION_TIME] += time_taken
+        slots[_SUCCESSFUL_EXECUTIONS if success else _FAILED_EXECUTIONS] += 1
+    
+    def _sync_counters(self) -> None:
+        """Sum the per-thread counters into self.metrics and derive averages; caller holds the lock"""
+        totals = list(self._retired_slots)
+        live = []
+        for thread, slots in self._thread_slots:
+            for i, value in enumerate(slots):
+                totals[i] += value
+            if thread.is_alive():
+                live.append((thread, slots))
             else:
-                self.metrics["executor"]["failed_executions"] += 1
-                
-            # Update average
-            count = self.metrics["executor"]["executions"]
-            total_time = self.metrics["executor"]["total_execution_time"]
+                # Fold finished threads' counts in so the slot list stays bounded
+                for i, value in enumerate(slots):
+                    self._retired_slots[i] += value
+        self._thread_slots = live
+        
+        for (section, field), value in zip(_COUNTERS, totals):
+            self.metrics[section][field] = value
             
-            if count > 0:
-                self.metrics["executor"]["avg_execution_time"] = total_time / count
+        model = self.metrics["model"]
+        model["avg_inference_time"] = model["inference_time"] / model["inference_count"] if model["inference_count"] else 0.0
+        model["tokens_per_second"] = self._tokens_per_second
+        
+        executor = self.metrics["executor"]
+        executor["avg_execution_time"] = executor["total_execution_time"] / executor["executions"] if executor["executions"] else 0.0
     
     def get_metrics(self) -> Dict[str, Any]:
         """Get current metrics"""
         with self._lock:
+            self._sync_counters()
             return self.metrics.copy()
     
     def reset_metrics(self) -> None:
         """Reset metrics to initial state"""
         with self._lock:
+            for _, slots in self._thread_slots:
+                slots[:] = [0] * len(_COUNTERS)
+            self._retired_slots = [0] * len(_COUNTERS)
+            self._tokens_per_second = 0.0
             self.metrics = {
                 "system": {},
                 "agent": {
@@ -213,11 +296,9 @@ class Telemetry:
     
     def _collect_system_metrics(self) -> None:
         """Collect system metrics"""
-        import psutil
-        
         with self._lock:
             # CPU usage
-            self.metrics["system"]["cpu_percent"] = psutil.cpu_percent(interval=1)
+            self.metrics["system"]["cpu_percent"] = psutil.cpu_percent(interval=None)
             
             # Memory usage
             memory = psutil.virtual_memory()
@@ -230,29 +311,25 @@ class Telemetry:
             self.metrics["system"]["disk_percent"] = disk.percent
             self.metrics["system"]["disk_free_gb"] = disk.free / (1024 * 1024 * 1024)
             
-            # Network
+            # Network traffic since the previous collection
             net_io = psutil.net_io_counters()
-            self.metrics["system"]["network_sent_mb"] = net_io.bytes_sent / (1024 * 1024)
-            self.metrics["system"]["network_recv_mb"] = net_io.bytes_recv / (1024 * 1024)
+            self.metrics["system"]["network_sent_mb"] = (net_io.bytes_sent - self._prev_net.bytes_sent) / (1024 * 1024)
+            self.metrics["system"]["network_recv_mb"] = (net_io.bytes_recv - self._prev_net.bytes_recv) / (1024 * 1024)
+            self._prev_net = net_io
             
             # Process
-            process = psutil.Process(os.getpid())
-            self.metrics["system"]["process_cpu_percent"] = process.cpu_percent(interval=1)
-            self.metrics["system"]["process_memory_mb"] = process.memory_info().rss / (1024 * 1024)
-            self.metrics["system"]["process_threads"] = process.num_threads()
+            self.metrics["system"]["process_cpu_percent"] = self._proc.cpu_percent(interval=None)
+            self.metrics["system"]["process_memory_mb"] = self._proc.memory_info().rss / (1024 * 1024)
+            self.metrics["system"]["process_threads"] = self._proc.num_threads()
     
     def _collect_memory_metrics(self) -> None:
         """Collect memory usage of the application"""
         try:
-            import gc
-            
-            # Force garbage collection
-            gc.collect()
+            # Resident set size is a single syscall, unlike walking the object graph
+            rss_mb = self._proc.memory_info().rss / (1024 * 1024)
             
-            # Estimate memory usage
             with self._lock:
-                # Estimate memory usage of important components
-                self.metrics["memory"]["current_usage_mb"] = asizeof.asizeof(self) / (1024 * 1024)
+                self.metrics["memory"]["current_usage_mb"] = rss_mb
                 
                 # Update peak usage
                 if self.metrics["memory"]["current_usage_mb"] > self.metrics["memory"]["peak_usage_mb"]:
@@ -261,28 +338,37 @@ class Telemetry:
         except Exception as e:
             logger.error(f"Error collecting memory metrics: {e}")
     
-    def _collect_filesystem_metrics(self) -> None:
-        """Collect filesystem metrics"""
-        if not hasattr(self, "workspace_path"):
+    def _scan_workspace(self) -> None:
+        """Size every file in the workspace once, as the baseline for recorded file operations"""
+        if not hasattr(self, "workspace_path") or self._fs_scanned:
             return
             
         try:
-            total_size = 0
+            file_sizes = {}
             
+            # Walk workspace to calculate file sizes
+            for root, _, files in os.walk(self.workspace_path):
+                for file in files:
+                    filepath = os.path.join(root, file)
+                    try:
+                        file_sizes[filepath] = os.path.getsize(filepath)
+                    except OSError:
+                        pass
+                        
             with self._lock:
-                # Walk workspace to calculate file sizes
-                for root, _, files in os.walk(self.workspace_path):
-                    for file in files:
-                        filepath = os.path.join(root, file)
-                        try:
-                            total_size += os.path.getsize(filepath)
-                        except:
-                            pass
-                
-                self.metrics["filesystem"]["total_file_size_kb"] = total_size / 1024
+                # Keep sizes recorded while the scan was running
+                file_sizes.update(self._file_sizes)
+                self._file_sizes = file_sizes
+                self._fs_total_bytes = sum(file_sizes.values())
+                self._fs_scanned = True
                 
         except Exception as e:
-            logger.error(f"Error collecting filesystem metrics: {e}")
+            logger.error(f"Error scanning workspace: {e}")
+    
+    def _collect_filesystem_metrics(self) -> None:
+        """Collect filesystem metrics"""
+        with self._lock:
+            self.metrics["filesystem"]["total_file_size_kb"] = self._fs_total_bytes / 1024
     
     def _save_metrics(self) -> None:
         """Save metrics to file"""
@@ -291,13 +377,18 @@ class Telemetry:
             
         try:
             with self._lock:
+                self._sync_counters()
                 metrics_data = {
                     "timestamp": datetime.now().isoformat(),
                     "metrics": self.metrics
                 }
+                data = _json_dumps_bytes(metrics_data)
                 
-                with open(self.metrics_path, 'w') as f:
-                    json.dump(metrics_data, f, indent=2)
+            # Write compact JSON to a temporary file and rename it so readers never see a partial file
+            tmp_path = self.metrics_path + ".tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self.metrics_path)
                     
         except Exception as e:
             logger.error(f"Error saving metrics to file: {e}")
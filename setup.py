@@ -23,6 +23,10 @@ setup(
     ],
     python_requires=">=3.8",
     install_requires=requirements,
+    extras_require={
+        # INT8 ONNX Runtime embedder for the vector store (embedding_backend="onnx-int8")
+        "onnx": ["sentence-transformers[onnx]>=3.2.0"],
+    },
     entry_points={
         "console_scripts": [
             "llmagent=LLMAgent.cli.main:cli",
@@ -0,0 +1,63 @@
+import asyncio
+import heapq
+import itertools
+from typing import Dict, List
+
+class RunScheduler:
+    """Admit background agent runs up to a concurrency limit, highest priority first"""
+    
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._running = 0
+        # Heap of [-priority, arrival, workspace_id, future] for runs waiting for a slot
+        self._waiting: List[list] = []
+        self._arrivals = itertools.count()
+        
+    async def acquire(self, workspace_id: str, priority: int = 0) -> None:
+        """Wait for a free slot"""
+        if self._running < self.limit and not self._waiting:
+            self._running += 1
+            return
+            
+        future = asyncio.get_running_loop().create_future()
+        entry = [-priority, next(self._arrivals), workspace_id, future]
+        heapq.heappush(self._waiting, entry)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Given a slot just as it was cancelled
+                self.release()
+            elif entry in self._waiting:
+                # Not yet skipped over by release()
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+            raise
+            
+    def release(self) -> None:
+        """Hand a finished run's slot to the next waiting run"""
+        while self._waiting:
+            future = heapq.heappop(self._waiting)[3]
+            if not future.done():
+                future.set_result(None)
+                return
+        self._running -= 1
+        
+    def update_priority(self, priorities: Dict[str, int]) -> int:
+        """Change the priority of waiting runs in one pass
+        
+        Args:
+            priorities: New priority by workspace id
+            
+        Returns:
+            Number of waiting runs updated
+        """
+        updated = 0
+        for entry in self._waiting:
+            if entry[2] in priorities:
+                entry[0] = -priorities[entry[2]]
+                updated += 1
+                
+        if updated:
+            heapq.heapify(self._waiting)
+        return updated
@@ -1,56 +1,261 @@
 from typing import Dict, Any, List, Optional
 import os
 import logging
-import json
 import time
 from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends, Request
-from fastapi.responses import JSONResponse, StreamingResponse
-from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from pydantic import BaseModel, ConfigDict
 import asyncio
+import itertools
+import functools
+import secrets
+import uuid
+import anyio
 import uvicorn
 from threading import Thread
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from cachetools import TTLCache
+import orjson
 
 from ..core.agent import Agent
 from ..config.settings import settings
+from .scheduler import RunScheduler
 
-app = FastAPI(title="LLMAgent API", description="API for LLM-powered development agent")
+_json_dumps = lambda obj: orjson.dumps(obj).decode()
+_json_dumps_bytes = orjson.dumps
 
-# Configure CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # Adjust in production
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    """Size the default thread pool and start the I/O threads before serving requests"""
+    # Used by FastAPI for sync dependencies and handlers (40 threads by default)
+    threadpool_size = os.getenv("THREADPOOL_SIZE")
+    if threadpool_size:
+        anyio.to_thread.current_default_thread_limiter().total_tokens = int(threadpool_size)
+        
+    # Executors start threads lazily; calls that overlap make each one start its own
+    await asyncio.gather(*(_run_in(_io_pool, time.sleep, 0.01) for _ in range(_IO_WORKERS)))
+    yield
+
+# Headers for any origin; with credentials allowed the origin must be echoed, not "*"
+_VARY_ORIGIN = [(b"vary", b"Origin")]
+_CORS_HEADERS = [(b"access-control-allow-credentials", b"true")] + _VARY_ORIGIN
+_CORS_PREFLIGHT_HEADERS = [
+    (b"access-control-allow-credentials", b"true"),
+    (b"vary", b"Origin, Access-Control-Request-Method, Access-Control-Request-Headers"),
+    (b"access-control-allow-methods", b"DELETE, GET, HEAD, OPTIONS, PATCH, POST, PUT"),
+    (b"access-control-max-age", b"600"),
+    (b"content-type", b"text/plain; charset=utf-8"),
+    (b"content-length", b"2"),
+]
+
+class OpenCORSMiddleware:
+    """Allow cross-origin requests from any origin, with any method and headers
+    
+    Equivalent to Starlette's CORSMiddleware allowing everything, without its
+    per-request origin, method and header checks.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+        
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+            
+        origin = None
+        request_method = False
+        request_headers = None
+        for name, value in scope["headers"]:
+            if name == b"origin":
+                origin = value
+            elif name == b"access-control-request-method":
+                request_method = True
+            elif name == b"access-control-request-headers":
+                request_headers = value
+                
+        # Not a cross-origin request, but a cached response must not be reused for one
+        if origin is None:
+            extra_headers = _VARY_ORIGIN
+        elif scope["method"] == "OPTIONS" and request_method:
+            headers = [(b"access-control-allow-origin", origin)] + _CORS_PREFLIGHT_HEADERS
+            if request_headers is not None:
+                headers.append((b"access-control-allow-headers", request_headers))
+            await send({"type": "http.response.start", "status": 200, "headers": headers})
+            await send({"type": "http.response.body", "body": b"OK"})
+            return
+        else:
+            extra_headers = [(b"access-control-allow-origin", origin)] + _CORS_HEADERS
+            
+        async def send_with_cors(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", ())) + extra_headers
+            await send(message)
+            
+        await self.app(scope, receive, send_with_cors)
+
+# Routes declare a response_model so FastAPI serializes their results straight to
+# JSON bytes with pydantic-core, which beats a custom (e.g. orjson) response class
+app = FastAPI(title="LLMAgent API", description="API for LLM-powered development agent", lifespan=_lifespan)
+
+# Configure CORS (adjust in production)
+app.add_middleware(OpenCORSMiddleware)
 
 # Logger
 logger = logging.getLogger(__name__)
 
+class AgentCache(TTLCache):
+    """Active agents, bounded in number and idle time, closed when evicted
+    
+    Only touched from the event loop thread, so it needs no lock.
+    """
+    
+    def popitem(self):
+        key, agent_data = super().popitem()
+        _close_agent(key, agent_data)
+        return key, agent_data
+        
+    def expire(self, time=None):
+        expired = super().expire(time)
+        for key, agent_data in expired:
+            _close_agent(key, agent_data)
+        return expired
+
+def _close_agent(workspace_id: str, agent_data: Dict[str, Any], finishing: Optional[asyncio.Task] = None) -> None:
+    """Release an evicted agent's resources, unless a request or run still needs it
+    
+    Args:
+        workspace_id: Workspace of the agent
+        agent_data: The evicted agent's record
+        finishing: Task ending its turn with the agent, which doesn't count as busy
+    """
+    task = agent_data.get("task")
+    if agent_data["turns"] or (task is not None and task is not finishing and not task.done()):
+        # Still queued or running; _agent_turn closes it once that finishes
+        logger.warning(f"Evicted busy agent {workspace_id}")
+        return
+    if agent_data.get("closed"):
+        return
+    agent_data["closed"] = True
+        
+    try:
+        agent_data["agent"].close()
+        logger.info(f"Closed idle agent {workspace_id}")
+    except Exception as e:
+        logger.error(f"Error closing agent {workspace_id}: {e}")
+
+# Agent runs hold a thread for as long as the model is generating (llama.cpp
+# releases the GIL while it does), so they get a pool of their own and never
+# queue quick I/O such as status lookups behind them
+_AGENT_WORKERS = int(os.getenv("AGENT_WORKERS", os.cpu_count() or 4))
+_agent_pool = ThreadPoolExecutor(max_workers=_AGENT_WORKERS, thread_name_prefix="agent")
+_IO_WORKERS = 64
+_io_pool = ThreadPoolExecutor(max_workers=_IO_WORKERS, thread_name_prefix="api-io")
+
+async def _run_in(pool: ThreadPoolExecutor, func, *args, **kwargs):
+    """Run a blocking call in a pool without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(pool, functools.partial(func, *args, **kwargs))
+
+async def _run_agent(agent, **kwargs):
+    """Run an agent in the agent pool, stopping it if the calling task is cancelled
+    
+    The run's thread cannot be interrupted, so a cancelled caller waits for the
+    agent to notice it was stopped before it lets go of the agent.
+    """
+    run = _agent_pool.submit(agent.run, **kwargs)
+    future = asyncio.wrap_future(run)
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        # A run that has not started yet can simply be dropped
+        if not run.cancel():
+            agent.stop()
+            await asyncio.wait({future})
+        raise
+
+_scheduler = RunScheduler(_AGENT_WORKERS)
+
+# Action ids come from one counter, with a random per-process prefix so ids
+# from before a restart never match new actions
+_ACTION_PREFIX = secrets.token_hex(4)
+_action_ids = itertools.count()
+
+# Futures of recent status lookups by workspace id; pollers within the TTL await
+# the same one instead of each querying the agent
+_status_cache = TTLCache(maxsize=1024, ttl=float(os.getenv("STATUS_CACHE_TTL_SEC", 0.25)))
+
+@asynccontextmanager
+async def _agent_turn(workspace_id: str, agent_data: Dict[str, Any]):
+    """Hold an agent's lock, closing the agent afterwards if it was evicted meanwhile"""
+    agent_data["turns"] += 1
+    try:
+        async with agent_data["lock"]:
+            yield
+    finally:
+        agent_data["turns"] -= 1
+        if active_agents.get(workspace_id) is not agent_data:
+            _close_agent(workspace_id, agent_data, finishing=asyncio.current_task())
+
 # Store active agents
-active_agents = {}
+active_agents = AgentCache(
+    maxsize=int(os.getenv("MAX_ACTIVE_AGENTS", 256)),
+    ttl=int(os.getenv("AGENT_TTL_SEC", 3600))
+)
+
+def _get_agent_data(workspace_id: str) -> Dict[str, Any]:
+    """Look up an active agent, restarting its idle timeout"""
+    agent_data = active_agents.get(workspace_id)
+    if agent_data is None:
+        raise HTTPException(status_code=404, detail="Agent not found")
+        
+    active_agents[workspace_id] = agent_data
+    return agent_data
 
 # Models
 class AgentRequest(BaseModel):
     """Request to create a new agent"""
+    model_config = ConfigDict(frozen=True, extra='ignore')
+    
     workspace_id: Optional[str] = None
     model_type: str = "llamacpp"
     model_id: Optional[str] = None
     
 class PromptRequest(BaseModel):
     """Request to run a prompt"""
+    model_config = ConfigDict(frozen=True, extra='ignore')
+    
     prompt: str
     max_iterations: Optional[int] = None
     mode: str = "approval"
+    # Higher runs first when autonomous runs are waiting for a slot
+    priority: int = 0
     
 class ActionRequest(BaseModel):
     """Request to approve or reject an action"""
+    model_config = ConfigDict(frozen=True, extra='ignore')
+    
     action_id: str
     approved: bool
     
+class BatchWaitRequest(BaseModel):
+    """Request to wait for several agents' runs"""
+    model_config = ConfigDict(frozen=True, extra='ignore')
+    
+    workspace_ids: List[str]
+    n: Optional[int] = None
+    timeout: Optional[float] = None
+    
+class PriorityRequest(BaseModel):
+    """Request to reprioritize waiting runs"""
+    model_config = ConfigDict(frozen=True, extra='ignore')
+    
+    priorities: Dict[str, int]
+    
 class ContextDocRequest(BaseModel):
     """Request to add a context document"""
+    model_config = ConfigDict(frozen=True, extra='ignore')
+    
     name: str
     content: str
 
@@ -59,11 +264,21 @@ class ContextDocRequest(BaseModel):
 async def create_agent(request: AgentRequest):
     """Create a new agent instance"""
     # Generate workspace ID if not provided
-    workspace_id = request.workspace_id or f"workspace_{int(time.time())}"
+    workspace_id = request.workspace_id or f"workspace_{uuid.uuid4().hex[:12]}"
     
     # Create workspace path
     workspace_path = os.path.join(settings.filesystem.workspace_path, workspace_id)
     
+    # Two agents must never share a workspace, so an existing one is replaced
+    # only when idle, and closed first
+    existing = active_agents.get(workspace_id)
+    if existing is not None:
+        task = existing.get("task")
+        if existing["turns"] or (task is not None and not task.done()):
+            raise HTTPException(status_code=409, detail="Agent is busy")
+        del active_agents[workspace_id]
+        _close_agent(workspace_id, existing)
+    
     try:
         # Initialize agent
         model_kwargs = {"model_id": request.model_id} if request.model_id else {}
@@ -78,7 +293,18 @@ async def create_agent(request: AgentRequest):
             "agent": agent,
             "created_at": time.time(),
             "status": "initialized",
-            "pending_actions": []
+            # Keyed by action id
+            "pending_actions": {},
+            # Bumped on every change to pending_actions, which invalidates the
+            # cached (version, JSON) payload listing them
+            "pending_version": 0,
+            "pending_cache": None,
+            # Agent calls run in worker threads, so requests for one workspace take turns;
+            # pending_actions is only changed while this is held, including by the
+            # on_action callbacks that run in those threads
+            "lock": asyncio.Lock(),
+            # Requests holding or waiting for the lock
+            "turns": 0
         }
         
         return {
@@ -92,32 +318,27 @@ async def create_agent(request: AgentRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/agents/{workspace_id}/prompt", response_model=Dict[str, Any])
-async def run_prompt(workspace_id: str, request: PromptRequest, background_tasks: BackgroundTasks):
+async def run_prompt(workspace_id: str, request: PromptRequest):
     """Run a prompt with the agent"""
-    # Check if agent exists
-    if workspace_id not in active_agents:
-        raise HTTPException(status_code=404, detail="Agent not found")
-    
-    agent_data = active_agents[workspace_id]
+    agent_data = _get_agent_data(workspace_id)
     agent = agent_data["agent"]
     
-    # Update agent mode
-    agent.mode = request.mode
-    
     # Start agent in background if autonomous mode
     if request.mode == "autonomous":
-        background_tasks.add_task(
-            run_agent_task, 
-            agent, 
+        agent_data["status"] = "queued"
+        # Results of the previous run must not be reported for this one
+        agent_data["summary"] = None
+        agent_data["error"] = None
+        agent_data["task"] = asyncio.ensure_future(run_agent_task(
+            agent_data,
+            workspace_id,
             request.prompt, 
             request.max_iterations,
-            workspace_id
-        )
-        
-        agent_data["status"] = "running"
+            request.priority
+        ))
         
         return {
-            "status": "running",
+            "status": "queued",
             "workspace_id": workspace_id,
             "mode": request.mode
         }
@@ -125,50 +346,149 @@ async def run_prompt(workspace_id: str, request: PromptRequest, background_tasks
     # For approval mode, run first iteration and return pending actions
     def on_action(action):
         # Store action for later approval
-        action_id = f"action_{int(time.time())}_{len(agent_data['pending_actions'])}"
-        agent_data["pending_actions"].append({
-            "id": action_id,
-            "action": action,
-            "created_at": time.time()
-        })
+        _add_pending_action(agent_data, action)
         # Always return False to prevent execution
         return False
     
-    # Run one iteration
+    # Run one iteration, off the event loop
     try:
-        agent.run(
-            initial_prompt=request.prompt,
-            max_iterations=1,
-            on_action=on_action
-        )
+        async with _agent_turn(workspace_id, agent_data):
+            # Set only while holding the lock, so it can't change under another request's run
+            agent.mode = request.mode
+            await _run_in(
+                _agent_pool,
+                agent.run,
+                initial_prompt=request.prompt,
+                max_iterations=1,
+                on_action=on_action
+            )
+            
+            agent_data["status"] = "waiting_approval"
+            
+            return Response(
+                content=b'{"status":"waiting_approval","workspace_id":' + _json_dumps_bytes(workspace_id)
+                        + b',"pending_actions":' + _pending_actions_json(agent_data) + b'}',
+                media_type="application/json"
+            )
         
-        agent_data["status"] = "waiting_approval"
+    except Exception as e:
+        logger.error(f"Error running prompt: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/agents/{workspace_id}/prompt/stream")
+async def stream_prompt(workspace_id: str, request: PromptRequest):
+    """Run one approval-mode iteration, streaming each proposed action as a server-sent event"""
+    agent_data = _get_agent_data(workspace_id)
+    agent = agent_data["agent"]
+    
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+    
+    def on_action(action):
+        # Called on the agent's thread; hand the action to the event loop
+        action_id = _add_pending_action(agent_data, action)
+        loop.call_soon_threadsafe(events.put_nowait, ("action", {"id": action_id, "action": action}))
+        return False
         
+    async def run():
+        # Runs as its own task, so the agent keeps its lock until it finishes
+        # even if the client disconnects
+        async with _agent_turn(workspace_id, agent_data):
+            agent.mode = "approval"
+            agent_data["status"] = "running"
+            agent_data["summary"] = None
+            agent_data["error"] = None
+            try:
+                await _run_agent(
+                    agent,
+                    initial_prompt=request.prompt,
+                    max_iterations=1,
+                    on_action=on_action
+                )
+                agent_data["status"] = "waiting_approval"
+                events.put_nowait(("done", {"status": "waiting_approval", "workspace_id": workspace_id}))
+            except asyncio.CancelledError:
+                agent_data["status"] = "cancelled"
+                events.put_nowait(("cancelled", {"status": "cancelled", "workspace_id": workspace_id}))
+                raise
+            except Exception as e:
+                logger.error(f"Error running prompt: {e}")
+                agent_data["status"] = "failed"
+                events.put_nowait(("error", {"detail": str(e)}))
+                
+    agent_data["task"] = asyncio.ensure_future(run())
+    
+    async def event_stream():
+        while True:
+            event, data = await events.get()
+            yield f"event: {event}\ndata: {_json_dumps(data)}\n\n"
+            if event != "action":
+                break
+                
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+@app.post("/agents/{workspace_id}/cancel", response_model=Dict[str, Any])
+async def cancel_agent(workspace_id: str):
+    """Cancel an agent's queued or running background run"""
+    agent_data = _get_agent_data(workspace_id)
+    task = agent_data.get("task")
+    
+    if task is None or task.done():
         return {
-            "status": "waiting_approval",
-            "workspace_id": workspace_id,
-            "pending_actions": [
-                {"id": a["id"], "action": a["action"]} 
-                for a in agent_data["pending_actions"]
-            ]
+            "status": agent_data["status"],
+            "workspace_id": workspace_id
         }
         
-    except Exception as e:
-        logger.error(f"Error running prompt: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+    task.cancel()
+    return {
+        "status": "cancelling",
+        "workspace_id": workspace_id
+    }
+
+@app.post("/agents/batch/as_completed", response_model=Dict[str, Any])
+async def wait_for_agents(request: BatchWaitRequest):
+    """Wait for the runs of several agents, returning the first n to finish"""
+    tasks = {}
+    for workspace_id in request.workspace_ids:
+        agent_data = _get_agent_data(workspace_id)
+        task = agent_data.get("task")
+        if task is None:
+            raise HTTPException(status_code=400, detail=f"Agent {workspace_id} has not been run")
+        tasks[task] = (workspace_id, agent_data)
+        
+    n = min(request.n or len(tasks), len(tasks))
+    loop = asyncio.get_running_loop()
+    deadline = None if request.timeout is None else loop.time() + request.timeout
+    
+    completed = []
+    pending = set(tasks)
+    while pending and len(completed) < n:
+        timeout = None if deadline is None else max(0.0, deadline - loop.time())
+        done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        if not done:
+            break
+        completed.extend(_run_result(*tasks[task]) for task in done)
+        
+    completed = completed[:n]
+    finished = {result["workspace_id"] for result in completed}
+    return {
+        "completed": completed,
+        "pending": [workspace_id for workspace_id, _ in tasks.values() if workspace_id not in finished]
+    }
+
+@app.post("/agents/priority", response_model=Dict[str, Any])
+async def update_priority(request: PriorityRequest):
+    """Change the priority of autonomous runs still waiting for a slot"""
+    return {"updated": _scheduler.update_priority(request.priorities)}
 
 @app.get("/agents/{workspace_id}/status", response_model=Dict[str, Any])
 async def get_agent_status(workspace_id: str):
     """Get the status of an agent"""
-    # Check if agent exists
-    if workspace_id not in active_agents:
-        raise HTTPException(status_code=404, detail="Agent not found")
-    
-    agent_data = active_agents[workspace_id]
+    agent_data = _get_agent_data(workspace_id)
     agent = agent_data["agent"]
     
     # Get status
-    status_data = agent.status_reporter.get_status()
+    status_data = await _get_status(workspace_id, agent)
     
     return {
         "workspace_id": workspace_id,
@@ -177,69 +497,182 @@ async def get_agent_status(workspace_id: str):
         "progress": status_data
     }
 
+@app.get("/agents/{workspace_id}/actions")
+async def get_pending_actions(workspace_id: str):
+    """List the actions waiting for approval"""
+    agent_data = _get_agent_data(workspace_id)
+    return Response(content=_pending_actions_json(agent_data), media_type="application/json")
+
 @app.post("/agents/{workspace_id}/actions/{action_id}", response_model=Dict[str, Any])
 async def handle_action(workspace_id: str, action_id: str, request: ActionRequest):
     """Approve or reject an action"""
-    # Check if agent exists
-    if workspace_id not in active_agents:
-        raise HTTPException(status_code=404, detail="Agent not found")
-    
-    agent_data = active_agents[workspace_id]
+    agent_data = _get_agent_data(workspace_id)
     agent = agent_data["agent"]
     
-    # Find the action
-    action_data = None
-    for a in agent_data["pending_actions"]:
-        if a["id"] == action_id:
-            action_data = a
-            break
-    
-    if not action_data:
-        raise HTTPException(status_code=404, detail="Action not found")
-    
-    # Process action
-    if request.approved:
-        # Execute the action
-        result = agent._execute_action(
-            action_data["action"]["type"],
-            action_data["action"]["params"]
-        )
+    async with _agent_turn(workspace_id, agent_data):
+        # Find the action and remove it from pending
+        action_data = agent_data["pending_actions"].pop(action_id, None)
         
-        # Remove from pending
-        agent_data["pending_actions"] = [
-            a for a in agent_data["pending_actions"] if a["id"] != action_id
-        ]
+        if action_data is None:
+            raise HTTPException(status_code=404, detail="Action not found")
+        agent_data["pending_version"] += 1
         
-        return {
-            "status": "executed",
-            "result": result
-        }
-    else:
-        # Remove from pending
-        agent_data["pending_actions"] = [
-            a for a in agent_data["pending_actions"] if a["id"] != action_id
-        ]
+        # Process action
+        if request.approved:
+            # Execute the action, off the event loop
+            result = await _run_in(
+                _agent_pool,
+                agent._execute_action,
+                action_data["action"]["type"],
+                action_data["action"]["params"]
+            )
+            
+            return {
+                "status": "executed",
+                "result": result
+            }
+        else:
+            return {
+                "status": "rejected"
+            }
+
+def _add_pending_action(agent_data: Dict[str, Any], action: Dict[str, Any]) -> str:
+    """Store an action for later approval and return its id
+    
+    Called from agent threads, but only by runs that hold agent_data["lock"],
+    so it never races handle_action.
+    """
+    action_id = f"action_{_ACTION_PREFIX}_{next(_action_ids):x}"
+    agent_data["pending_actions"][action_id] = {"action": action}
+    agent_data["pending_version"] += 1
+    return action_id
+
+def _pending_actions_json(agent_data: Dict[str, Any]) -> bytes:
+    """Get the pending actions as a JSON list, serialized once per change"""
+    version = agent_data["pending_version"]
+    cache = agent_data["pending_cache"]
+    if cache is not None and cache[0] == version:
+        return cache[1]
         
-        return {
-            "status": "rejected"
-        }
+    # Streamed runs add actions from the agent's thread, so take a snapshot; one
+    # added meanwhile bumps the version and this payload is simply not reused
+    pending = list(agent_data["pending_actions"].items())
+    payload = _json_dumps_bytes([{"id": action_id, "action": a["action"]} for action_id, a in pending])
+    agent_data["pending_cache"] = (version, payload)
+    return payload
+
+async def _get_status(workspace_id: str, agent) -> Dict[str, Any]:
+    """Get an agent's progress, sharing one lookup between all polls in a short window"""
+    status = _status_cache.get(workspace_id)
+    if status is None:
+        status = asyncio.ensure_future(_run_in(_io_pool, agent.status_reporter.get_status))
+        _status_cache[workspace_id] = status
+        
+    try:
+        # Shielded so a poller that disconnects doesn't cancel the lookup for the others
+        return await asyncio.shield(status)
+    except Exception:
+        if _status_cache.get(workspace_id) is status:
+            del _status_cache[workspace_id]
+        raise
+
+def _run_result(workspace_id: str, agent_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Get the outcome of an agent's last run"""
+    return {
+        "workspace_id": workspace_id,
+        "status": agent_data["status"],
+        "summary": agent_data.get("summary"),
+        "error": agent_data.get("error")
+    }
 
 # Helper function to run agent in background
-async def run_agent_task(agent, prompt, max_iterations, workspace_id):
-    """Run agent in background task"""
+async def run_agent_task(agent_data, workspace_id, prompt, max_iterations, priority=0):
+    """Run agent in background task, once the scheduler admits it"""
+    # agent_data is held directly, since the agent may be evicted from active_agents while it runs
     try:
-        summary = agent.run(initial_prompt=prompt, max_iterations=max_iterations)
-        active_agents[workspace_id]["status"] = "completed"
-        active_agents[workspace_id]["summary"] = summary
+        await _scheduler.acquire(workspace_id, priority)
+        try:
+            async with _agent_turn(workspace_id, agent_data):
+                agent_data["agent"].mode = "autonomous"
+                agent_data["status"] = "running"
+                summary = await _run_agent(agent_data["agent"], initial_prompt=prompt, max_iterations=max_iterations)
+        finally:
+            _scheduler.release()
+        agent_data["status"] = "completed"
+        agent_data["summary"] = summary
+    except asyncio.CancelledError:
+        agent_data["status"] = "cancelled"
+        raise
     except Exception as e:
         logger.error(f"Error in background agent task: {e}")
-        active_agents[workspace_id]["status"] = "failed"
-        active_agents[workspace_id]["error"] = str(e)
+        agent_data["status"] = "failed"
+        agent_data["error"] = str(e)
+    finally:
+        # Also covers a run cancelled before it got its turn
+        if active_agents.get(workspace_id) is not agent_data:
+            _close_agent(workspace_id, agent_data, finishing=asyncio.current_task())
 
 # Run the API server
-def start_api(host="0.0.0.0", port=8000):
-    """Start the API server"""
-    uvicorn.run(app, host=host, port=port)
+def start_api(host="0.0.0.0", port=8000, workers: Optional[int] = None):
+    """Start the API server
+    
+    Agents are held in the memory of the worker process that created them, so
+    running more than one worker (workers, or UVICORN_WORKERS) needs a proxy
+    that routes each workspace to the same worker.
+    """
+    workers = _worker_count(workers)
+    
+    # Worker processes import the app themselves, so it must be passed by name;
+    # "auto" uses uvloop and httptools when they are installed
+    uvicorn.run(
+        f"{__spec__.name}:app" if workers > 1 else app,
+        host=host,
+        port=port,
+        workers=workers,
+        loop="auto",
+        http="auto",
+        log_level="info"
+    )
+
+def start_api_gunicorn(host="0.0.0.0", port=8000, workers: Optional[int] = None):
+    """Start the API server under Gunicorn with Uvicorn workers
+    
+    Gunicorn restarts workers that crash and replaces them gracefully on SIGHUP.
+    As with start_api, more than one worker needs workspace-affine routing.
+    """
+    from gunicorn.app.base import BaseApplication
+    
+    options = {
+        "bind": f"{host}:{port}",
+        "workers": _worker_count(workers),
+        "worker_class": "uvicorn_worker.UvicornWorker",
+        "worker_connections": 1000,
+        "graceful_timeout": 30,
+        # Lets polling clients reuse their connections
+        "keepalive": 5,
+        # Keeps the worker heartbeat files off disk
+        "worker_tmp_dir": "/dev/shm" if os.path.isdir("/dev/shm") else None,
+        "loglevel": "info"
+    }
+    
+    class APIApplication(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                if value is not None:
+                    self.cfg.set(key, value)
+                    
+        def load(self):
+            return app
+            
+    APIApplication().run()
+
+def _worker_count(workers: Optional[int]) -> int:
+    """Get the number of server workers, warning when agents will be split between them"""
+    workers = workers or int(os.getenv("UVICORN_WORKERS", 1))
+    if workers > 1:
+        logger.warning(f"Starting {workers} workers; each holds its own agents, so requests "
+                       "for a workspace must be routed to the worker that created it")
+    return workers
 
 # Run directly
 if __name__ == "__main__":
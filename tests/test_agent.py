@@ -1,7 +1,6 @@
 import os
-import unittest
 import tempfile
-import shutil
+import pytest
 from unittest.mock import MagicMock, patch
 import sys
 
@@ -13,93 +12,89 @@ from core.models import ModelBase
 from core.file_manager import FileManager
 from core.executor import CodeExecutor
 
-class TestAgent(unittest.TestCase):
-    """Test cases for the Agent class"""
-    
-    def setUp(self):
-        """Set up test environment"""
-        # Create a temporary directory for tests
-        self.test_dir = tempfile.mkdtemp()
-        
-        # Mock model
-        self.mock_model = MagicMock(spec=ModelBase)
-        self.mock_model.generate.return_value = "Test response"
-        
-        # Create agent with mock components
-        with patch('core.agent.get_model', return_value=self.mock_model):
-            self.agent = Agent(workspace_path=self.test_dir)
-            
-    def tearDown(self):
-        """Clean up after tests"""
-        # Remove temporary directory
-        shutil.rmtree(self.test_dir)
-        
-    def test_agent_initialization(self):
-        """Test agent initialization"""
-        self.assertEqual(self.agent.workspace_path, self.test_dir)
-        self.assertEqual(self.agent.model, self.mock_model)
-        self.assertIsInstance(self.agent.file_manager, FileManager)
-        self.assertIsInstance(self.agent.executor, CodeExecutor)
-        
-    def test_set_context_docs(self):
-        """Test setting context documents"""
-        docs = [
-            {"name": "test.txt", "content": "Test content"}
-        ]
-        
-        self.agent.set_context_docs(docs)
-        self.assertEqual(self.agent.context_docs, docs)
-        
-    def test_parse_actions(self):
-        """Test parsing actions from agent response"""
-        # Test with JSON action
-        response = """
-        I'll create a file for you.
-        
-        ```json
-        {
-            "type": "write_file",
-            "params": {
-                "filepath": "test.py",
-                "content": "print('Hello world')"
-            }
+SINGLE_ACTION = """
+I'll create a file for you.
+
+```json
+{
+    "type": "write_file",
+    "params": {
+        "filepath": "test.py",
+        "content": "print('Hello world')"
+    }
+}
+```
+"""
+
+MULTIPLE_ACTIONS = """
+I'll create two files for you.
+
+```json
+[
+    {
+        "type": "write_file",
+        "params": {
+            "filepath": "test1.py",
+            "content": "print('Hello world 1')"
         }
-        ```
-        """
-        
-        actions = self.agent._parse_actions(response)
-        self.assertEqual(len(actions), 1)
-        self.assertEqual(actions[0]["type"], "write_file")
-        self.assertEqual(actions[0]["params"]["filepath"], "test.py")
-        
-        # Test with multiple actions
-        response = """
-        I'll create two files for you.
-        
-        ```json
-        [
-            {
-                "type": "write_file",
-                "params": {
-                    "filepath": "test1.py",
-                    "content": "print('Hello world 1')"
-                }
-            },
-            {
-                "type": "write_file",
-                "params": {
-                    "filepath": "test2.py",
-                    "content": "print('Hello world 2')"
-                }
-            }
-        ]
-        ```
-        """
-        
-        actions = self.agent._parse_actions(response)
-        self.assertEqual(len(actions), 2)
-        self.assertEqual(actions[0]["type"], "write_file")
-        self.assertEqual(actions[1]["type"], "write_file")
+    },
+    {
+        "type": "write_file",
+        "params": {
+            "filepath": "test2.py",
+            "content": "print('Hello world 2')"
+        }
+    }
+]
+```
+"""
+
+@pytest.fixture(scope="module")
+def mock_model():
+    """Mock model shared by the tests in this module"""
+    model = MagicMock(spec=ModelBase)
+    model.generate.return_value = "Test response"
+    return model
+
+# Memory-backed on Linux, so the workspace costs no disk I/O
+_SHM_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+@pytest.fixture(scope="module")
+def workspace():
+    """Temporary workspace directory shared by the tests in this module"""
+    with tempfile.TemporaryDirectory(prefix="llmagent-test-", dir=_SHM_DIR) as path:
+        yield path
+
+@pytest.fixture(scope="module")
+def agent(workspace, mock_model):
+    """Agent with a mock model in the temporary workspace"""
+    with patch('core.agent.get_model', return_value=mock_model):
+        agent = Agent(workspace_path=workspace)
+    yield agent
+    agent.close()
+
+def test_agent_initialization(agent, workspace, mock_model):
+    """Test agent initialization"""
+    assert agent.workspace_path == workspace
+    assert agent.model is mock_model
+    assert isinstance(agent.file_manager, FileManager)
+    assert isinstance(agent.executor, CodeExecutor)
+
+def test_set_context_docs(agent):
+    """Test setting context documents"""
+    docs = [
+        {"name": "test.txt", "content": "Test content"}
+    ]
+
+    agent.set_context_docs(docs)
+    assert agent.context_docs == docs
 
-if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+@pytest.mark.parametrize("response,expected_filepaths", [
+    (SINGLE_ACTION, ["test.py"]),
+    (MULTIPLE_ACTIONS, ["test1.py", "test2.py"]),
+])
+def test_parse_actions(agent, response, expected_filepaths):
+    """Test parsing actions from agent response"""
+    actions = agent._parse_actions(response)
+    assert [action["type"] for action in actions] == ["write_file"] * len(expected_filepaths)
+    assert [action["params"]["filepath"] for action in actions] == expected_filepaths
@@ -0,0 +1,90 @@
+import os
+import json
+import marshal
+import pytest
+import sys
+
+# Add parent directory to path to allow imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.file_manager import FileManager, _CHECKSUM_ALGO, _CHECKSUM_FORMAT
+
+def write(path, content):
+    """Write a file directly, behind the file manager's back"""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+
+def read_index(workspace):
+    """Load the checksum index the file manager saved"""
+    with open(os.path.join(workspace, ".checksums.bin"), 'rb') as f:
+        return marshal.load(f)
+
+@pytest.fixture
+def workspace(tmp_path):
+    """Empty workspace directory for a single test"""
+    return str(tmp_path)
+
+def test_migrates_legacy_json_index(workspace):
+    """A JSON index from an older version is converted to the marshal index"""
+    write(os.path.join(workspace, "a.py"), "print('a')")
+    stats = os.stat(os.path.join(workspace, "a.py"))
+    files = {"a.py": {"size": stats.st_size, "mtime_ns": stats.st_mtime_ns, "sha": "abc"}}
+    with open(os.path.join(workspace, ".checksums.json"), 'w') as f:
+        json.dump({"format": _CHECKSUM_FORMAT, "algo": _CHECKSUM_ALGO, "files": files}, f)
+
+    manager = FileManager(workspace)
+
+    # Entries are kept as they were, not rehashed
+    assert manager.file_checksums == files
+    assert not os.path.exists(os.path.join(workspace, ".checksums.json"))
+    assert read_index(workspace) == {"format": _CHECKSUM_FORMAT, "algo": _CHECKSUM_ALGO, "files": files}
+
+def test_legacy_layout_rehashes(workspace):
+    """A JSON index in the old path -> digest layout is rebuilt from the files"""
+    path = os.path.join(workspace, "a.py")
+    write(path, "print('a')")
+    with open(os.path.join(workspace, ".checksums.json"), 'w') as f:
+        json.dump({"a.py": "abc"}, f)
+
+    manager = FileManager(workspace)
+
+    assert manager.file_checksums["a.py"]["sha"] == manager._get_file_checksum(path)
+    assert not os.path.exists(os.path.join(workspace, ".checksums.json"))
+    assert read_index(workspace)["files"] == manager.file_checksums
+
+def test_algorithm_mismatch_rehashes(workspace):
+    """Digests made with another algorithm are recomputed on load"""
+    path = os.path.join(workspace, "a.py")
+    write(path, "print('a')")
+    stats = os.stat(path)
+    files = {"a.py": {"size": stats.st_size, "mtime_ns": stats.st_mtime_ns, "sha": "abc"}}
+    with open(os.path.join(workspace, ".checksums.bin"), 'wb') as f:
+        marshal.dump({"format": _CHECKSUM_FORMAT, "algo": "md5", "files": files}, f)
+
+    manager = FileManager(workspace)
+
+    assert manager.file_checksums["a.py"]["sha"] == manager._get_file_checksum(path)
+    index = read_index(workspace)
+    assert index["algo"] == _CHECKSUM_ALGO
+    assert index["files"] == manager.file_checksums
+
+def test_changed_files_after_write_and_delete(workspace):
+    """Files written through the manager aren't reported; outside changes are"""
+    manager = FileManager(workspace)
+    assert manager.write_file("a.py", "print('a')")
+    assert manager.write_file("b.py", "print('b')")
+    assert manager.get_changed_files() == []
+
+    # New and modified files show up
+    write(os.path.join(workspace, "c.py"), "print('c')")
+    write(os.path.join(workspace, "b.py"), "print('changed')")
+    assert sorted(manager.get_changed_files()) == ["b.py", "c.py"]
+
+    # Deleted files drop out of the index, both in memory and on disk
+    assert manager.delete_file("a.py")
+    assert "a.py" not in manager.file_checksums
+    assert "a.py" not in read_index(workspace)["files"]
+    assert sorted(manager.get_changed_files()) == ["b.py", "c.py"]
+
+    # A reloaded manager sees the same state
+    assert sorted(FileManager(workspace).get_changed_files()) == ["b.py", "c.py"]
@@ -0,0 +1,94 @@
+import os
+import asyncio
+import pytest
+import sys
+
+# Add parent directory to path to allow imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tests.api.scheduler import RunScheduler
+
+def run(coro):
+    """Run a coroutine on a new event loop"""
+    return asyncio.run(coro)
+
+async def admitted(scheduler, order, workspace_id, priority=0):
+    """Wait for a slot and record when it was granted"""
+    await scheduler.acquire(workspace_id, priority)
+    order.append(workspace_id)
+
+def test_admits_up_to_limit():
+    """Runs beyond the limit wait until a slot is released"""
+    async def scenario():
+        scheduler = RunScheduler(2)
+        order = []
+        await scheduler.acquire("a")
+        await scheduler.acquire("b")
+        waiter = asyncio.ensure_future(admitted(scheduler, order, "c"))
+        await asyncio.sleep(0)
+        assert order == []
+
+        scheduler.release()
+        await waiter
+        assert order == ["c"]
+
+    run(scenario())
+
+@pytest.mark.parametrize("update,expected", [
+    (None, ["high", "low", "mid"]),
+    ({"low": 10}, ["low", "high", "mid"]),
+])
+def test_priority_order(update, expected):
+    """Waiting runs are admitted highest priority first, by arrival among equals"""
+    async def scenario():
+        scheduler = RunScheduler(1)
+        order = []
+        await scheduler.acquire("first")
+        waiters = [asyncio.ensure_future(admitted(scheduler, order, workspace_id, priority))
+                   for workspace_id, priority in [("low", 0), ("high", 5), ("mid", 0)]]
+        await asyncio.sleep(0)
+
+        if update:
+            assert scheduler.update_priority(update) == len(update)
+
+        for _ in waiters:
+            scheduler.release()
+            await asyncio.sleep(0)
+        await asyncio.gather(*waiters)
+        assert order == expected
+
+    run(scenario())
+
+def test_cancel_while_waiting():
+    """A cancelled waiter leaves the queue and never takes a slot"""
+    async def scenario():
+        scheduler = RunScheduler(1)
+        await scheduler.acquire("a")
+        waiter = asyncio.ensure_future(scheduler.acquire("b"))
+        await asyncio.sleep(0)
+
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert scheduler._waiting == []
+
+        scheduler.release()
+        assert scheduler._running == 0
+
+    run(scenario())
+
+def test_cancel_then_release_before_waiter_resumes():
+    """release() skipping a just-cancelled waiter still surfaces as a cancellation"""
+    async def scenario():
+        scheduler = RunScheduler(1)
+        await scheduler.acquire("a")
+        waiter = asyncio.ensure_future(scheduler.acquire("b"))
+        await asyncio.sleep(0)
+
+        waiter.cancel()
+        scheduler.release()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert scheduler._running == 0
+
+    run(scenario())